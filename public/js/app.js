@@ -1,4 +1,4 @@
-import { loadData, updateStats, getAthleteName, filterValidActivities, normalizeMultiDayActivities } from './utils.js';
+import { loadData, loadActivityCube, loadCoActivity, updateStats, getAthleteName, filterValidActivities } from './utils.js';
 import {
   showRankingChart,
   showIndividualChart,
@@ -96,7 +96,7 @@ console.log(`🔍 allData: ${allData.length} activités, ${Math.round(totalAll)}
     const socialContainer = document.querySelector('.social-section');
     const chartSection = document.querySelector('.chart-section');
 
-    updateStats(filteredData);
+    updateStats(filteredData, athleteValue, sportValue);
     showSportPieChart(filteredData);
     showMiniRanking(allData);
 
@@ -264,19 +264,17 @@ async function init() {
     // CHARGEMENT DES DONNÉES ===
     loadingText.textContent = 'Chargement des données...';
     const groupDataPromise = loadGroupActivities();
+    const cubePromise = loadActivityCube();
+    const coActivityPromise = loadCoActivity();
 
-    let rawData = await loadData();
+    const rawData = await loadData();
     console.log("📊 Données brutes chargées:", rawData.length, "activités");
 
     // FILTRAGE (rapide) ===
+    // Les sorties sur plusieurs jours sont déjà réparties par jour (Precompute_groups.py)
     loadingText.textContent = 'Filtrage des activités...';
-    rawData = filterValidActivities(rawData);
-    console.log("✅ Après filtrage:", rawData.length, "activités");
-
-    // NORMALISATION (potentiellement lente, maintenant en cache) ===
-    loadingText.textContent = 'Normalisation des données...';
-    allData = normalizeMultiDayActivities(rawData);
-    console.log("✅ Après normalisation:", allData.length, "activités");
+    allData = filterValidActivities(rawData);
+    console.log("✅ Après filtrage:", allData.length, "activités");
 
     // DONNÉES DE GROUPE ===
     loadingText.textContent = 'Chargement des données de groupe...';
@@ -290,6 +288,9 @@ async function init() {
       return;
     }
 
+    // Agrégats précalculés (optionnels) ===
+    await Promise.all([cubePromise, coActivityPromise]);
+
     // INITIALISATION UI (très rapide) ===
     loadingText.textContent = 'Préparation de l\'interface...';
     fillDropdowns(allData);
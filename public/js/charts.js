@@ -1,4 +1,4 @@
-import { getAthleteColor, getSportColor, mapSportName, generateAllDays, getOrdinalSuffix, decodePolyline, formatElevation, getAthleteName, getAthleteIdFromName, loadGroupActivitiesWithCache } from './utils.js';
+import { getAthleteColor, getSportColor, mapSportName, generateAllDays, getOrdinalSuffix, decodePolyline, formatElevation, getAthleteName, getAthleteIdFromName, loadGroupActivitiesWithCache, getCubeSlice, getCoActivity, getTrackLevel, loadTracks, loadDensityIndex, getDensityZoom, loadDensityGrid } from './utils.js';
 
 // ==============================
 // CONFIGURATION CHART.JS — REFONTE 2025
@@ -814,6 +814,11 @@ export function initMap() {
     maxZoom: 19
   }).addTo(map);
 
+  // Passer de la carte de chaleur aux traces et changer de niveau de détail selon le zoom
+  map.on('zoomend', () => {
+    if (mapState) drawMapTracks(false);
+  });
+
   // Forcer le recalcul de la taille après initialisation
   setTimeout(() => {
     map.invalidateSize();
@@ -932,6 +937,18 @@ function generateCountryStats(activities) {
   container.appendChild(summary);
 }
 
+// Numéro du dernier affichage demandé : un chargement de traces terminé après
+// un changement de filtre ou de zoom est ignoré
+let mapRenderId = 0;
+// Activités affichées sur la carte et niveau de détail des traces tracées
+let mapState = null;
+// Zoom maximal du cadrage initial (fitBounds)
+const MAP_FIT_MAX_ZOOM = 6;
+// Niveau de mapState quand la carte de chaleur est affichée
+const DENSITY_LEVEL = 'density';
+// Carte de chaleur de la vue d'ensemble
+let densityLayer = null;
+
 export function showMapChart(data, athleteId) {
   if (!map) initMap();
 
@@ -940,27 +957,168 @@ export function showMapChart(data, athleteId) {
     if (map) map.invalidateSize();
   }, 100);
 
-  polylines.forEach(p => map.removeLayer(p));
-  polylines = [];
-
   const colorMode = athleteId ? 'sport' : 'athlete';
   generateLegend(data, colorMode);
   generateCountryStats(data);
 
-  data.forEach(activity => {
-    if (!activity.map || !activity.map.summary_polyline) return;
+  mapState = { data, athleteId, level: undefined };
+  return drawMapTracks(true);
+}
+
+// Couches de densité (density_grid.py) des activités affichées, regroupées par
+// couleur comme les traces : par athlète, ou par sport pour un seul athlète
+async function getDensitySelection(data, athleteId) {
+  const index = await loadDensityIndex();
+  const shown = new Set(data.map(activity => `${activity.athlete_id}|${activity.sport_type}`));
+  const layersByColor = new Map();
+  let bounds = null;
+
+  index.layers.forEach((layer, i) => {
+    if (!shown.has(`${layer.athlete_id}|${layer.sport_type}`)) return;
+    const color = athleteId
+      ? getSportColor(mapSportName(layer.sport_type))
+      : getAthleteColor(layer.athlete_id);
+    if (!layersByColor.has(color)) layersByColor.set(color, []);
+    layersByColor.get(color).push(i);
+
+    const [south, west, north, east] = layer.bounds;
+    const layerBounds = L.latLngBounds([south, west], [north, east]);
+    bounds = bounds ? bounds.extend(layerBounds) : layerBounds;
+  });
+
+  return { index, groups: Array.from(layersByColor, ([color, layers]) => ({ color, layers })), bounds };
+}
+
+// Dessine une tuile Leaflet à partir des tuiles de la grille qui la recouvrent :
+// comptes des couches de même couleur additionnés, opacité selon le nombre d'activités
+function drawDensityTile(canvas, coords, gridZoom, tiles, selection) {
+  const { index, groups } = selection;
+  const ctx = canvas.getContext('2d');
+  const scale = Math.pow(2, coords.z - gridZoom);
+  const cellSize = index.cell_pixels * scale;
+  const tileCells = index.tile_size / index.cell_pixels;
+  const gridTileSize = index.tile_size * scale;
+  const originX = coords.x * index.tile_size;
+  const originY = coords.y * index.tile_size;
+  const maxLog = Math.log1p(index.files[gridZoom].max_count);
+
+  const firstX = Math.floor(originX / gridTileSize);
+  const lastX = Math.floor((originX + index.tile_size - 1) / gridTileSize);
+  const firstY = Math.floor(originY / gridTileSize);
+  const lastY = Math.floor((originY + index.tile_size - 1) / gridTileSize);
+
+  groups.forEach(({ color, layers }) => {
+    ctx.fillStyle = color;
+    for (let tx = firstX; tx <= lastX; tx++) {
+      for (let ty = firstY; ty <= lastY; ty++) {
+        const sums = new Map();
+        layers.forEach(layer => {
+          const tile = tiles.get(`${layer}/${tx}/${ty}`);
+          if (!tile) return;
+          for (let k = 0; k < tile.cells.length; k++) {
+            sums.set(tile.cells[k], (sums.get(tile.cells[k]) || 0) + tile.counts[k]);
+          }
+        });
+
+        sums.forEach((count, cell) => {
+          const x = (tx * tileCells + cell % tileCells) * cellSize - originX;
+          const y = (ty * tileCells + Math.floor(cell / tileCells)) * cellSize - originY;
+          // Une tuile de la grille peut déborder de la tuile affichée
+          if (x + cellSize <= 0 || y + cellSize <= 0 || x >= index.tile_size || y >= index.tile_size) return;
+          ctx.globalAlpha = Math.min(1, 0.3 + 0.7 * Math.log1p(count) / maxLog);
+          ctx.fillRect(x, y, Math.max(cellSize, 1), Math.max(cellSize, 1));
+        });
+      }
+    }
+  });
+}
+
+function createDensityLayer(selection) {
+  const DensityLayer = L.GridLayer.extend({
+    createTile(coords, done) {
+      const tile = document.createElement('canvas');
+      const size = this.getTileSize();
+      tile.width = size.x;
+      tile.height = size.y;
+
+      getDensityZoom(coords.z).then(async gridZoom => {
+        if (gridZoom !== null) {
+          drawDensityTile(tile, coords, gridZoom, await loadDensityGrid(gridZoom), selection);
+        }
+        done(null, tile);
+      });
+      return tile;
+    }
+  });
+  return new DensityLayer({ opacity: 0.9 });
+}
+
+function clearMapLayers() {
+  polylines.forEach(p => map.removeLayer(p));
+  polylines = [];
+  if (densityLayer) {
+    map.removeLayer(densityLayer);
+    densityLayer = null;
+  }
+}
+
+function fitMap(bounds) {
+  map.fitBounds(bounds, {
+    padding: [30, 30],
+    maxZoom: MAP_FIT_MAX_ZOOM  // Ne pas zoomer plus que niveau 6 pour garder une vue d'ensemble
+  });
+
+  // Recalculer après fitBounds
+  setTimeout(() => {
+    map.invalidateSize();
+  }, 300);
+}
 
-    const points = decodePolyline(activity.map.summary_polyline);
-    if (points.length === 0) return;
+// Trace les activités de mapState. En vue d'ensemble, la carte de chaleur
+// précalculée (density_grid.py) remplace les traces ; au-delà de son zoom
+// maximal, les traces précalculées (track_simplify.py) sont chargées au niveau
+// de détail du zoom, seulement pour les athlètes affichés ; sans elles, la
+// trace complète est filtrée dans le navigateur.
+async function drawMapTracks(fit) {
+  const { data, athleteId } = mapState;
+  const zoom = fit ? MAP_FIT_MAX_ZOOM : map.getZoom();
+  const useDensity = (await getDensityZoom(zoom)) !== null;
+  const level = useDensity ? DENSITY_LEVEL : await getTrackLevel(zoom);
+  if (!fit && level === mapState.level) return;
+  const renderId = ++mapRenderId;
+
+  if (useDensity) {
+    const selection = await getDensitySelection(data, athleteId);
+    if (renderId !== mapRenderId) return;
+    mapState.level = level;
+    clearMapLayers();
+    densityLayer = createDensityLayer(selection).addTo(map);
+    if (fit && selection.bounds) fitMap(selection.bounds);
+    return;
+  }
+
+  const tracks = await loadTracks([...new Set(data.map(activity => activity.athlete_id))], level);
+  if (renderId !== mapRenderId) return;
+  mapState.level = level;
+  clearMapLayers();
+
+  data.forEach(activity => {
+    const precomputed = tracks[activity._originalActivityId || activity.activity_id];
+    let segments;
+    if (precomputed) {
+      segments = precomputed.map(decodePolyline);
+    } else {
+      const points = decodePolyline(activity.map?.summary_polyline);
+      if (points.length === 0) return;
+      // Filtrer les segments rectilignes (trajets en train)
+      segments = filterStraightLines(points, 20000); // 20km de seuil
+    }
 
     const color = athleteId 
       ? getSportColor(mapSportName(activity.sport_type))
       : getAthleteColor(activity.athlete_id);
 
-    // Filtrer les segments rectilignes (trajets en train)
-    const filteredSegments = filterStraightLines(points, 20000); // 20km de seuil
-    
-    filteredSegments.forEach(segment => {
+    segments.forEach(segment => {
       if (segment.length < 2) return;
       
       const polyline = L.polyline(segment, {
@@ -981,17 +1139,8 @@ export function showMapChart(data, athleteId) {
     });
   });
 
-  if (polylines.length > 0) {
-    const group = L.featureGroup(polylines);
-    map.fitBounds(group.getBounds(), { 
-      padding: [30, 30],
-      maxZoom: 6  // Ne pas zoomer plus que niveau 6 pour garder une vue d'ensemble
-    });
-    
-    // Recalculer après fitBounds
-    setTimeout(() => {
-      map.invalidateSize();
-    }, 300);
+  if (fit && polylines.length > 0) {
+    fitMap(L.featureGroup(polylines).getBounds());
   }
 }
 
@@ -1714,27 +1863,28 @@ export function showCalendarHeatmap(data, athleteId, selectedSport) {
   window.calendarChart.setOption(option);
 
   // Générer les barres de performance avec animation au scroll
-  setupPerformanceBarsAnimation(filteredData, year, numAthletes);
+  const slice = getCubeSlice(athleteId && athleteId !== "classement" ? athleteId : '', selectedSport);
+  setupPerformanceBarsAnimation(filteredData, year, numAthletes, slice);
 
   window.addEventListener('resize', () => {
     if (window.calendarChart) window.calendarChart.resize();
   });
 }
 
-function setupPerformanceBarsAnimation(data, year, numAthletes = 1) {
+function setupPerformanceBarsAnimation(data, year, numAthletes = 1, slice = null) {
   const performanceBars = document.querySelector('.performance-bars');
   if (!performanceBars) return;
 
   // Stocker les données pour l'animation
-  window.perfBarsData = { data, year, numAthletes };
+  window.perfBarsData = { data, year, numAthletes, slice };
 
   const observer = new IntersectionObserver((entries) => {
     entries.forEach(entry => {
       if (entry.isIntersecting) {
         // Déclencher l'animation des barres
         setTimeout(() => {
-          generateWeeklyBars(data, year, true, numAthletes);
-          generateMonthlyBars(data, year, true, numAthletes);
+          generateWeeklyBars(data, year, true, numAthletes, slice);
+          generateMonthlyBars(data, year, true, numAthletes, slice);
         }, 100);
         observer.unobserve(entry.target);
       }
@@ -1744,11 +1894,11 @@ function setupPerformanceBarsAnimation(data, year, numAthletes = 1) {
   observer.observe(performanceBars);
   
   // Générer les barres sans animation d'abord (hauteur 0)
-  generateWeeklyBars(data, year, false, numAthletes);
-  generateMonthlyBars(data, year, false, numAthletes);
+  generateWeeklyBars(data, year, false, numAthletes, slice);
+  generateMonthlyBars(data, year, false, numAthletes, slice);
 }
 
-function generateWeeklyBars(data, year, animate = true, numAthletes = 1) {
+function generateWeeklyBars(data, year, animate = true, numAthletes = 1, slice = null) {
   const container = document.getElementById('weeklyBars');
   if (!container) return;
 
@@ -1756,16 +1906,23 @@ function generateWeeklyBars(data, year, animate = true, numAthletes = 1) {
   // Objectif individuel : divisé par le nombre d'athlètes
   const weeklyTarget = (TARGET / numAthletes) / 52;
 
-  // Calculer le dénivelé par semaine
+  // Calculer le dénivelé par semaine (lu dans le cube s'il est chargé)
   const weeklyData = {};
-  data.forEach(activity => {
-    const date = new Date(activity.start_date);
-    if (date.getFullYear() !== year) return;
-    
-    const weekNum = getWeekNumber(date);
-    const weekKey = `S${weekNum}`;
-    weeklyData[weekKey] = (weeklyData[weekKey] || 0) + (activity.total_elevation_gain|| 0);
-  });
+  if (slice) {
+    Object.entries(slice.weeks).forEach(([key, value]) => {
+      const [weekYear, weekNum] = key.split('-');
+      if (Number(weekYear) === year) weeklyData[`S${weekNum}`] = value;
+    });
+  } else {
+    data.forEach(activity => {
+      const date = new Date(activity.start_date);
+      if (date.getFullYear() !== year) return;
+
+      const weekNum = getWeekNumber(date);
+      const weekKey = `S${weekNum}`;
+      weeklyData[weekKey] = (weeklyData[weekKey] || 0) + (activity.total_elevation_gain|| 0);
+    });
+  }
 
   // Créer toutes les semaines de l'année
   const allWeeks = [];
@@ -1809,7 +1966,7 @@ function generateWeeklyBars(data, year, animate = true, numAthletes = 1) {
   container.innerHTML = barsHTML + objectiveLine;
 }
 
-function generateMonthlyBars(data, year, animate = true, numAthletes = 1) {
+function generateMonthlyBars(data, year, animate = true, numAthletes = 1, slice = null) {
   const container = document.getElementById('monthlyBars');
   if (!container) return;
 
@@ -1818,13 +1975,20 @@ function generateMonthlyBars(data, year, animate = true, numAthletes = 1) {
   const monthlyTarget = (TARGET / numAthletes) / 12;
   const monthNames = ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Août', 'Sep', 'Oct', 'Nov', 'Déc'];
   
-  // Calculer le dénivelé par mois
+  // Calculer le dénivelé par mois (lu dans le cube s'il est chargé)
   const monthlyData = new Array(12).fill(0);
-  data.forEach(activity => {
-    const date = new Date(activity.start_date);
-    if (date.getFullYear() !== year) return;
-    monthlyData[date.getMonth()] += (activity.total_elevation_gain|| 0);
-  });
+  if (slice) {
+    Object.entries(slice.months).forEach(([key, value]) => {
+      const [monthYear, month] = key.split('-');
+      if (Number(monthYear) === year) monthlyData[Number(month) - 1] = value;
+    });
+  } else {
+    data.forEach(activity => {
+      const date = new Date(activity.start_date);
+      if (date.getFullYear() !== year) return;
+      monthlyData[date.getMonth()] += (activity.total_elevation_gain|| 0);
+    });
+  }
 
   const maxValue = Math.max(...monthlyData, monthlyTarget * 1.2);
   const objectiveHeight = (monthlyTarget / maxValue) * 100;
@@ -2430,6 +2594,114 @@ export async function loadGroupActivities() {
   precomputedGroups = await loadGroupActivitiesWithCache();
   return precomputedGroups;
 }
+
+// Empreinte des sorties du graphe (FNV-1a 32 bits), même calcul que
+// groups_fingerprint (pyscripts/co_activity.py) : identifiant, athlètes, sport
+// et moyennes de chaque sortie, dans l'ordre
+function groupsFingerprint(groups) {
+  const text = groups.map(g => [
+    g.id, g.athletes.join(','), g.sport_type || g.sport, g.elevation || 0, g.distance || 0, g.duration || 0
+  ].join('|')).join('\n');
+  let hash = 0x811c9dc5;
+  for (const byte of new TextEncoder().encode(text)) {
+    hash = Math.imul(hash ^ byte, 0x01000193) >>> 0;
+  }
+  return hash.toString(16).padStart(8, '0');
+}
+
+// Données du graphe social calculées à partir des sorties de groupe, avec les
+// champs de co_activity.json (pyscripts/co_activity.py) utilisés par le diagramme :
+// sert quand le fichier précalculé est absent ou ne correspond pas aux groupes chargés
+function buildCoActivity(groups) {
+  const athletes = [];
+  const athleteIndex = new Map();
+  groups.forEach(g => g.athletes.forEach(id => {
+    if (!athleteIndex.has(id)) {
+      athleteIndex.set(id, athletes.length);
+      athletes.push(id);
+    }
+  }));
+  const n = athletes.length;
+
+  const sports = [];
+  const matrix = Array(n).fill(null).map(() => Array(n).fill(0));
+  const linksByPair = new Map();
+  const pairCounts = new Map();
+  const athleteGroups = Array(n).fill(0);
+  const athleteElevation = Array(n).fill(0);
+  const partners = athletes.map(() => new Set());
+  let totalElev = 0;
+
+  const chordGroups = groups.map((g, groupIndex) => {
+    // Mapper correctement les sports ("Ski" et ski de fond regroupés avec le ski de rando)
+    let sportCat = g.sport_category || mapSportName(g.sport_type || g.sport);
+    if (sportCat === 'Ski' || g.sport === 'BackcountrySki' || g.sport === 'NordicSki') {
+      sportCat = 'Ski mountaineering';
+    }
+    if (!sports.includes(sportCat)) sports.push(sportCat);
+
+    const indexes = g.athletes.map(id => athleteIndex.get(id));
+    indexes.forEach(i => {
+      athleteGroups[i]++;
+      athleteElevation[i] += g.elevation;
+      indexes.forEach(j => { if (j !== i) partners[i].add(j); });
+    });
+
+    // Pour chaque paire d'athlètes dans le groupe
+    for (let a = 0; a < indexes.length; a++) {
+      for (let b = a + 1; b < indexes.length; b++) {
+        const i = indexes[a];
+        const j = indexes[b];
+        matrix[i][j] += g.elevation;
+        matrix[j][i] += g.elevation;
+        totalElev += g.elevation;
+
+        const pairKey = `${Math.min(i, j)}-${Math.max(i, j)}`;
+        if (!linksByPair.has(pairKey)) linksByPair.set(pairKey, []);
+        linksByPair.get(pairKey).push(groupIndex);
+
+        const countKey = [g.athletes[a], g.athletes[b]].sort().join('-');
+        pairCounts.set(countKey, (pairCounts.get(countKey) || 0) + 1);
+      }
+    }
+    return [g.date, g.name, sports.indexOf(sportCat), g.elevation];
+  });
+
+  // Duo le plus actif (premier rencontré en cas d'égalité)
+  let topPair = null;
+  let topCount = 0;
+  pairCounts.forEach((count, key) => {
+    if (count > topCount) {
+      topCount = count;
+      topPair = key;
+    }
+  });
+
+  // Athlète le plus social (plus petit identifiant en cas d'égalité)
+  let mostSocial = null;
+  athletes.forEach((id, i) => {
+    const best = mostSocial === null ? -1 : athleteGroups[athleteIndex.get(mostSocial)];
+    if (athleteGroups[i] > best || (athleteGroups[i] === best && id < mostSocial)) mostSocial = id;
+  });
+
+  return {
+    athletes,
+    sports,
+    matrix,
+    groups: chordGroups,
+    links: Array.from(linksByPair, ([key, indexes]) => [...key.split('-').map(Number), indexes]),
+    athlete_stats: athletes.map((id, i) => [athleteGroups[i], partners[i].size, athleteElevation[i]]),
+    stats: {
+      groups: groups.length,
+      elevation: totalElev,
+      big_groups: groups.filter(g => g.athletes.length >= 3).length,
+      top_pair: topPair ? topPair.split('-').map(Number) : null,
+      top_pair_count: topCount,
+      most_social: mostSocial
+    }
+  };
+}
+
 // Fonction principale pour afficher le Chord Diagram
 export function showSocialGraph(data, groupActivities = null) {
   const container = document.getElementById('socialGraph');
@@ -2445,66 +2717,19 @@ export function showSocialGraph(data, groupActivities = null) {
     return;
   }
 
-  // Filtrer les activités "Climb" et mapper correctement les sports
+  // Filtrer les activités "Climb"
   const filteredGroups = groups.filter(g => {
     const sport = g.sport_type || g.sport;
     return sport !== 'Climb' && sport !== 'RockClimbing';
   });
 
-  // Collecter les athlètes actifs (ceux avec des sorties de groupe)
-  const athleteSet = new Set();
-  filteredGroups.forEach(g => g.athletes.forEach(id => athleteSet.add(id)));
-  const athleteIds = Array.from(athleteSet);
-  const n = athleteIds.length;
-
-  // Créer une matrice pour la somme des D+ (pour dimensionner les arcs)
-  const totalMatrix = Array(n).fill(null).map(() => Array(n).fill(0));
-  const athleteIndex = new Map(athleteIds.map((id, i) => [id, i]));
-
-  // Stocker chaque activité individuellement pour créer des ribbons séparés
-  const individualLinks = [];
-  const sportsUsed = new Set();
-
-  filteredGroups.forEach(g => {
-    // Mapper correctement les sports
-    let sportCat = g.sport_category || mapSportName(g.sport_type || g.sport);
-
-    // S'assurer que "Ski" est bien mappé à "Ski mountaineering"
-    if (sportCat === 'Ski' || g.sport === 'BackcountrySki' || g.sport === 'NordicSki') {
-      sportCat = 'Ski mountaineering';
-    }
-
-    sportsUsed.add(sportCat);
-
-    // Pour chaque paire d'athlètes dans le groupe
-    for (let i = 0; i < g.athletes.length; i++) {
-      for (let j = i + 1; j < g.athletes.length; j++) {
-        const a1 = g.athletes[i];
-        const a2 = g.athletes[j];
-        const idx1 = athleteIndex.get(a1);
-        const idx2 = athleteIndex.get(a2);
-
-        if (idx1 !== undefined && idx2 !== undefined) {
-          // Ajouter le D+ à la matrice totale
-          totalMatrix[idx1][idx2] += g.elevation;
-          totalMatrix[idx2][idx1] += g.elevation;
-
-          // Stocker chaque activité comme un lien individuel
-          individualLinks.push({
-            source: idx1,
-            target: idx2,
-            value: g.elevation,
-            sport: sportCat,
-            name: g.name,
-            date: g.date,
-            athleteIds: [a1, a2],
-            // Stocker les IDs des activités pour choisir un nom arbitrairement
-            activityIds: g.activity_ids || []
-          });
-        }
-      }
-    }
-  });
+  // Matrice de D+ partagé et liens par paire : précalculés (co_activity.json)
+  // si leur empreinte est celle des groupes chargés, sinon calculés ici
+  const precomputed = getCoActivity();
+  const co = precomputed && precomputed.fingerprint === groupsFingerprint(filteredGroups)
+    ? precomputed
+    : buildCoActivity(filteredGroups);
+  const athleteIds = co.athletes;
 
   // Dimensions
   const width = container.clientWidth || 800;
@@ -2542,7 +2767,7 @@ export function showSocialGraph(data, groupActivities = null) {
     .padAngle(0.05)
     .sortSubgroups(d3.descending);
 
-  const chords = chord(totalMatrix);
+  const chords = chord(co.matrix);
 
   // Arc pour les groupes (arcs extérieurs)
   const arc = d3.arc()
@@ -2564,9 +2789,7 @@ export function showSocialGraph(data, groupActivities = null) {
     // Atténuer les arcs non connectés
     groupArcs.transition().duration(200)
       .style('opacity', d => {
-        const isConnected = individualLinks.some(link =>
-          link.source === index || link.target === index
-        );
+        const isConnected = co.links.some(([i, j]) => i === index || j === index);
         return (d.index === index || isConnected) ? 1 : 0.15;
       });
 
@@ -2577,9 +2800,7 @@ export function showSocialGraph(data, groupActivities = null) {
     // Atténuer les labels
     labels.transition().duration(200)
       .style('opacity', d => {
-        const isConnected = individualLinks.some(link =>
-          link.source === index || link.target === index
-        );
+        const isConnected = co.links.some(([i, j]) => i === index || j === index);
         return (d.index === index || isConnected) ? 1 : 0.2;
       });
   }
@@ -2592,21 +2813,13 @@ export function showSocialGraph(data, groupActivities = null) {
     labels.transition().duration(200).style('opacity', 1);
   }
 
-  // Dessiner les ribbons individuels (une ligne par activité)
-  // On groupe d'abord les liens par paire pour calculer les positions
-  const linksByPair = new Map();
-  individualLinks.forEach(link => {
-    const pairKey = `${Math.min(link.source, link.target)}-${Math.max(link.source, link.target)}`;
-    if (!linksByPair.has(pairKey)) {
-      linksByPair.set(pairKey, []);
-    }
-    linksByPair.get(pairKey).push(link);
-  });
-
-  // Préparer les données de ribbons avec offsets
+  // Dessiner les ribbons individuels (une ligne par activité), paire par paire
   const ribbonData = [];
-  linksByPair.forEach((links, pairKey) => {
-    const [sourceIdx, targetIdx] = pairKey.split('-').map(Number);
+  co.links.forEach(([sourceIdx, targetIdx, groupIndexes]) => {
+    const links = groupIndexes.map(k => {
+      const [date, name, sportIndex, value] = co.groups[k];
+      return { source: sourceIdx, target: targetIdx, value, sport: co.sports[sportIndex], name, date };
+    });
 
     // Trouver les groupes correspondants
     const sourceGroup = chords.groups.find(g => g.index === sourceIdx);
@@ -2734,16 +2947,7 @@ export function showSocialGraph(data, groupActivities = null) {
       d3.select(this).style('opacity', 1);
 
       const athleteId = athleteIds[d.index];
-      const groupCount = filteredGroups.filter(g => g.athletes.includes(athleteId)).length;
-      const partners = new Set();
-      let totalElev = 0;
-
-      filteredGroups.forEach(g => {
-        if (g.athletes.includes(athleteId)) {
-          g.athletes.forEach(id => { if (id !== athleteId) partners.add(id); });
-          totalElev += g.elevation;
-        }
-      });
+      const [groupCount, partnerCount, totalElev] = co.athlete_stats[d.index];
 
       tooltip.html(`
         <div style="display:flex;align-items:center;gap:8px;margin-bottom:8px;">
@@ -2752,7 +2956,7 @@ export function showSocialGraph(data, groupActivities = null) {
         </div>
         <div style="font-size:11px;color:rgba(255,255,255,0.7);">
           ${groupCount} sortie${groupCount > 1 ? 's' : ''} en groupe<br>
-          ${partners.size} partenaire${partners.size > 1 ? 's' : ''}<br>
+          ${partnerCount} partenaire${partnerCount > 1 ? 's' : ''}<br>
           ↑ ${formatElevation(totalElev)} m D+ en groupe
         </div>
         <div style="margin-top:8px;font-size:10px;color:rgba(255,255,255,0.4);">
@@ -2798,8 +3002,8 @@ export function showSocialGraph(data, groupActivities = null) {
   });
 
   // Légende et stats
-  generateSocialLegend(Array.from(sportsUsed));
-  generateChordStats(athleteIds, individualLinks, filteredGroups);
+  generateSocialLegend(co.sports);
+  generateChordStats(co.stats);
 }
 
 function generateSocialLegend(sports) {
@@ -2819,47 +3023,22 @@ function generateSocialLegend(sports) {
   `).join('');
 }
 
-function generateChordStats(athleteIds, individualLinks, groups) {
+function generateChordStats(stats) {
   const statsContainer = document.getElementById('socialStats');
   if (!statsContainer) return;
 
-  const totalGroups = groups.length;
-  const totalElev = individualLinks.reduce((sum, l) => sum + l.value, 0);
-
-  // Trouver le duo le plus actif (par nombre d'activités)
-  const pairCounts = new Map();
-  individualLinks.forEach(link => {
-    const pairKey = [link.athleteIds[0], link.athleteIds[1]].sort().join('-');
-    pairCounts.set(pairKey, (pairCounts.get(pairKey) || 0) + 1);
-  });
-
-  let topPair = null;
-  let topCount = 0;
-  pairCounts.forEach((count, key) => {
-    if (count > topCount) {
-      topCount = count;
-      topPair = key;
-    }
-  });
+  const totalGroups = stats.groups;
+  const totalElev = stats.elevation;
+  const bigGroups = stats.big_groups;
+  const mostSocial = stats.most_social;
 
+  // Duo le plus actif (par nombre d'activités)
   let topPairNames = '';
-  if (topPair) {
-    const [a1, a2] = topPair.split('-').map(Number);
+  if (stats.top_pair) {
+    const [a1, a2] = stats.top_pair;
     topPairNames = `${getAthleteName(a1)} & ${getAthleteName(a2)}`;
   }
 
-  // Athlète le plus social
-  const socialCounts = {};
-  groups.forEach(g => {
-    g.athletes.forEach(id => {
-      socialCounts[id] = (socialCounts[id] || 0) + 1;
-    });
-  });
-  const mostSocial = Object.entries(socialCounts).sort((a, b) => b[1] - a[1])[0];
-
-  // Groupes de 3+
-  const bigGroups = groups.filter(g => g.athletes.length >= 3).length;
-
   statsContainer.innerHTML = `
     <h4>Statistiques</h4>
     <div class="social-stat-item">
@@ -2885,7 +3064,7 @@ function generateChordStats(athleteIds, individualLinks, groups) {
     ${mostSocial ? `
     <div class="social-stat-item">
       <span>Le + social</span>
-      <span class="social-stat-value">${getAthleteName(Number(mostSocial[0]))}</span>
+      <span class="social-stat-value">${getAthleteName(mostSocial)}</span>
     </div>
     ` : ''}
   `;
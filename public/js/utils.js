@@ -198,44 +198,132 @@ export function decodePolyline(encoded) {
 // SYSTÈME DE CACHE
 // ==============================
 
-// Clés pour le cache sessionStorage (se vide à la fermeture du navigateur)
-const CACHE_KEY = 'recapmillion_activities_cache';
-const NORMALIZED_CACHE_KEY = 'recapmillion_normalized_cache';
-const CACHE_VERSION_KEY = 'recapmillion_cache_version';
-const CURRENT_CACHE_VERSION = '1.5';
+// Fichiers de données écrits par Precompute_groups.py à noms versionnés par leur
+// contenu (pyscripts/site_artifacts.py) : seul le manifeste est revalidé à chaque
+// visite, les fichiers qu'il liste ne changent jamais et sont gardés d'une visite
+// à l'autre dans le Cache Storage du navigateur.
+const DATA_DIR = 'data/';
+const SITE_MANIFEST_PATH = `${DATA_DIR}manifest.json`;
+const TRACKS_DIR = `${DATA_DIR}tracks/`;
+const DENSITY_DIR = `${DATA_DIR}density/`;
+const DATA_CACHE_NAME = 'recapmillion-data';
+// Anciennes clés du cache sessionStorage (JSON complet relu à chaque chargement)
+const LEGACY_CACHE_KEYS = [
+  'recapmillion_activities_cache',
+  'recapmillion_cache_version',
+  'recapmillion_groups_cache',
+  'recapmillion_normalized_cache'
+];
 
-export async function loadData() {
-  // Vérifier si le cache existe et est valide
-  const cachedVersion = sessionStorage.getItem(CACHE_VERSION_KEY);
-  const cachedData = sessionStorage.getItem(CACHE_KEY);
+let siteManifestPromise = null;
+let indexPromise = null;
 
-  if (cachedVersion === CURRENT_CACHE_VERSION && cachedData) {
-    try {
-      const data = JSON.parse(cachedData);
-
-      // Gérer différents formats de données
-      let activities;
-      if (Array.isArray(data)) {
-        activities = data;
-      } else if (data.activities && Array.isArray(data.activities)) {
-        activities = data.activities;
-      } else {
-        throw new Error('Format de données invalide dans le cache');
-      }
+function dataCacheAvailable() {
+  return typeof caches !== 'undefined';
+}
+
+// Retire du cache les fichiers qui ne sont plus listés dans le manifeste
+async function pruneDataCache(manifest) {
+  if (!dataCacheAvailable()) return;
+  try {
+    const current = new Set(manifest.files.map(file => new URL(DATA_DIR + file, location.href).href));
+    const cache = await caches.open(DATA_CACHE_NAME);
+    const requests = await cache.keys();
+    await Promise.all(requests
+      .filter(request => !current.has(request.url))
+      .map(request => cache.delete(request)));
+  } catch (error) {
+    console.warn('⚠️ Nettoyage du cache impossible:', error.message);
+  }
+}
+
+// Manifeste du site, revalidé auprès du serveur à chaque chargement (null s'il est absent)
+function loadSiteManifest() {
+  if (!siteManifestPromise) {
+    LEGACY_CACHE_KEYS.forEach(key => sessionStorage.removeItem(key));
+    siteManifestPromise = fetch(SITE_MANIFEST_PATH, { cache: 'no-cache' })
+      .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+      })
+      .then(manifest => {
+        pruneDataCache(manifest);
+        return manifest;
+      })
+      .catch(error => {
+        console.warn('⚠️ Manifeste des données indisponible', error.message);
+        return null;
+      });
+  }
+  return siteManifestPromise;
+}
 
-      console.log('✅ Données chargées depuis le cache localStorage');
-      console.log(`📦 ${activities.length} activités en cache`);
-      return activities;
+// Réponse pour un fichier versionné : depuis le cache s'il y est, sinon
+// téléchargée puis mise en cache
+async function fetchVersioned(path) {
+  if (!dataCacheAvailable()) return fetch(path);
+  let cache;
+  try {
+    cache = await caches.open(DATA_CACHE_NAME);
+    const cached = await cache.match(path);
+    if (cached) return cached;
+  } catch (error) {
+    // Cache Storage refusé (navigation privée...) : téléchargement simple
+    return fetch(path);
+  }
+  const response = await fetch(path);
+  if (response.ok) {
+    try {
+      await cache.put(path, response.clone());
     } catch (error) {
-      console.warn('⚠️ Cache corrompu, rechargement depuis le serveur...', error);
-      sessionStorage.removeItem(CACHE_KEY);
-      sessionStorage.removeItem(NORMALIZED_CACHE_KEY);
-      sessionStorage.removeItem(CACHE_VERSION_KEY);
+      console.warn(`⚠️ Impossible de mettre ${path} en cache:`, error.message);
     }
   }
+  return response;
+}
+
+// Contenu JSON d'un fichier versionné
+async function fetchVersionedJson(path) {
+  const response = await fetchVersioned(path);
+  if (!response.ok) throw new Error(`HTTP ${response.status}`);
+  return response.json();
+}
+
+// Fichier du manifeste (index, cube, co_activity, tracks, density) : JSON, ou null
+async function loadArtifact(name) {
+  const manifest = await loadSiteManifest();
+  const artifact = manifest?.artifacts[name];
+  if (!artifact) return null;
+  try {
+    return await fetchVersionedJson(DATA_DIR + artifact.file);
+  } catch (error) {
+    console.warn(`⚠️ ${artifact.file} indisponible`, error.message);
+    return null;
+  }
+}
 
-  // Sinon, charger depuis le serveur
-  console.log('🔄 Chargement des données depuis le serveur...');
+// Index allégé (métadonnées et groupes, sans traces), sorties sur plusieurs jours
+// déjà réparties par jour ; les traces sont réparties par athlète et chargées
+// seulement par la carte. Un seul chargement, partagé par loadData et les groupes
+// (null s'il est absent).
+function fetchSiteIndex() {
+  if (!indexPromise) {
+    indexPromise = loadArtifact('index').then(index => {
+      if (!index) console.warn('⚠️ Index allégé indisponible, chargement du fichier complet');
+      return index;
+    });
+  }
+  return indexPromise;
+}
+
+export async function loadData() {
+  console.log('🔄 Chargement des données...');
+  const index = await fetchSiteIndex();
+  if (index && Array.isArray(index.activities)) {
+    console.log(`✅ Données chargées depuis l'index allégé`);
+    console.log(`📦 ${index.activities.length} activités`);
+    return index.activities;
+  }
 
   const possiblePaths = [
     'data/activities_with_groups.json',
@@ -263,17 +351,6 @@ export async function loadData() {
 
         console.log(`✅ Données chargées depuis: ${path}`);
         console.log(`📦 ${data.length} activités`);
-
-        // Sauvegarder dans le cache (toujours sauvegarder le tableau)
-        try {
-          sessionStorage.setItem(CACHE_KEY, JSON.stringify(data));
-          sessionStorage.setItem(CACHE_VERSION_KEY, CURRENT_CACHE_VERSION);
-          console.log('💾 Données mises en cache');
-        } catch (storageError) {
-          console.warn('⚠️ Impossible de sauvegarder dans le cache:', storageError.message);
-          // Si localStorage est plein, on continue sans cache
-        }
-
         return data;
       }
     } catch (error) {
@@ -285,39 +362,15 @@ export async function loadData() {
   throw new Error('Impossible de charger le fichier JSON. Chemins testés: ' + possiblePaths.join(', '));
 }
 
-// Fonction pour charger les données de groupe avec cache
+// Fonction pour charger les données de groupe (index allégé en cache, sinon fichier complet)
 export async function loadGroupActivitiesWithCache() {
-  const GROUPS_CACHE_KEY = 'recapmillion_groups_cache';
-
-  // Vérifier le cache
-  const cachedVersion = sessionStorage.getItem(CACHE_VERSION_KEY);
-  const cachedGroups = sessionStorage.getItem(GROUPS_CACHE_KEY);
-
-  if (cachedVersion === CURRENT_CACHE_VERSION && cachedGroups) {
-    try {
-      const data = JSON.parse(cachedGroups);
-      console.log('✅ Données de groupe chargées depuis le cache');
-      return data;
-    } catch (error) {
-      sessionStorage.removeItem(GROUPS_CACHE_KEY);
-    }
-  }
-
-  // Charger depuis le serveur
   try {
-    const response = await fetch('data/activities_with_groups.json');
-    const data = await response.json();
-    const groups = data.group_activities || [];
-
-    // Sauvegarder dans le cache
-    try {
-      sessionStorage.setItem(GROUPS_CACHE_KEY, JSON.stringify(groups));
-      console.log('💾 Données de groupe mises en cache');
-    } catch (storageError) {
-      console.warn('⚠️ Impossible de sauvegarder les groupes dans le cache');
+    let data = await fetchSiteIndex();
+    if (!data) {
+      const response = await fetch('data/activities_with_groups.json');
+      data = await response.json();
     }
-
-    return groups;
+    return data.group_activities || [];
   } catch (e) {
     console.warn('Fichier activities_with_groups.json non trouvé');
     return null;
@@ -325,138 +378,186 @@ export async function loadGroupActivitiesWithCache() {
 }
 
 // ==============================
-// NORMALISATION AVEC CACHE
+// TRACES (CHARGEMENT À LA DEMANDE)
 // ==============================
+let tracksManifestPromise = null;
+const trackShards = {};
 
-export function normalizeMultiDayActivities(data) {
-  // Vérifier si on a une version normalisée en cache
-  const cachedVersion = sessionStorage.getItem(CACHE_VERSION_KEY);
-  const cachedNormalized = sessionStorage.getItem(NORMALIZED_CACHE_KEY);
+function loadTracksManifest() {
+  if (!tracksManifestPromise) {
+    tracksManifestPromise = loadArtifact('tracks');
+  }
+  return tracksManifestPromise;
+}
 
-  if (cachedVersion === CURRENT_CACHE_VERSION && cachedNormalized) {
-    try {
-      const normalized = JSON.parse(cachedNormalized);
-      console.log('✅ Données normalisées chargées depuis le cache');
-      console.log(`📦 ${normalized.length} activités normalisées`);
-      return normalized;
-    } catch (error) {
-      console.warn('⚠️ Cache de normalisation corrompu');
-      sessionStorage.removeItem(NORMALIZED_CACHE_KEY);
-    }
+// Niveau de détail à utiliser pour un zoom Leaflet (null sans traces précalculées)
+export async function getTrackLevel(zoom) {
+  const manifest = await loadTracksManifest();
+  if (!manifest) return null;
+  const level = manifest.levels.find(l => l.max_zoom === null || zoom <= l.max_zoom);
+  return (level || manifest.levels[manifest.levels.length - 1]).name;
+}
+
+// Traces prêtes à tracer des athlètes demandés pour un niveau de détail :
+// { activity_id: [segment encodé, ...] }, lignes droites déjà retirées.
+// Chaque fichier (athlète, niveau) n'est chargé qu'une fois.
+export async function loadTracks(athleteIds, level) {
+  const manifest = await loadTracksManifest();
+  if (!manifest || !level) return {};
+
+  const shards = await Promise.all(athleteIds
+    .filter(id => manifest.shards[id])
+    .map(id => {
+      const key = `${id}.${level}`;
+      if (!trackShards[key]) {
+        trackShards[key] = fetchVersionedJson(`${TRACKS_DIR}${manifest.shards[id].files[level]}`)
+          .catch(error => {
+            console.warn(`⚠️ Traces de l'athlète ${id} indisponibles`, error.message);
+            delete trackShards[key];
+            return {};
+          });
+      }
+      return trackShards[key];
+    }));
+  return Object.assign({}, ...shards);
+}
+
+// ==============================
+// GRILLES DE DENSITÉ (VUE D'ENSEMBLE DE LA CARTE)
+// ==============================
+let densityIndexPromise = null;
+const densityGrids = {};
+
+// Index des grilles de densité écrites par Precompute_groups.py (null s'il est absent)
+export function loadDensityIndex() {
+  if (!densityIndexPromise) {
+    densityIndexPromise = loadArtifact('density');
   }
+  return densityIndexPromise;
+}
 
-  // Sinon, normaliser
-  console.log('🔄 Normalisation des activités multi-jours...');
-  const startTime = performance.now();
+// Zoom de grille pour un zoom Leaflet (le plus proche en dessous), ou null
+// au-delà du zoom maximal des grilles (traces vectorielles) et sans grilles
+export async function getDensityZoom(zoom) {
+  const index = await loadDensityIndex();
+  if (!index || zoom > index.max_zoom) return null;
+  const below = index.zooms.filter(z => z <= zoom);
+  return below.length > 0 ? below[below.length - 1] : index.zooms[0];
+}
 
-  const normalizedData = [];
-  let smoothedCount = 0;
+// Tuiles d'un fichier z<zoom>.bin (format décrit dans pyscripts/density_grid.py) :
+// Map "couche/x/y" -> { cells, counts }
+function parseDensityGrid(buffer) {
+  const view = new DataView(buffer);
+  const tileCount = view.getUint32(0, true);
+  const tiles = new Map();
+  let offset = 4 + tileCount * 10;
+  for (let i = 0; i < tileCount; i++) {
+    const entry = 4 + i * 10;
+    const cellCount = view.getUint32(entry + 6, true);
+    // Les cellules commencent toujours à un décalage pair : vues Uint16Array directes
+    tiles.set(`${view.getUint16(entry, true)}/${view.getUint16(entry + 2, true)}/${view.getUint16(entry + 4, true)}`, {
+      cells: new Uint16Array(buffer, offset, cellCount),
+      counts: new Uint16Array(buffer, offset + 2 * cellCount, cellCount)
+    });
+    offset += 4 * cellCount;
+  }
+  return tiles;
+}
 
-  data.forEach(activity => {
-    const startDate = new Date(activity.start_date);
-    const endDate = new Date(startDate.getTime() + (activity.elapsed_time || activity.moving_time || 0) * 1000);
-
-    const startDay = new Date(startDate.getFullYear(), startDate.getMonth(), startDate.getDate());
-    const endDay = new Date(endDate.getFullYear(), endDate.getMonth(), endDate.getDate());
-    const daysDiff = Math.ceil((endDay - startDay) / (1000 * 60 * 60 * 24)) + 1;
-
-    const elapsedTime = activity.elapsed_time || 0;
-    const movingTime = activity.moving_time || 0;
-    const restRatio = movingTime > 0 ? (elapsedTime - movingTime) / movingTime : 0;
-
-    const shouldSmooth = daysDiff > 1 && restRatio > 0.4;
-    
-    // Debug pour les activités de plusieurs jours
-    if (daysDiff > 1) {
-      console.log(`📅 Multi-jour détecté: "${activity.name}" - ${daysDiff} jours, restRatio=${restRatio.toFixed(2)}, lissé=${shouldSmooth}`);
-    }
+// Tuiles d'un zoom de grille, chaque fichier n'est chargé qu'une fois
+export function loadDensityGrid(zoom) {
+  if (!densityGrids[zoom]) {
+    densityGrids[zoom] = loadDensityIndex()
+      .then(index => fetchVersioned(`${DENSITY_DIR}${index.files[zoom].file}`))
+      .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.arrayBuffer();
+      })
+      .then(parseDensityGrid)
+      .catch(error => {
+        console.warn(`⚠️ Grille de densité z${zoom} indisponible`, error.message);
+        delete densityGrids[zoom];
+        return new Map();
+      });
+  }
+  return densityGrids[zoom];
+}
 
-    if (!shouldSmooth) {
-      normalizedData.push(activity);
-    } else {
-      smoothedCount++;
-      const elevationPerDay = (activity.total_elevation_gain || 0) / daysDiff;
-      const distancePerDay = (activity.distance || 0) / daysDiff;
-      const timePerDay = (activity.moving_time || 0) / daysDiff;
-
-      for (let i = 0; i < daysDiff; i++) {
-        const dayDate = new Date(startDay.getTime() + i * 24 * 60 * 60 * 1000);
-        normalizedData.push({
-          ...activity,
-          activity_id: `${activity.activity_id}_day${i + 1}`,
-          start_date: dayDate.toISOString(),
-          start_date_local: dayDate.toISOString(),
-          total_elevation_gain: elevationPerDay,
-          distance: distancePerDay,
-          moving_time: timePerDay,
-          _isPartOfMultiDay: true,
-          _originalActivityId: activity.activity_id,
-          _dayNumber: i + 1,
-          _totalDays: daysDiff
-        });
-      }
-    }
-  });
+// ==============================
+// CUBE D'AGRÉGATS
+// ==============================
 
-  const endTime = performance.now();
-  console.log(`✅ Normalisation terminée en ${(endTime - startTime).toFixed(0)}ms`);
-  console.log(`📊 ${smoothedCount} activités lissées sur plusieurs jours`);
+// Agrégats précalculés par Precompute_groups.py (totaux, meilleur jour/semaine,
+// séries hebdomadaires et mensuelles) pour chaque combinaison athlète × sport
+let activityCube = null;
 
-  // Sauvegarder dans le cache
-  try {
-    sessionStorage.setItem(NORMALIZED_CACHE_KEY, JSON.stringify(normalizedData));
-    console.log('💾 Données normalisées mises en cache');
-  } catch (error) {
-    console.warn('⚠️ Impossible de mettre en cache les données normalisées');
+const EMPTY_SLICE = { totals: [0, 0, 0, 0], best_day: null, best_week: null, weeks: {}, months: {} };
+
+export async function loadActivityCube() {
+  activityCube = await loadArtifact('cube');
+  if (activityCube) {
+    console.log(`✅ Cube d'agrégats chargé: ${Object.keys(activityCube.slices).length} tranches`);
+  } else {
+    console.warn('⚠️ Cube d\'agrégats indisponible, calcul à partir des activités');
+  }
+  return activityCube;
+}
+
+// Tranche du cube pour un athlète et un sport ('' = tous), ou null sans cube
+export function getCubeSlice(athleteId, sport) {
+  if (!activityCube) return null;
+  return activityCube.slices[`${athleteId || '*'}|${sport || '*'}`] || EMPTY_SLICE;
+}
+
+// ==============================
+// GRAPHE SOCIAL (CO-ACTIVITÉ)
+// ==============================
+
+// Co-activité précalculée par Precompute_groups.py (matrice de D+ partagé,
+// liens par paire, totaux par paire et par sport, statistiques du panneau)
+let coActivity = null;
+
+export async function loadCoActivity() {
+  coActivity = await loadArtifact('co_activity');
+  if (coActivity) {
+    console.log(`✅ Graphe social chargé: ${coActivity.athletes.length} athlètes, ${coActivity.links.length} paires`);
+  } else {
+    console.warn('⚠️ Graphe social précalculé indisponible, calcul à partir des sorties de groupe');
   }
+  return coActivity;
+}
 
-  return normalizedData;
+// Données du graphe social, ou null sans fichier précalculé
+export function getCoActivity() {
+  return coActivity;
 }
 
 // Fonction pour vider le cache (utile pour le développement)
-export function clearCache() {
-  sessionStorage.removeItem(CACHE_KEY);
-  sessionStorage.removeItem(NORMALIZED_CACHE_KEY);
-  sessionStorage.removeItem(CACHE_VERSION_KEY);
-  sessionStorage.removeItem('recapmillion_groups_cache');
+export async function clearCache() {
+  LEGACY_CACHE_KEYS.forEach(key => sessionStorage.removeItem(key));
+  if (dataCacheAvailable()) await caches.delete(DATA_CACHE_NAME);
   console.log('🗑️ Cache vidé');
 }
 
 // Fonction pour obtenir des infos sur le cache
-export function getCacheInfo() {
-  const hasCache = sessionStorage.getItem(CACHE_KEY) !== null;
-  const hasNormalized = sessionStorage.getItem(NORMALIZED_CACHE_KEY) !== null;
-  const version = sessionStorage.getItem(CACHE_VERSION_KEY);
-
-  if (!hasCache) {
+export async function getCacheInfo() {
+  if (!dataCacheAvailable()) {
     return { cached: false };
   }
 
   try {
-    const rawData = JSON.parse(sessionStorage.getItem(CACHE_KEY));
-    const size = new Blob([sessionStorage.getItem(CACHE_KEY)]).size;
-    const sizeKB = (size / 1024).toFixed(2);
-
-    // Gérer différents formats
-    let activities = Array.isArray(rawData) ? rawData : (rawData.activities || []);
-
-    const info = {
-      cached: true,
-      version: version,
-      activities: activities.length,
-      sizeKB: sizeKB,
-      upToDate: version === CURRENT_CACHE_VERSION,
-      hasNormalizedCache: hasNormalized
+    const manifest = await loadSiteManifest();
+    const cache = await caches.open(DATA_CACHE_NAME);
+    const cachedFiles = (await cache.keys()).map(request => new URL(request.url).pathname);
+    const current = new Set((manifest?.files || []).map(file => new URL(DATA_DIR + file, location.href).pathname));
+
+    return {
+      cached: cachedFiles.length > 0,
+      files: cachedFiles.length,
+      upToDate: manifest !== null && cachedFiles.every(path => current.has(path)),
+      missing: Array.from(current).filter(path => !cachedFiles.includes(path)).length
     };
-
-    if (hasNormalized) {
-      const normalizedData = JSON.parse(sessionStorage.getItem(NORMALIZED_CACHE_KEY));
-      const normalizedSize = new Blob([sessionStorage.getItem(NORMALIZED_CACHE_KEY)]).size;
-      info.normalizedActivities = normalizedData.length;
-      info.normalizedSizeKB = (normalizedSize / 1024).toFixed(2);
-    }
-
-    return info;
   } catch (error) {
     return { cached: false, error: true };
   }
@@ -473,13 +574,24 @@ if (typeof window !== 'undefined') {
 // ==============================
 let statsAnimated = false;
 
-export function updateStats(filteredData) {
+export function updateStats(filteredData, athleteId = '', sport = '') {
   const TARGET = 1000000;
 
-  const totalElevation = filteredData.reduce((sum, a) => sum + (a.total_elevation_gain || 0), 0);
-  const totalActivities = filteredData.length;
-  const totalDistance = Math.round(filteredData.reduce((sum, a) => sum + (a.distance || 0), 0) / 1000);
-  const totalTime = Math.round(filteredData.reduce((sum, a) => sum + (a.moving_time || 0), 0) / 3600);
+  // Tranche précalculée si le cube est chargé, sinon parcours des activités
+  const slice = getCubeSlice(athleteId, sport);
+  let totalElevation, totalActivities, totalDistance, totalTime;
+  if (slice) {
+    const [elevation, distance, movingTime, count] = slice.totals;
+    totalElevation = elevation;
+    totalActivities = count;
+    totalDistance = Math.round(distance / 1000);
+    totalTime = Math.round(movingTime / 3600);
+  } else {
+    totalElevation = filteredData.reduce((sum, a) => sum + (a.total_elevation_gain || 0), 0);
+    totalActivities = filteredData.length;
+    totalDistance = Math.round(filteredData.reduce((sum, a) => sum + (a.distance || 0), 0) / 1000);
+    totalTime = Math.round(filteredData.reduce((sum, a) => sum + (a.moving_time || 0), 0) / 3600);
+  }
 
   window.statsValues = { totalElevation, totalActivities, totalDistance, totalTime, TARGET };
  //console.log(`📊 updateStats appelé avec ${filteredData.length} activités, statsAnimated=${statsAnimated}`);
@@ -491,11 +603,11 @@ export function updateStats(filteredData) {
     //console.log(`📊 statsAnimated = ${statsAnimated}`);
   }
 
-  const bestDay = findBestDay(filteredData);
+  const bestDay = slice ? bestDayFromSlice(slice) : findBestDay(filteredData);
   document.getElementById('bestDay').textContent = bestDay ?
     `${bestDay.date} (${bestDay.elevation.toLocaleString('fr-FR')} m)` : '-';
 
-  const bestWeek = findBestWeek(filteredData);
+  const bestWeek = slice ? bestWeekFromSlice(slice) : findBestWeek(filteredData);
   document.getElementById('bestWeek').textContent = bestWeek ?
     `${bestWeek.period} (${bestWeek.elevation.toLocaleString('fr-FR')} m)` : '-';
 
@@ -600,6 +712,20 @@ export function resetStatsAnimation() {
   statsAnimated = false;
 }
 
+function bestDayFromSlice(slice) {
+  if (!slice.best_day) return null;
+  return { date: formatDate(new Date(slice.best_day.date)), elevation: slice.best_day.elevation };
+}
+
+function bestWeekFromSlice(slice) {
+  if (!slice.best_week) return null;
+  const { start, end, elevation } = slice.best_week;
+  return {
+    period: `${formatDate(new Date(start))} - ${formatDate(new Date(end))}`,
+    elevation
+  };
+}
+
 function findBestDay(data) {
   if (!data || data.length === 0) return null;
 
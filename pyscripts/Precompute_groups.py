@@ -4,34 +4,101 @@ Script pour pre-calculer les sorties de groupe a partir des activites Strava.
 Detecte les activites faites ensemble (meme heure, meme duree, meme type de sport).
 """
 
+import argparse
 import json
 import sys
 import os
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from math import radians, sin, cos, sqrt, atan2
-import time
 import urllib.request
 import urllib.parse
 
+import activity_cube
+import co_activity
+import density_grid
+import geocoding_queue
+import manifest
+import offline_geocoder
+import polyline_engine
+import route_index
+import run_metrics
+import site_artifacts
+import track_cache as track_store
+import track_simplify
+
+try:
+    import pyarrow as pa
+    import activity_store
+except ImportError:
+    pa = activity_store = None
+
 # Configuration
 INPUT_FILE = '../public/data/all_activities_2025.json'
 OUTPUT_FILE = '../public/data/activities_with_groups.json'
+# Charge utile du site, à côté de la sortie, à noms versionnés (site_artifacts.py) :
+# agrégats du tableau de bord (activity_cube.py), graphe social (co_activity.py),
+# index allégé (sans traces) et traces résumées réparties par athlète, avec leur manifeste
+CUBE_FILENAME = 'activity_cube.json'
+CO_ACTIVITY_FILENAME = 'co_activity.json'
+INDEX_FILENAME = 'activities_index.json'
+TRACKS_DIRNAME = 'tracks'
+TRACKS_MANIFEST_FILENAME = 'manifest.json'
+# Grilles de densité des traces pour la vue d'ensemble de la carte (density_grid.py)
+DENSITY_DIRNAME = 'density'
+ROUTE_INDEX_FILENAME = 'route_index.json'
+FREQUENT_ROUTES_FILENAME = 'frequent_routes.json'
 COUNTRY_CACHE_FILE = 'country_cache.json'
+COUNTRY_JOURNAL_FILE = 'country_cache.journal'
+TRACK_CACHE_FILE = 'track_cache.sqlite'
+# Empreintes de l'entrée, de la sortie et de chaque journée (recalcul incrémental)
+MANIFEST_FILE = 'precompute_manifest.json'
+MANIFEST_VERSION = 5
+# Durées, mémoire et compteurs de chaque exécution (run_metrics)
+METRICS_FILE = 'precompute_metrics.json'
+# Année lue dans le stockage canonique (--store)
+YEAR = 2025
 
 MAX_START_TIME_DIFF_MINUTES = 60
 MAX_DURATION_DIFF_SECONDS = 7200
 POLYLINE_CORRIDOR_WIDTH_METERS = 150
 POLYLINE_MIN_SIMILARITY = 0.5
 POLYLINE_SAMPLE_RATE = 30
+# Moteur de comparaison des traces: 'numpy' (vectorisé) ou 'python' (référence)
+POLYLINE_ENGINE = 'numpy' if polyline_engine.is_available() else 'python'
 MAX_DISTANCE_DEVIATION_PERCENT = 0.20
 MAX_ELEVATION_DEVIATION_PERCENT = 0.20
 MIN_GROUP_SIZE = 2
 
+# Pré-filtrage des paires candidates (cellule de grille sur start_latlng, en degrés)
+# Deux activités avec trace dont les cellules de départ ne sont pas voisines ne sont
+# jamais comparées (sans trace, la paire reste jugée sur l'heure, la durée et la
+# distance). None pour désactiver le filtre spatial.
+CANDIDATE_GRID_CELL_DEGREES = 0.5
+
 # Seuils stricts pour le fallback sans polyline ou avec polyline faible
 STRICT_TIME_DIFF_MINUTES = 15
 STRICT_DURATION_DIFF_SECONDS = 600  # 10 min
 STRICT_DISTANCE_DEVIATION_PERCENT = 0.10
+# Similarité minimale des traces pour le fallback sur les seuils stricts
+POLYLINE_STRICT_MIN_SIMILARITY = 0.2
+
+# Seuils appliqués aux caractéristiques des paires (classify_pair), variables avec --sweep
+THRESHOLD_NAMES = ('MAX_START_TIME_DIFF_MINUTES', 'MAX_DURATION_DIFF_SECONDS', 'POLYLINE_MIN_SIMILARITY',
+                   'POLYLINE_STRICT_MIN_SIMILARITY', 'STRICT_TIME_DIFF_MINUTES', 'STRICT_DURATION_DIFF_SECONDS',
+                   'STRICT_DISTANCE_DEVIATION_PERCENT', 'MAX_DISTANCE_DEVIATION_PERCENT',
+                   'MAX_ELEVATION_DEVIATION_PERCENT', 'MIN_GROUP_SIZE')
+# Caractéristiques des paires candidates par journée, reprises d'une exécution à l'autre
+PAIR_FEATURES_FILE = 'pair_features.json'
+PAIR_FEATURES_VERSION = 3
+
+# Géocodage en ligne (uniquement pour les points hors des contours offline)
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/reverse'
+GEOCODING_WORKERS = 4
+GEOCODING_RATE_PER_SECOND = 1.0
+GEOCODING_RETRIES = 3
+GEOCODING_BACKOFF_SECONDS = 1.0
 
 EXCLUDED_SPORTS = [
     'AlpineSki', 'Snowboard', 'EBikeRide', 'EMountainBikeRide',
@@ -41,6 +108,9 @@ EXCLUDED_SPORTS = [
     'IceSkate', 'Surfing','Skateboard','Pilates'
 ]
 
+# Sports exclus du tableau de bord (excludedSports dans public/js/utils.js)
+CUBE_EXCLUDED_SPORTS = EXCLUDED_SPORTS + ['Tennis']
+
 SPORT_MAPPING = {
     'Run': 'Run', 'TrailRun': 'Run', 'VirtualRun': 'Run',
     'Ride': 'Bike', 'MountainBikeRide': 'Bike', 'GravelRide': 'Bike',
@@ -61,6 +131,19 @@ ATHLETE_NAMES = {
 
 # Cache pour stocker les résultats de géocodage
 country_cache = {}
+# Journal des résultats obtenus depuis la dernière sauvegarde du cache
+country_journal = geocoding_queue.CacheJournal(COUNTRY_JOURNAL_FILE)
+# Limite de débit Nominatim commune à toutes les requêtes de l'exécution
+geocoding_bucket = geocoding_queue.TokenBucket(GEOCODING_RATE_PER_SECOND)
+
+# Traces décodées (mémoire seule par défaut, persistée sur disque par main)
+track_cache = track_store.TrackCache()
+
+# Compteurs de la détection de groupes (affichés en fin d'exécution et écrits
+# dans METRICS_FILE) : paires, rejets par critère, comparaisons de traces
+detection_stats = defaultdict(int)
+# Compteurs du géocodage (points résolus offline, cache, requêtes Nominatim)
+geocoding_stats = defaultdict(int)
 
 
 def load_country_cache():
@@ -74,11 +157,24 @@ def load_country_cache():
         except:
             country_cache = {}
 
+    # Reprendre les résultats d'une exécution interrompue
+    replayed = country_journal.replay(country_cache)
+    if replayed:
+        print(f"  Journal de geocodage rejoue: {replayed} entrees")
+
+    # Noms d'anciennes entrées ramenés au vocabulaire commun (voir translate_country_to_french)
+    for key, country in country_cache.items():
+        if country:
+            country_cache[key] = translate_country_to_french(country)
+
 
 def save_country_cache():
-    """Sauvegarde le cache des pays dans un fichier."""
-    with open(COUNTRY_CACHE_FILE, 'w', encoding='utf-8') as f:
+    """Sauvegarde le cache des pays dans un fichier, puis vide le journal."""
+    tmp_file = COUNTRY_CACHE_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(country_cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, COUNTRY_CACHE_FILE)
+    country_journal.clear()
 
 
 def translate_country_to_french(country_name):
@@ -98,7 +194,10 @@ def translate_country_to_french(country_name):
         'Bulgaria': 'Bulgarie', 'Hungary': 'Hongrie', 'Finland': 'Finlande',
         'Denmark': 'Danemark', 'Iceland': 'Islande', 'Ireland': 'Irlande',
         'Luxembourg': 'Luxembourg', 'Estonia': 'Estonie', 'Latvia': 'Lettonie',
-        'Lithuania': 'Lituanie',
+        'Lithuania': 'Lituanie', 'Andorra': 'Andorre', 'Belarus': 'Biélorussie', 'Cyprus': 'Chypre',
+        'Malta': 'Malte', 'Moldova': 'Moldavie', 'Russia': 'Russie', 'San Marino': 'Saint-Marin',
+        'Vatican City': 'Vatican', 'Åland Islands': 'Åland', 'Faroe Islands': 'Îles Féroé',
+        'Guernsey': 'Guernesey', 'Isle of Man': 'Île de Man', 'Svalbard & Jan Mayen': 'Svalbard et Jan Mayen',
         # Asie
         'China': 'Chine', 'India': 'Inde', 'Japan': 'Japon', 'South Korea': 'Corée du Sud',
         'Thailand': 'Thaïlande', 'Vietnam': 'Vietnam', 'Indonesia': 'Indonésie',
@@ -107,9 +206,15 @@ def translate_country_to_french(country_name):
         'Laos': 'Laos', 'Singapore': 'Singapour', 'Bangladesh': 'Bangladesh',
         'Pakistan': 'Pakistan', 'Afghanistan': 'Afghanistan', 'Sri Lanka': 'Sri Lanka',
         'Maldives': 'Maldives', 'Taiwan': 'Taïwan', 'Mongolia': 'Mongolie',
+        'North Korea': 'Corée du Nord', 'Myanmar (Burma)': 'Myanmar', 'Macau': 'Macao',
+        'East Timor': 'Timor oriental', 'Kyrgyzstan': 'Kirghizistan', 'Tajikistan': 'Tadjikistan',
+        'Turkmenistan': 'Turkménistan', 'Uzbekistan': 'Ouzbékistan',
         # Amérique du Nord
-        'United States': 'États-Unis', 'USA': 'États-Unis', 'Canada': 'Canada',
-        'Mexico': 'Mexique',
+        # Même nom que Nominatim (accept-language=fr), donc que le cache de pays
+        'United States': "États-Unis d'Amérique", 'United States of America': "États-Unis d'Amérique",
+        'USA': "États-Unis d'Amérique", 'États-Unis': "États-Unis d'Amérique", 'Canada': 'Canada',
+        'Mexico': 'Mexique', 'Greenland': 'Groenland', 'Bermuda': 'Bermudes',
+        'St Pierre & Miquelon': 'Saint-Pierre-et-Miquelon',
         # Amérique centrale
         'Guatemala': 'Guatemala', 'Belize': 'Belize', 'El Salvador': 'Salvador',
         'Honduras': 'Honduras', 'Nicaragua': 'Nicaragua', 'Costa Rica': 'Costa Rica',
@@ -123,6 +228,12 @@ def translate_country_to_french(country_name):
         'Australia': 'Australie', 'New Zealand': 'Nouvelle-Zélande',
         'Papua New Guinea': 'Papouasie-Nouvelle-Guinée', 'Fiji': 'Fidji',
         'New Caledonia': 'Nouvelle-Calédonie', 'French Polynesia': 'Polynésie française',
+        'Samoa (American)': 'Samoa américaines', 'Samoa (western)': 'Samoa', 'Cook Islands': 'Îles Cook',
+        'Micronesia': 'Micronésie', 'Guam': 'Guam', 'Marshall Islands': 'Îles Marshall',
+        'Northern Mariana Islands': 'Îles Mariannes du Nord', 'Norfolk Island': 'Île Norfolk',
+        'Pitcairn': 'Îles Pitcairn', 'Palau': 'Palaos', 'Solomon Islands': 'Îles Salomon',
+        'Wallis & Futuna': 'Wallis-et-Futuna', 'Christmas Island': 'Île Christmas',
+        'Cocos (Keeling) Islands': 'Îles Cocos', 'US minor outlying islands': 'Îles mineures éloignées des États-Unis',
         # Afrique
         'South Africa': 'Afrique du Sud', 'Egypt': 'Égypte', 'Morocco': 'Maroc',
         'Algeria': 'Algérie', 'Tunisia': 'Tunisie', 'Libya': 'Libye', 'Kenya': 'Kenya',
@@ -132,6 +243,15 @@ def translate_country_to_french(country_name):
         'Democratic Republic of the Congo': 'RD Congo', 'Zimbabwe': 'Zimbabwe',
         'Botswana': 'Botswana', 'Namibia': 'Namibie', 'Mozambique': 'Mozambique',
         'Madagascar': 'Madagascar', 'Réunion': 'La Réunion', 'Mauritius': 'Maurice',
+        "Côte d’Ivoire": "Côte d'Ivoire", 'Benin': 'Bénin', 'Central African Rep.': 'République centrafricaine',
+        'Congo (Rep.)': 'République du Congo', 'Cape Verde': 'Cap-Vert', 'Western Sahara': 'Sahara occidental',
+        'Eritrea': 'Érythrée', 'Gambia': 'Gambie', 'Guinea': 'Guinée', 'Equatorial Guinea': 'Guinée équatoriale',
+        'Guinea-Bissau': 'Guinée-Bissau', 'Comoros': 'Comores', 'Liberia': 'Libéria',
+        'Mauritania': 'Mauritanie', 'Sudan': 'Soudan', 'South Sudan': 'Soudan du Sud', 'Somalia': 'Somalie',
+        'St Helena': 'Sainte-Hélène', 'Sao Tome & Principe': 'Sao Tomé-et-Principe',
+        'Eswatini (Swaziland)': 'Eswatini', 'Chad': 'Tchad', 'Zambia': 'Zambie',
+        'British Indian Ocean Territory': "Territoire britannique de l'océan Indien",
+        'French S. Terr.': 'Terres australes et antarctiques françaises',
         # Moyen-Orient
         'Turkey': 'Turquie', 'Israel': 'Israël', 'Jordan': 'Jordanie', 'Lebanon': 'Liban',
         'Syria': 'Syrie', 'Iraq': 'Irak', 'Iran': 'Iran', 'Saudi Arabia': 'Arabie saoudite',
@@ -143,15 +263,48 @@ def translate_country_to_french(country_name):
         'Dominican Republic': 'République dominicaine', 'Puerto Rico': 'Porto Rico',
         'Trinidad and Tobago': 'Trinité-et-Tobago', 'Barbados': 'Barbade',
         'Guadeloupe': 'Guadeloupe', 'Martinique': 'Martinique',
+        'Antigua & Barbuda': 'Antigua-et-Barbuda', 'St Barthelemy': 'Saint-Barthélemy',
+        'Caribbean NL': 'Pays-Bas caribéens', 'Dominica': 'Dominique', 'Grenada': 'Grenade',
+        'St Kitts & Nevis': 'Saint-Christophe-et-Niévès', 'Cayman Islands': 'Îles Caïmans',
+        'St Lucia': 'Sainte-Lucie', 'St Martin (French)': 'Saint-Martin',
+        'St Maarten (Dutch)': 'Saint-Martin (Pays-Bas)', 'Turks & Caicos Is': 'Îles Turques-et-Caïques',
+        'St Vincent': 'Saint-Vincent-et-les-Grenadines', 'Virgin Islands (UK)': 'Îles Vierges britanniques',
+        'Virgin Islands (US)': 'Îles Vierges des États-Unis',
+        # Autres
+        'Antarctica': 'Antarctique', 'Falkland Islands': 'Îles Malouines',
+        'South Georgia & the South Sandwich Islands': 'Géorgie du Sud-et-les îles Sandwich du Sud',
     }
 
     # Retourner la traduction ou le nom original si pas de correspondance
     return translations.get(country_name, country_name)
 
 
+def fetch_country_nominatim(lat, lon):
+    """
+    Interroge Nominatim (NOMINATIM_URL) pour un point ; lève une exception en cas d'erreur.
+    """
+    # Utiliser l'API Nominatim d'OpenStreetMap (gratuite, pas de clé nécessaire)
+    # Ajouter accept-language=fr pour obtenir les noms en français
+    url = f"{NOMINATIM_URL}?format=json&lat={lat}&lon={lon}&zoom=3&accept-language=fr"
+
+    # Ajouter un User-Agent requis par Nominatim
+    req = urllib.request.Request(url, headers={'User-Agent': 'StravaGroupDetector/1.0'})
+
+    with urllib.request.urlopen(req, timeout=5) as response:
+        data = json.loads(response.read().decode('utf-8'))
+
+    country = data.get('address', {}).get('country')
+
+    # Traduire le nom du pays en français si nécessaire
+    if country:
+        country = translate_country_to_french(country)
+    return country
+
+
 def get_country_from_coords(lat, lon):
     """
-    Détermine le pays à partir des coordonnées GPS en utilisant Nominatim.
+    Détermine le pays à partir des coordonnées GPS en utilisant Nominatim, par la
+    file de géocodage (même limite de débit et mêmes reprises que resolve_countries).
     Utilise un cache local pour éviter les appels répétés.
     """
     if lat is None or lon is None:
@@ -160,69 +313,66 @@ def get_country_from_coords(lat, lon):
     # Arrondir les coordonnées pour le cache (précision de ~1km)
     cache_key = f"{round(lat, 2)},{round(lon, 2)}"
 
-    # Vérifier le cache
+    if cache_key not in country_cache:
+        stats = geocoding_queue.resolve_keys(
+            {cache_key: (lat, lon)}, fetch_country_nominatim, country_journal, country_cache,
+            workers=1, retries=GEOCODING_RETRIES, backoff=GEOCODING_BACKOFF_SECONDS, bucket=geocoding_bucket
+        )
+        for key in ('requests', 'retries', 'failures'):
+            geocoding_stats[key] += stats[key]
+
     if cache_key in country_cache:
         return country_cache[cache_key]
-
-    try:
-        # Utiliser l'API Nominatim d'OpenStreetMap (gratuite, pas de clé nécessaire)
-        # Ajouter accept-language=fr pour obtenir les noms en français
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=3&accept-language=fr"
-
-        # Ajouter un User-Agent requis par Nominatim
-        req = urllib.request.Request(url, headers={'User-Agent': 'StravaGroupDetector/1.0'})
-
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-            country = data.get('address', {}).get('country')
-
-            # Traduire le nom du pays en français si nécessaire
-            if country:
-                country = translate_country_to_french(country)
-
-            # Mettre en cache
-            country_cache[cache_key] = country
-
-            # Respecter les limites de taux (1 requête par seconde)
-            time.sleep(1)
-
-            return country
-    except Exception as e:
-        # En cas d'erreur, essayer le fallback avec des bounding boxes
-        print(f"  Erreur geocoding pour ({lat}, {lon}): {e}")
-        return get_country_fallback(lat, lon)
+    # En cas d'échec, essayer le fallback offline
+    return get_country_fallback(lat, lon)
 
 
 def get_country_fallback(lat, lon):
     """
-    Méthode de fallback utilisant des bounding boxes pour les pays principaux.
-    """
-    # Bounding boxes approximatives des pays les plus communs
-    COUNTRY_BOXES = {
-        'France': (41.0, 51.5, -5.5, 10.0),
-        'Suisse': (45.7, 47.9, 5.8, 10.6),
-        'Italie': (35.5, 47.2, 6.5, 18.8),
-        'Espagne': (36.0, 43.9, -9.5, 3.5),
-        'Allemagne': (47.2, 55.1, 5.8, 15.1),
-        'Belgique': (49.4, 51.6, 2.5, 6.5),
-        'Pays-Bas': (50.7, 53.7, 3.3, 7.3),
-        'Royaume-Uni': (49.9, 61.0, -8.2, 2.0),
-        'Autriche': (46.4, 49.1, 9.5, 17.2),
-        'Portugal': (36.9, 42.2, -9.6, -6.1),
-        'Norvège': (57.9, 71.3, 4.5, 31.3),
-        'Suède': (55.3, 69.1, 10.9, 24.2),
-        'Népal': (26.3, 30.5, 80.0, 88.3),
-        'Nouvelle-Zélande': (-47.3, -34.4, 166.4, 178.6),
-        'Salvador': (13.1, 14.5, -90.1, -87.7),
-        'Serbie': (42.2, 46.2, 18.8, 23.0),
-    }
+    Méthode offline utilisant les contours simplifiés des pays (offline_geocoder).
+    """
+    return offline_geocoder.get_index().lookup(lat, lon)
 
-    for country, (lat_min, lat_max, lon_min, lon_max) in COUNTRY_BOXES.items():
-        if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-            return country
 
-    return None
+def resolve_countries(points, use_online_geocoding=True):
+    """
+    Résout en une passe le pays de tous les points [lat, lon] (start_latlng).
+    L'index de polygones offline répond pour tous les points ; en mode en ligne
+    le cache de pays reste prioritaire et Nominatim n'est interrogé que pour
+    les points hors polygones (en mer, hors données).
+    Renvoie un dict {(lat, lon): pays}.
+    """
+    countries = offline_geocoder.get_index().lookup_many(points)
+    geocoding_stats['points'] += len(countries)
+    geocoding_stats['offline_resolved'] += sum(1 for c in countries.values() if c is not None)
+    if not use_online_geocoding:
+        return countries
+
+    # Clés de cache manquantes, un point représentatif par clé
+    missing = {}
+    for (lat, lon), country in countries.items():
+        cache_key = f"{round(lat, 2)},{round(lon, 2)}"
+        if country is None and cache_key not in country_cache:
+            missing.setdefault(cache_key, (lat, lon))
+        elif country is None:
+            geocoding_stats['cache_hits'] += 1
+
+    if missing:
+        print(f"  Geocodage en ligne de {len(missing)} cles manquantes...")
+        stats = geocoding_queue.resolve_keys(
+            missing, fetch_country_nominatim, country_journal, country_cache,
+            workers=GEOCODING_WORKERS, retries=GEOCODING_RETRIES, backoff=GEOCODING_BACKOFF_SECONDS,
+            bucket=geocoding_bucket
+        )
+        print(f"  {stats['requests']} requetes, {stats['retries']} reprises, {stats['failures']} echecs")
+        for key in ('requests', 'retries', 'failures'):
+            geocoding_stats[key] += stats[key]
+
+    for (lat, lon), country in countries.items():
+        cache_key = f"{round(lat, 2)},{round(lon, 2)}"
+        if cache_key in country_cache:
+            countries[(lat, lon)] = country_cache[cache_key]
+    return countries
 
 
 def decode_polyline(encoded):
@@ -276,9 +426,27 @@ def compare_polylines(poly1, poly2):
     return match_count / len(sampled1) if sampled1 else 0
 
 
-def normalize_activity(activity, use_online_geocoding=True):
+def polyline_similarity(r1, r2):
+    """
+    Similarité entre les traces de deux activités (ActivityRecord), calculée par
+    le moteur POLYLINE_ENGINE. Chaque trace n'est décodée qu'une fois grâce au
+    cache de traces.
+    """
+    detection_stats['polyline_comparisons'] += 1
+    track1 = track_cache.get(r1.activity_id, r1.polyline)
+    track2 = track_cache.get(r2.activity_id, r2.polyline)
+    if POLYLINE_ENGINE == 'numpy':
+        return polyline_engine.corridor_similarity(
+            track_store.to_numpy(track1), track_store.to_numpy(track2),
+            POLYLINE_CORRIDOR_WIDTH_METERS, POLYLINE_SAMPLE_RATE
+        )
+    return compare_polylines(track_store.to_latlng_list(track1), track_store.to_latlng_list(track2))
+
+
+def normalize_activity(activity, use_online_geocoding=True, countries=None):
     """
     Normalise une activité au format attendu par le reste du script.
+    countries: pays déjà résolus par resolve_countries (sinon résolution point par point).
     """
     # Extraire l'athlete_id depuis l'objet athlete
     athlete_id = activity.get('athlete', {}).get('id')
@@ -290,7 +458,9 @@ def normalize_activity(activity, use_online_geocoding=True):
     start_latlng = activity.get('start_latlng', [])
     country = None
     if start_latlng and len(start_latlng) >= 2:
-        if use_online_geocoding:
+        if countries is not None:
+            country = countries.get((start_latlng[0], start_latlng[1]))
+        elif use_online_geocoding:
             country = get_country_from_coords(start_latlng[0], start_latlng[1])
         else:
             country = get_country_fallback(start_latlng[0], start_latlng[1])
@@ -315,161 +485,1003 @@ def normalize_activity(activity, use_online_geocoding=True):
     }
 
 
+# Codes des catégories de sport des ActivityRecord ('Other' pour les sports non classés)
+SPORT_CATEGORY_CODES = {category: code for code, category in
+                        enumerate(sorted(set(SPORT_MAPPING.values()) | {'Other'}))}
+# Marge du filtre par emprise des traces, en degrés de latitude : le couloir
+# avec une large réserve pour l'erreur de projection du moteur NumPy
+BBOX_MARGIN_DEGREES = 2 * POLYLINE_CORRIDOR_WIDTH_METERS / 111320
+
+
+class ActivityRecord:
+    """
+    Caractéristiques d'une activité utiles à la détection, calculées une fois :
+    départ en secondes epoch, code de catégorie, valeurs numériques, point et
+    cellule de départ, emprise et cellules de route de la trace (calculées au
+    premier besoin).
+    """
+    __slots__ = ('activity_id', 'athlete_id', 'start', 'category', 'moving_time', 'distance',
+                 'elevation', 'start_latlng', 'cell', 'polyline', '_bbox', '_route_cells', '_near_cells')
+
+    def __init__(self, activity):
+        self.activity_id = activity['activity_id']
+        self.athlete_id = activity['athlete_id']
+        self.start = datetime.fromisoformat(activity['start_date'].replace('Z', '+00:00')).timestamp()
+        self.category = SPORT_CATEGORY_CODES[map_sport(activity['sport_type'])]
+        self.moving_time = activity.get('moving_time', 0) or 0
+        self.distance = activity.get('distance', 0) or 0
+        self.elevation = activity.get('total_elevation_gain', 0) or 0
+        start_latlng = activity.get('start_latlng')
+        self.start_latlng = tuple(start_latlng[:2]) if start_latlng and len(start_latlng) >= 2 else None
+        self.polyline = (activity.get('map') or {}).get('summary_polyline')
+        # Filtre spatial des paires candidates réservé aux activités avec trace
+        self.cell = start_cell(activity) if self.polyline else None
+        self._bbox = None
+        self._route_cells = None
+        self._near_cells = (None, None)
+
+    def bbox(self):
+        """(lat min, lon min, lat max, lon max) de la trace, None si elle est vide."""
+        if self._bbox is None:
+            self._bbox = track_store.bounding_box(track_cache.get(self.activity_id, self.polyline)) or ()
+        return self._bbox or None
+
+    def route_cells(self):
+        """Cellules de route de la trace (signature de route_index)."""
+        if self._route_cells is None:
+            self._route_cells = route_index.route_cells(track_cache.get(self.activity_id, self.polyline))
+        return self._route_cells
+
+    def near_cells(self, lng_cells):
+        """Cellules de route élargies d'une ligne et de lng_cells colonnes."""
+        if self._near_cells[0] != lng_cells:
+            self._near_cells = (lng_cells, route_index.neighbour_cells(self.route_cells(), lng_cells))
+        return self._near_cells[1]
+
+
+def tracks_may_overlap(r1, r2):
+    """
+    Faux si les emprises des deux traces, élargies du couloir, sont disjointes :
+    aucun point d'une trace n'est alors dans le couloir de l'autre (similarité nulle).
+    """
+    box1, box2 = r1.bbox(), r2.bbox()
+    if box1 is None or box2 is None:
+        return True
+    lat_margin = BBOX_MARGIN_DEGREES
+    lon_margin = BBOX_MARGIN_DEGREES / max(0.01, cos(radians(max(abs(box1[0]), abs(box1[2]),
+                                                                   abs(box2[0]), abs(box2[2])))))
+    return (box1[0] - lat_margin <= box2[2] and box2[0] - lat_margin <= box1[2] and
+            box1[1] - lon_margin <= box2[3] and box2[1] - lon_margin <= box1[3])
+
+
+def routes_may_overlap(r1, r2):
+    """
+    Faux si aucune cellule de route de r1 n'est voisine d'une cellule de r2
+    (voisinage couvrant le couloir) : aucun point de r1 n'est alors dans le
+    couloir de r2 (similarité nulle). Emprises supposées non vides.
+    """
+    box1, box2 = r1.bbox(), r2.bbox()
+    lng_cells = route_index.corridor_lng_cells(
+        BBOX_MARGIN_DEGREES, max(abs(box1[0]), abs(box1[2]), abs(box2[0]), abs(box2[2])))
+    return not r1.route_cells().isdisjoint(r2.near_cells(lng_cells))
+
+
+# Caractéristiques brutes d'une paire, indépendantes des seuils : écarts de
+# départ (min) et de temps en mouvement (s), écarts relatifs de distance et de
+# D+, similarité des traces (None si une trace manque)
+PairFeatures = namedtuple('PairFeatures', ['time_diff', 'duration_diff', 'distance_deviation',
+                                           'elevation_deviation', 'similarity'])
+
+
+def current_thresholds():
+    """Seuils de THRESHOLD_NAMES, avec les valeurs actuelles des constantes."""
+    return {name: globals()[name] for name in THRESHOLD_NAMES}
+
+
 def activities_match(a1, a2):
+    """Les deux activités (dicts normalisés) sont-elles la même sortie ?"""
+    return records_match(ActivityRecord(a1), ActivityRecord(a2))
+
+
+def records_match(r1, r2):
+    """activities_match sur des ActivityRecord, sans recalcul par paire."""
+    detection_stats['match_calls'] += 1
     # Même catégorie de sport
-    if map_sport(a1['sport_type']) != map_sport(a2['sport_type']):
+    if r1.category != r2.category:
+        detection_stats['rejected_sport'] += 1
         return False
+    return classify_pair(pair_features(r1, r2), current_thresholds(), detection_stats)
 
-    # Calcul des différences
-    t1 = datetime.fromisoformat(a1['start_date'].replace('Z', '+00:00'))
-    t2 = datetime.fromisoformat(a2['start_date'].replace('Z', '+00:00'))
-    time_diff_min = abs((t1 - t2).total_seconds()) / 60
 
-    dur1, dur2 = a1.get('moving_time', 0) or 0, a2.get('moving_time', 0) or 0
-    dur_diff = abs(dur1 - dur2)
+def pair_features(r1, r2):
+    """
+    Caractéristiques d'une paire d'activités de même catégorie. La similarité
+    (trace de r1 dans le couloir de r2) vaut 0 sans la calculer quand les
+    emprises ou les cellules de route sont trop éloignées.
+    """
+    avg_dist = (r1.distance + r2.distance) / 2
+    avg_elev = (r1.elevation + r2.elevation) / 2
+    similarity = None
+    if r1.polyline and r2.polyline:
+        # Emprises disjointes : similarité nulle, inutile de comparer les traces
+        if not tracks_may_overlap(r1, r2):
+            detection_stats['rejected_bbox'] += 1
+            similarity = 0.0
+        # Emprises proches mais routes éloignées (boucles voisines, aller-retour décalés)
+        elif r1.bbox() is not None and r2.bbox() is not None and not routes_may_overlap(r1, r2):
+            detection_stats['rejected_route_cells'] += 1
+            similarity = 0.0
+        else:
+            similarity = float(polyline_similarity(r1, r2))
+    return PairFeatures(
+        abs(r1.start - r2.start) / 60,
+        abs(r1.moving_time - r2.moving_time),
+        abs(r1.distance - r2.distance) / avg_dist if avg_dist > 0 else 0,
+        abs(r1.elevation - r2.elevation) / avg_elev if avg_elev > 0 else 0,
+        similarity,
+    )
 
-    dist1, dist2 = a1.get('distance', 0) or 0, a2.get('distance', 0) or 0
-    avg_dist = (dist1 + dist2) / 2
-    dist_deviation = abs(dist1 - dist2) / avg_dist if avg_dist > 0 else 0
 
-    elev1, elev2 = a1.get('total_elevation_gain', 0) or 0, a2.get('total_elevation_gain', 0) or 0
-    avg_elev = (elev1 + elev2) / 2
-    elev_deviation = abs(elev1 - elev2) / avg_elev if avg_elev > 0 else 0
+def classify_pair(features, thresholds, stats):
+    """
+    Verdict d'une paire à partir de ses caractéristiques et des seuils
+    (current_thresholds) ; stats reçoit le compteur de la règle appliquée.
+    """
+    time_diff_min, dur_diff, dist_deviation, elev_deviation, similarity = features
 
     # Critères de base
-    if time_diff_min > MAX_START_TIME_DIFF_MINUTES:
+    if time_diff_min > thresholds['MAX_START_TIME_DIFF_MINUTES']:
+        stats['rejected_start_time'] += 1
         return False
-    if dur_diff > MAX_DURATION_DIFF_SECONDS:
+    if dur_diff > thresholds['MAX_DURATION_DIFF_SECONDS']:
+        stats['rejected_duration'] += 1
         return False
 
     # Comparer les traces GPS si disponibles
-    poly1_enc = a1.get('map', {}).get('summary_polyline')
-    poly2_enc = a2.get('map', {}).get('summary_polyline')
-
-    if poly1_enc and poly2_enc:
-        similarity = compare_polylines(decode_polyline(poly1_enc), decode_polyline(poly2_enc))
-
+    if similarity is not None:
         # Si bonne similarité de polyline, c'est OK
-        if similarity >= POLYLINE_MIN_SIMILARITY:
+        if similarity >= thresholds['POLYLINE_MIN_SIMILARITY']:
+            stats['accepted_polyline'] += 1
             return True
 
         # Sinon, fallback sur critères stricts si les polylines sont partiellement similaires
-        if similarity >= 0.2:
-            if (time_diff_min <= STRICT_TIME_DIFF_MINUTES and
-                    dur_diff <= STRICT_DURATION_DIFF_SECONDS and
-                    dist_deviation <= STRICT_DISTANCE_DEVIATION_PERCENT):
+        if similarity >= thresholds['POLYLINE_STRICT_MIN_SIMILARITY']:
+            if (time_diff_min <= thresholds['STRICT_TIME_DIFF_MINUTES'] and
+                    dur_diff <= thresholds['STRICT_DURATION_DIFF_SECONDS'] and
+                    dist_deviation <= thresholds['STRICT_DISTANCE_DEVIATION_PERCENT']):
+                stats['accepted_strict'] += 1
                 return True
 
+        stats['rejected_polyline'] += 1
         return False
     else:
         # Sans polyline, vérifier distance et D+
-        if avg_dist > 0 and dist_deviation > MAX_DISTANCE_DEVIATION_PERCENT:
+        if dist_deviation > thresholds['MAX_DISTANCE_DEVIATION_PERCENT']:
+            stats['rejected_distance'] += 1
             return False
-        if avg_elev > 0 and elev_deviation > MAX_ELEVATION_DEVIATION_PERCENT:
+        if elev_deviation > thresholds['MAX_ELEVATION_DEVIATION_PERCENT']:
+            stats['rejected_elevation'] += 1
             return False
 
+    stats['accepted_no_polyline'] += 1
     return True
 
 
-def detect_group_activities(activities):
+def start_cell(activity):
+    """
+    Cellule de grille grossière contenant le point de départ (None si inconnu).
+    """
+    start_latlng = activity.get('start_latlng')
+    if CANDIDATE_GRID_CELL_DEGREES is None or not start_latlng or len(start_latlng) < 2:
+        return None
+    return (int(start_latlng[0] // CANDIDATE_GRID_CELL_DEGREES),
+            int(start_latlng[1] // CANDIDATE_GRID_CELL_DEGREES))
+
+
+def cells_are_neighbours(c1, c2):
+    # Sans point de départ on ne peut rien exclure
+    if c1 is None or c2 is None:
+        return True
+    lon_cells = int(360 // CANDIDATE_GRID_CELL_DEGREES)
+    dlon = abs(c1[1] - c2[1]) % lon_cells
+    return abs(c1[0] - c2[0]) <= 1 and min(dlon, lon_cells - dlon) <= 1
+
+
+def candidate_pairs(activities, records=None, window_minutes=None):
+    """
+    Génère les paires (i, j) plausibles parmi les activités, avec i < j.
+    Indexe par catégorie de sport, puis balaye les heures de départ triées sur
+    la fenêtre de window_minutes (MAX_START_TIME_DIFF_MINUTES par défaut) et
+    écarte les départs trop éloignés. Les paires rejetées ici l'auraient été par
+    activities_match (catégorie, écart de départ) ou sont deux activités avec trace
+    parties de cellules non voisines ; une activité sans trace n'a pas de cellule
+    (voir ActivityRecord) et n'est jamais écartée sur son point de départ.
+    records: ActivityRecord des activités, s'ils sont déjà construits.
+    """
+    records = records or [ActivityRecord(a) for a in activities]
+    window_minutes = window_minutes or MAX_START_TIME_DIFF_MINUTES
+    by_category = defaultdict(list)
+    for i, r in enumerate(records):
+        by_category[r.category].append((r.start, i, r.cell))
+
+    pairs = []
+    for entries in by_category.values():
+        entries.sort()
+        for k, (t1, i, cell1) in enumerate(entries):
+            for t2, j, cell2 in entries[k + 1:]:
+                if (t2 - t1) / 60 > window_minutes:
+                    break
+                if records[i].athlete_id == records[j].athlete_id:
+                    continue
+                if not cells_are_neighbours(cell1, cell2):
+                    continue
+                pairs.append((i, j) if i < j else (j, i))
+
+    # Conserver l'ordre de parcours historique (i, j) pour des groupes identiques
+    pairs.sort()
+    return pairs
+
+
+def day_pair_features(records, pairs, order_key):
+    """
+    Caractéristiques de chaque paire candidate, calculées une seule fois :
+    [(first, second, PairFeatures)]. La similarité des traces n'étant pas
+    symétrique, chaque paire est prise dans l'ordre de order_key, quel que soit
+    l'ordre des activités.
+    """
+    features = []
+    for i, j in pairs:
+        first, second = (i, j) if order_key(i) <= order_key(j) else (j, i)
+        detection_stats['match_calls'] += 1
+        features.append((first, second, pair_features(records[first], records[second])))
+    return features
+
+
+def match_graph(features, thresholds, stats):
+    """
+    {i: voisins} pour les paires dont les caractéristiques passent les seuils.
+    Les paires non candidates ne correspondent pas.
+    """
+    neighbours = defaultdict(set)
+    for i, j, pair in features:
+        if classify_pair(pair, thresholds, stats):
+            neighbours[i].add(j)
+            neighbours[j].add(i)
+    return neighbours
+
+
+def connected_components(neighbours):
+    """Composantes connexes du graphe des correspondances (union-find)."""
+    parent = {i: i for i in neighbours}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, adjacent in neighbours.items():
+        for j in adjacent:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    components = defaultdict(list)
+    for i in neighbours:
+        components[find(i)].append(i)
+    return list(components.values())
+
+
+def split_component(component, neighbours, order_key, min_size):
+    """
+    Découpe déterministe d'une composante en cliques : la graine est l'activité
+    qui a le plus de correspondances (puis order_key), on lui ajoute dans le
+    même ordre les voisins qui correspondent à tous les membres déjà retenus.
+    Renvoie [(graine, membres)] avec la graine en tête des membres.
+    """
+    remaining = set(component)
+    degree = {i: len(neighbours[i]) for i in component}
+    rank = lambda i: (-degree[i], order_key(i))
+    cliques = []
+    for seed in sorted(component, key=rank):
+        if seed not in remaining:
+            continue
+        members = [seed]
+        for candidate in sorted(neighbours[seed] & remaining, key=rank):
+            if all(candidate in neighbours[m] for m in members):
+                members.append(candidate)
+        if len(members) >= min_size:
+            cliques.append((seed, members))
+            remaining.difference_update(members)
+    return cliques
+
+
+def day_cliques(order_keys, features, thresholds, stats):
+    """
+    Étape de classification d'une journée : graphe des paires qui passent les
+    seuils, composantes connexes, puis découpe de chaque composante en cliques,
+    dans l'ordre de leurs graines. order_keys: clé d'ordre de chaque activité.
+    """
+    order_key = order_keys.__getitem__
+    neighbours = match_graph(features, thresholds, stats)
+    cliques = []
+    for component in connected_components(neighbours):
+        stats['components'] += 1
+        stats['component_activities'] += len(component)
+        cliques.extend(split_component(component, neighbours, order_key, thresholds['MIN_GROUP_SIZE']))
+    cliques.sort(key=lambda clique: (-len(neighbours[clique[0]]), order_key(clique[0])))
+    return cliques
+
+
+def order_keys(records):
+    """Ordre déterministe des activités d'une journée : heure de départ, puis activity_id."""
+    return [(r.start, r.activity_id) for r in records]
+
+
+def compute_day_features(day_activities, records, window_minutes=None):
+    """Caractéristiques des paires candidates d'une journée (étape coûteuse)."""
+    pairs = candidate_pairs(day_activities, records, window_minutes)
+    n_day = len(day_activities)
+    detection_stats['pairs_total'] += n_day * (n_day - 1) // 2
+    detection_stats['pairs_candidates'] += len(pairs)
+    keys = order_keys(records)
+    return day_pair_features(records, pairs, keys.__getitem__)
+
+
+def detect_day_groups(day, day_activities, features=None, window_minutes=None):
+    """
+    Détecte les sorties de groupe d'une journée : caractéristiques des paires
+    candidates (chaque paire évaluée une fois, ou features déjà calculées pour
+    ces activités), puis classification avec les seuils actuels. Le résultat ne
+    dépend pas de l'ordre des activités. Renvoie (groupes, caractéristiques) ;
+    les groupes sont sans 'id' : il est attribué lors de la fusion.
+    """
+    records = [ActivityRecord(a) for a in day_activities]
+    if features is None:
+        features = compute_day_features(day_activities, records, window_minutes)
+    cliques = day_cliques(order_keys(records), features, current_thresholds(), detection_stats)
+
+    groups = []
+    for _, members in cliques:
+        group_acts = [day_activities[i] for i in members]
+        n = len(group_acts)
+
+        # Déterminer le pays le plus courant dans le groupe (le premier membre l'emporte en cas d'égalité)
+        countries = [a.get('country') for a in group_acts if a.get('country')]
+        group_country = max(countries, key=countries.count) if countries else None
+
+        groups.append({
+            'date': day,
+            'athletes': [a['athlete_id'] for a in group_acts],
+            'activity_ids': [a['activity_id'] for a in group_acts],
+            'sport': group_acts[0]['sport_type'],
+            'sport_category': map_sport(group_acts[0]['sport_type']),
+            'name': group_acts[0].get('name', 'Sortie en groupe'),
+            'elevation': round(sum(a.get('total_elevation_gain', 0) or 0 for a in group_acts) / n),
+            'duration': round(sum(a.get('moving_time', 0) or 0 for a in group_acts) / n),
+            'distance': round(sum(a.get('distance', 0) or 0 for a in group_acts) / n),
+            'athlete_count': n,
+            'country': group_country
+        })
+    return groups, features
+
+
+# Champs envoyés aux workers, dans l'ordre des tuples compacts
+COMPACT_FIELDS = ('activity_id', 'athlete_id', 'name', 'sport_type', 'start_date', 'moving_time',
+                  'distance', 'total_elevation_gain', 'start_latlng', 'country')
+
+
+def to_compact(activity):
+    """Tuple compact d'une activité normalisée (champs utiles à la détection + polyline)."""
+    return tuple(activity.get(f) for f in COMPACT_FIELDS) + (
+        (activity.get('map') or {}).get('summary_polyline'),
+    )
+
+
+def from_compact(values):
+    activity = dict(zip(COMPACT_FIELDS, values))
+    activity['map'] = {'summary_polyline': values[-1]}
+    return activity
+
+
+def init_worker(engine, track_cache_path):
+    global POLYLINE_ENGINE, track_cache
+    POLYLINE_ENGINE = engine
+    track_cache = track_store.TrackCache(path=track_cache_path)
+
+
+def detect_day_worker(task):
+    """
+    Exécuté dans un process du pool : détecte les groupes d'une journée à partir
+    des tuples compacts et renvoie aussi les caractéristiques des paires et les
+    compteurs accumulés.
+    """
+    day, compact_activities, features, window_minutes = task
+    detection_stats.clear()
+    hits, disk_hits, misses = track_cache.hits, track_cache.disk_hits, track_cache.misses
+    groups, features = detect_day_groups(day, [from_compact(v) for v in compact_activities],
+                                         features, window_minutes)
+    track_cache.flush()
+    stats = dict(detection_stats)
+    stats['track_hits'] = track_cache.hits - hits
+    stats['track_disk_hits'] = track_cache.disk_hits - disk_hits
+    stats['track_misses'] = track_cache.misses - misses
+    return groups, features, stats
+
+
+# Tables écrites dans le stockage canonique (activity_store)
+GROUP_SCHEMA = None if pa is None else pa.schema([
+    ('id', pa.string()), ('date', pa.string()),
+    ('athletes', pa.list_(pa.int64())), ('activity_ids', pa.list_(pa.int64())),
+    ('sport', pa.string()), ('sport_category', pa.string()), ('name', pa.string()),
+    ('elevation', pa.int64()), ('duration', pa.int64()), ('distance', pa.int64()),
+    ('athlete_count', pa.int64()), ('country', pa.string()),
+])
+COUNTRY_SCHEMA = None if pa is None else pa.schema([
+    ('activity_id', pa.int64()), ('country', pa.string()),
+])
+
+
+def load_store_activities(year):
+    """
+    Activités d'une année lues dans le stockage canonique, au format brut
+    attendu par normalize_activity. Seul le tracé résumé de "map" est gardé.
+    """
+    columns = activity_store.read('activities', year).to_pydict()
+    tracemaps = activity_store.read('polylines', year, columns=['tracemap']).column('tracemap').to_pylist()
+    activities = []
+    for i, tracemap in enumerate(tracemaps):
+        row = {name: values[i] for name, values in columns.items()}
+        activity_map = json.loads(tracemap) if tracemap is not None else None
+        if activity_map is not None:
+            activity_map.pop('polyline', None)
+        lat, lng = row['start_lat'], row['start_lng']
+        activities.append({
+            'id': row['activity_id'],
+            'athlete': {'id': row['athlete_id']},
+            'athlete_name': row['athlete_name'],
+            'name': row['name'],
+            'sport_type': row['sport'],
+            'start_date_local': row['start_date_local'],
+            'moving_time': int(row['moving_time_s']) if row['moving_time_s'] is not None else None,
+            'elapsed_time': row['elapsed_time'],
+            'distance': row['distance_m'],
+            'total_elevation_gain': row['elevation_gain_m'],
+            'map': activity_map,
+            'start_latlng': [lat, lng] if lat is not None and lng is not None else [],
+            'kudos_count': row['kudos_count'],
+            'comment_count': row['comment_count'],
+        })
+    return activities
+
+
+def write_store_results(activities, groups):
+    """Écrit les groupes et les pays résolus dans le stockage canonique, par année."""
+    groups_by_year = defaultdict(list)
+    for group in groups:
+        groups_by_year[int(group['date'][:4])].append(group)
+    countries_by_year = defaultdict(list)
+    for a in activities:
+        if a.get('start_date'):
+            countries_by_year[int(a['start_date'][:4])].append(
+                {'activity_id': a['activity_id'], 'country': a.get('country')})
+
+    activity_store.write('groups', {
+        year: pa.Table.from_pylist(groups_by_year.get(year, []), schema=GROUP_SCHEMA)
+        for year in countries_by_year}, GROUP_SCHEMA)
+    activity_store.write('countries', {
+        year: pa.Table.from_pylist(rows, schema=COUNTRY_SCHEMA)
+        for year, rows in countries_by_year.items()}, COUNTRY_SCHEMA)
+
+
+def export_store_view(year, output_file):
+    """
+    Régénère la vue JSON du site depuis le stockage canonique (activités,
+    pays et groupes déjà calculés), sans géocodage ni détection.
+    """
+    countries = activity_store.read('countries', year).to_pydict()
+    country_by_id = dict(zip(countries['activity_id'], countries['country']))
+    activities = []
+    for raw in load_store_activities(year):
+        activity = normalize_activity(raw, countries={})
+        activity['country'] = country_by_id.get(activity['activity_id'])
+        activities.append(activity)
+    groups = activity_store.read('groups', year).to_pylist()
+    write_output(output_file, activities, groups)
+    return activities, groups
+
+
+def write_output(output_file, activities, groups):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'activities': activities, 'group_activities': groups}, f,
+                  ensure_ascii=False, separators=(',', ':'))
+
+
+def site_dir(output_file):
+    """Dossier des fichiers du site : celui de la sortie."""
+    return os.path.dirname(output_file) or '.'
+
+
+def write_site_payload(output_file, activities, groups):
+    """
+    Écrit les fichiers lus par le site, à côté de la sortie, à noms versionnés
+    par leur contenu (site_artifacts) et listés dans manifest.json :
+    - l'index allégé (activités sans "map", sorties sur plusieurs jours
+      réparties par jour, et groupes) ;
+    - les traces prêtes à tracer par athlète et par niveau de zoom
+      (tracks/<athlete_id>.<niveau>.json, {activity_id: [segments]}, voir
+      track_simplify), avec leur manifeste tracks/manifest.json ;
+    - les grilles de densité de ces traces (density/, voir density_grid) ;
+    - le cube d'agrégats du tableau de bord et le graphe social.
+    Seuls les sports du tableau de bord ont une trace.
+    Renvoie le manifeste, avec le cube, le graphe social, l'index des grilles
+    et le nombre d'athlètes avec des traces pour le résumé.
+    """
+    output_dir = site_dir(output_file)
+    artifacts = {}
+    artifacts['index'] = site_artifacts.write_json(output_dir, INDEX_FILENAME, {
+        'activities': activity_cube.normalize_multi_day(
+            [{k: v for k, v in a.items() if k != 'map'} for a in activities]),
+        'group_activities': groups})
+
+    levels = [level['name'] for level in track_simplify.ZOOM_LEVELS]
+    tracks_by_athlete = defaultdict(lambda: {level: {} for level in levels})
+    density = density_grid.DensityGrids()
+    for a in activities:
+        points = decode_polyline((a.get('map') or {}).get('summary_polyline'))
+        if not points or a.get('sport_type') in CUBE_EXCLUDED_SPORTS:
+            continue
+        segments = track_simplify.split_straight_lines(points)
+        for level, encoded in track_simplify.prepare_track(points, segments).items():
+            tracks_by_athlete[a['athlete_id']][level][str(a['activity_id'])] = encoded
+        density.add_track(a['athlete_id'], a['sport_type'], segments)
+
+    tracks_dir = os.path.join(output_dir, TRACKS_DIRNAME)
+    os.makedirs(tracks_dir, exist_ok=True)
+    shards = {}
+    written = set()
+    for athlete_id, tracks in sorted(tracks_by_athlete.items()):
+        files, sizes = {}, {}
+        for level in levels:
+            entry = site_artifacts.write_json(tracks_dir, f"{athlete_id}.{level}.json", tracks[level])
+            files[level] = entry['file']
+            sizes[level] = entry['bytes']
+            written |= site_artifacts.written_files(entry)
+        shards[str(athlete_id)] = {'files': files, 'activities': len(tracks[levels[0]]), 'bytes': sizes}
+    tracks_manifest = site_artifacts.write_json(
+        tracks_dir, TRACKS_MANIFEST_FILENAME,
+        {'version': 2, 'levels': list(track_simplify.ZOOM_LEVELS), 'shards': shards})
+    written |= site_artifacts.written_files(tracks_manifest)
+    # Traces d'athlètes absents de cette exécution ou d'une version précédente
+    for filename in os.listdir(tracks_dir):
+        if filename not in written:
+            os.remove(os.path.join(tracks_dir, filename))
+    artifacts['tracks'] = {**tracks_manifest, 'file': f"{TRACKS_DIRNAME}/{tracks_manifest['file']}"}
+    files = [f"{TRACKS_DIRNAME}/{name}" for shard in shards.values() for name in shard['files'].values()]
+
+    density_index, density_entry, density_files = density.write(os.path.join(output_dir, DENSITY_DIRNAME))
+    artifacts['density'] = {**density_entry, 'file': f"{DENSITY_DIRNAME}/{density_entry['file']}"}
+    files += [f"{DENSITY_DIRNAME}/{name}" for name in density_files]
+
+    cube = activity_cube.build_cube(activities, map_sport, CUBE_EXCLUDED_SPORTS)
+    artifacts['cube'] = site_artifacts.write_json(output_dir, CUBE_FILENAME, cube)
+    co_data = co_activity.build_co_activity(groups, map_sport)
+    artifacts['co_activity'] = site_artifacts.write_json(output_dir, CO_ACTIVITY_FILENAME, co_data)
+
+    site_artifacts.remove_stale(output_dir, [INDEX_FILENAME, CUBE_FILENAME, CO_ACTIVITY_FILENAME],
+                                {name for key in ('index', 'cube', 'co_activity')
+                                 for name in site_artifacts.written_files(artifacts[key])})
+    files += [artifacts[key]['file'] for key in ('index', 'tracks', 'cube', 'co_activity')]
+    manifest = site_artifacts.write_manifest(output_dir, artifacts, files)
+    return {'manifest': manifest, 'cube': cube, 'co_activity': co_data,
+            'density': density_index, 'shards': len(shards)}
+
+
+def write_route_index(output_file, activities):
+    """
+    Met à jour l'index des routes (route_index.json, signatures MinHash des
+    traces, voir route_index) à côté de la sortie, et exporte les routes
+    fréquentes (frequent_routes.json). Seules les traces des sports du tableau
+    de bord sont indexées ; celles dont la polyline n'a pas changé sont reprises.
+    Renvoie (index, routes fréquentes, nombre de routes reprises).
+    """
+    output_dir = site_dir(output_file)
+    path = os.path.join(output_dir, ROUTE_INDEX_FILENAME)
+    index = route_index.RouteIndex.load(path)
+    reused = index.update(
+        [a for a in activities if a.get('sport_type') not in CUBE_EXCLUDED_SPORTS],
+        lambda a: track_cache.get(a['activity_id'], a['map']['summary_polyline']),
+        track_store.polyline_hash, map_sport)
+    index.save(path)
+    frequent = index.frequent_routes()
+    with open(os.path.join(output_dir, FREQUENT_ROUTES_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'version': route_index.ROUTE_INDEX_VERSION,
+                   'min_similarity': route_index.FREQUENT_MIN_SIMILARITY,
+                   'min_count': route_index.FREQUENT_MIN_COUNT,
+                   'routes': frequent}, f, ensure_ascii=False, separators=(',', ':'))
+    return index, frequent, reused
+
+
+def group_by_day(activities):
+    """Journées (dans l'ordre d'apparition) ayant assez d'activités pour un groupe."""
     by_day = defaultdict(list)
     for a in activities:
         by_day[a['start_date'][:10]].append(a)
+    return [(day, day_activities) for day, day_activities in by_day.items()
+            if len(day_activities) >= MIN_GROUP_SIZE]
 
-    groups = []
-    for day, day_activities in by_day.items():
-        if len(day_activities) < MIN_GROUP_SIZE:
-            continue
 
-        activity_matches = defaultdict(set)
-        for i, a1 in enumerate(day_activities):
-            for j, a2 in enumerate(day_activities):
-                if i >= j or a1['athlete_id'] == a2['athlete_id']:
-                    continue
-                if activities_match(a1, a2):
-                    activity_matches[a1['activity_id']].add(a2['activity_id'])
-                    activity_matches[a2['activity_id']].add(a1['activity_id'])
-
-        activity_by_id = {a['activity_id']: a for a in day_activities}
-        used_in_group = set()
-
-        for a_id, matches in sorted(activity_matches.items(), key=lambda x: -len(x[1])):
-            if a_id in used_in_group:
-                continue
-            group_ids = {a_id}
-            for match_id in matches:
-                if match_id in used_in_group:
-                    continue
-                if all(match_id in activity_matches.get(gid, set()) or
-                       activities_match(activity_by_id[gid], activity_by_id[match_id])
-                       for gid in group_ids if gid != match_id):
-                    group_ids.add(match_id)
-
-            if len(group_ids) >= MIN_GROUP_SIZE:
-                group_acts = [activity_by_id[gid] for gid in group_ids]
-                n = len(group_acts)
-
-                # Déterminer le pays le plus courant dans le groupe
-                countries = [a.get('country') for a in group_acts if a.get('country')]
-                group_country = max(set(countries), key=countries.count) if countries else None
-
-                groups.append({
-                    'id': f"group_{day}_{len(groups)}",
-                    'date': day,
-                    'athletes': [a['athlete_id'] for a in group_acts],
-                    'activity_ids': list(group_ids),
-                    'sport': group_acts[0]['sport_type'],
-                    'sport_category': map_sport(group_acts[0]['sport_type']),
-                    'name': group_acts[0].get('name', 'Sortie en groupe'),
-                    'elevation': round(sum(a.get('total_elevation_gain', 0) or 0 for a in group_acts) / n),
-                    'duration': round(sum(a.get('moving_time', 0) or 0 for a in group_acts) / n),
-                    'distance': round(sum(a.get('distance', 0) or 0 for a in group_acts) / n),
-                    'athlete_count': n,
-                    'country': group_country
-                })
-                used_in_group.update(group_ids)
+def day_hashes(activities):
+    """Empreinte de chaque journée : les champs utiles à la détection, dans l'ordre."""
+    return {day: manifest.content_hash([to_compact(a) for a in day_activities])
+            for day, day_activities in group_by_day(activities)}
+
+
+def detection_settings(use_online_geocoding):
+    """Empreinte des paramètres de détection : les modifier invalide tout le manifeste."""
+    # Tous les seuils de THRESHOLD_NAMES (ceux de --sweep), plus les réglages du pipeline
+    return manifest.content_hash([
+        current_thresholds(), POLYLINE_CORRIDOR_WIDTH_METERS, POLYLINE_SAMPLE_RATE,
+        CANDIDATE_GRID_CELL_DEGREES, EXCLUDED_SPORTS, SPORT_MAPPING, use_online_geocoding,
+    ])
+
+
+def load_previous_run(input_paths, output_file, settings):
+    """
+    Manifeste de l'exécution précédente s'il s'applique encore : mêmes fichiers,
+    mêmes paramètres, et sortie non modifiée depuis. Sinon None.
+    """
+    previous = manifest.load(MANIFEST_FILE, MANIFEST_VERSION)
+    if previous is None or previous['settings'] != settings:
+        return None
+    if sorted(previous['inputs']) != sorted(input_paths) or previous['output_file'] != output_file:
+        return None
+    if not os.path.exists(output_file) or not manifest.is_unchanged(previous['output'], output_file):
+        return None
+    return previous
+
+
+def load_previous_groups(output_file):
+    """Groupes de la sortie précédente par journée, sans leur 'id'."""
+    with open(output_file, 'r', encoding='utf-8') as f:
+        previous_groups = json.load(f).get('group_activities', [])
+    by_day = defaultdict(list)
+    for group in previous_groups:
+        by_day[group['date']].append({k: v for k, v in group.items() if k != 'id'})
+    return by_day
+
+
+def detect_group_activities(activities, workers=1, track_cache_path=None, reused_groups=None,
+                            day_features=None, window_minutes=None):
+    """
+    Détecte les groupes journée par journée.
+    reused_groups: {journée: groupes} déjà connus, repris sans nouvelle détection.
+    day_features: {journée: caractéristiques des paires} (voir load_pair_features) ;
+    celles qui s'appliquent encore évitent de recomparer les traces, celles des
+    journées calculées y sont ajoutées.
+    window_minutes: fenêtre des paires candidates (MAX_START_TIME_DIFF_MINUTES par défaut).
+    """
+    reused_groups = reused_groups or {}
+    day_features = {} if day_features is None else day_features
+    window_minutes = window_minutes or MAX_START_TIME_DIFF_MINUTES
+    all_days = group_by_day(activities)
+    days = [(day, day_activities) for day, day_activities in all_days if day not in reused_groups]
+    known = [usable_features(day_features.get(day), day_activities, window_minutes)
+             for day, day_activities in days]
+    detection_stats['days_reused'] += len(all_days) - len(days)
+    for (day, _), features in zip(days, known):
+        if features is None:
+            detection_stats['days_detected'] += 1
+            continue
+        # Paires comptées comme à leur calcul, sans les recomparer
+        entry = day_features[day]
+        detection_stats['days_features_reused'] += 1
+        detection_stats['pairs_total'] += entry['pairs_total']
+        detection_stats['pairs_candidates'] += entry['pairs_candidates']
+        detection_stats['pairs_reused'] += entry['pairs_candidates']
+
+    if workers > 1:
+        tasks = [(day, [to_compact(a) for a in day_activities], features, window_minutes)
+                 for (day, day_activities), features in zip(days, known)]
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(POLYLINE_ENGINE, track_cache_path)) as executor:
+            results = list(executor.map(detect_day_worker, tasks, chunksize=chunksize))
+        day_results = []
+        for groups_of_day, features, stats in results:
+            day_results.append((groups_of_day, features))
+            track_cache.hits += stats.pop('track_hits')
+            track_cache.disk_hits += stats.pop('track_disk_hits')
+            track_cache.misses += stats.pop('track_misses')
+            for key, value in stats.items():
+                detection_stats[key] += value
+    else:
+        day_results = [detect_day_groups(day, day_activities, features, window_minutes)
+                       for (day, day_activities), features in zip(days, known)]
+
+    day_groups = []
+    for (day, day_activities), features, (groups_of_day, computed) in zip(days, known, day_results):
+        day_groups.append(groups_of_day)
+        if features is None:
+            n_day = len(day_activities)
+            day_features[day] = {'window': window_minutes,
+                                 'activity_ids': [a['activity_id'] for a in day_activities],
+                                 'pairs_total': n_day * (n_day - 1) // 2,
+                                 'pairs_candidates': len(computed),
+                                 'pairs': computed}
+
+    # Fusion dans l'ordre des journées : identifiants stables group_{day}_{n}
+    detected = {day: groups_of_day for (day, _), groups_of_day in zip(days, day_groups)}
+    groups = []
+    for day, _ in all_days:
+        groups_of_day = detected[day] if day in detected else reused_groups[day]
+        for group in groups_of_day:
+            groups.append({'id': f"group_{day}_{len(groups)}", **group})
     return groups
 
 
-def main():
-    input_file = sys.argv[1] if len(sys.argv) >= 3 else INPUT_FILE
-    output_file = sys.argv[2] if len(sys.argv) >= 3 else OUTPUT_FILE
+def usable_features(entry, day_activities, window_minutes):
+    """
+    Caractéristiques d'une entrée de day_features si elles s'appliquent aux
+    activités de la journée (mêmes activités, fenêtre au moins aussi large),
+    sinon None. Une fenêtre plus large ajoute des paires que la classification
+    rejette sur l'écart de départ.
+    """
+    if entry is None or entry['window'] < window_minutes or \
+            entry['activity_ids'] != [a['activity_id'] for a in day_activities]:
+        return None
+    return entry['pairs']
+
 
+def pair_feature_settings():
+    """Empreinte des paramètres dont dépendent les caractéristiques des paires (hors seuils)."""
+    return manifest.content_hash([
+        POLYLINE_CORRIDOR_WIDTH_METERS, POLYLINE_SAMPLE_RATE, POLYLINE_ENGINE,
+        CANDIDATE_GRID_CELL_DEGREES, SPORT_MAPPING,
+    ])
+
+
+def load_pair_features(hashes):
+    """
+    Caractéristiques des paires de PAIR_FEATURES_FILE pour les journées dont
+    l'empreinte (day_hashes) n'a pas changé : {journée: {'window',
+    'activity_ids', 'pairs_total', 'pairs_candidates',
+    'pairs': [(first, second, PairFeatures)]}}.
+    """
+    data = manifest.load(PAIR_FEATURES_FILE, PAIR_FEATURES_VERSION)
+    if data is None or data['settings'] != pair_feature_settings():
+        return {}
+    return {day: {'window': entry['window'], 'activity_ids': entry['activity_ids'],
+                  'pairs_total': entry['pairs_total'], 'pairs_candidates': entry['pairs_candidates'],
+                  'pairs': [(i, j, PairFeatures(*values)) for i, j, *values in entry['pairs']]}
+            for day, entry in data['days'].items() if hashes.get(day) == entry['hash']}
+
+
+def save_pair_features(day_features, hashes):
+    """Enregistre les caractéristiques des journées encore présentes dans hashes."""
+    manifest.save(PAIR_FEATURES_FILE, {
+        'version': PAIR_FEATURES_VERSION,
+        'settings': pair_feature_settings(),
+        'days': {day: {'hash': hashes[day], 'window': entry['window'], 'activity_ids': entry['activity_ids'],
+                       'pairs_total': entry['pairs_total'], 'pairs_candidates': entry['pairs_candidates'],
+                       'pairs': [[i, j, *pair] for i, j, pair in entry['pairs']]}
+                 for day, entry in day_features.items() if day in hashes},
+    })
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-calcul des sorties de groupe")
+    parser.add_argument('input_file', nargs='?', default=INPUT_FILE)
+    parser.add_argument('output_file', nargs='?', default=OUTPUT_FILE)
     # Option pour désactiver le géocodage en ligne
-    use_online_geocoding = '--offline' not in sys.argv
+    parser.add_argument('--offline', action='store_true',
+                        help="geocodage offline uniquement (pas d'appel Nominatim)")
+    parser.add_argument('--geocoder-url', default=NOMINATIM_URL,
+                        help="URL du service de geocodage inverse (compatible Nominatim)")
+    parser.add_argument('--engine', choices=['numpy', 'python'], default=POLYLINE_ENGINE,
+                        help="moteur de comparaison des traces GPS")
+    parser.add_argument('--no-track-cache', action='store_true',
+                        help=f"ne pas persister les traces decodees dans {TRACK_CACHE_FILE}")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="nombre de process pour la detection des groupes (par journee)")
+    parser.add_argument('--full', action='store_true',
+                        help=f"ignorer {MANIFEST_FILE} et recalculer toutes les journees")
+    parser.add_argument('--store', action='store_true',
+                        help="lire les activites dans le stockage canonique au lieu de input_file")
+    parser.add_argument('--year', type=int, default=YEAR,
+                        help="annee lue dans le stockage canonique (--store, --export-only)")
+    parser.add_argument('--export-only', action='store_true',
+                        help="regenerer output_file depuis le stockage canonique, sans recalcul")
+    parser.add_argument('--metrics', default=METRICS_FILE,
+                        help="fichier JSON des durees, pics memoire et compteurs de chaque etape")
+    parser.add_argument('--profile', action='store_true',
+                        help="profiler les etapes avec cProfile (profil complet dans <metrics>.prof)")
+    parser.add_argument('--sweep', action='append', metavar='SEUIL=V1,V2,...',
+                        help="comparer les groupes obtenus pour chaque combinaison de valeurs des seuils "
+                             f"(repetable, seuils: {', '.join(THRESHOLD_NAMES)}), sans ecrire de sortie")
+    return parser.parse_args()
+
+
+def parse_sweep(specs):
+    """Configurations de --sweep : produit des valeurs de chaque seuil, [{seuil: valeur}]."""
+    axes = []
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip().upper()
+        if name not in THRESHOLD_NAMES:
+            raise ValueError(f"seuil inconnu: {name}")
+        try:
+            parsed = [float(v) for v in values.split(',') if v.strip()]
+        except ValueError:
+            raise ValueError(f"valeurs invalides pour {name}: {values}")
+        if not parsed:
+            raise ValueError(f"aucune valeur pour {name}")
+        axes.append([(name, int(v) if v.is_integer() else v) for v in parsed])
+    configs = [{}]
+    for axis in axes:
+        configs = [{**config, name: value} for config in configs for name, value in axis]
+    return configs
+
+
+def classify_days(activities, day_features, thresholds):
+    """Groupes (activity_ids) obtenus avec ces seuils à partir des caractéristiques des paires."""
+    stats = defaultdict(int)
+    groups = []
+    for day, day_activities in group_by_day(activities):
+        keys = order_keys([ActivityRecord(a) for a in day_activities])
+        for _, members in day_cliques(keys, day_features[day]['pairs'], thresholds, stats):
+            groups.append(tuple(sorted(day_activities[i]['activity_id'] for i in members)))
+    return groups
+
+
+def run_sweep(configs, activities, day_features):
+    """
+    Classe les paires avec chaque configuration de seuils et compare les groupes
+    obtenus à ceux des seuils actuels. Renvoie un résumé par configuration.
+    """
+    baseline = current_thresholds()
+    reference = set(classify_days(activities, day_features, baseline))
+    results = []
+    for config in [{}] + configs:
+        groups = classify_days(activities, day_features, {**baseline, **config})
+        found = set(groups)
+        sizes = [len(g) for g in groups]
+        results.append({
+            'config': config,
+            'groups': len(groups),
+            'pairs': sizes.count(2),
+            'trios': sizes.count(3),
+            'more': sum(1 for n in sizes if n > 3),
+            'activities': sum(sizes),
+            'added': len(found - reference),
+            'removed': len(reference - found),
+        })
+    return results
+
+
+def save_metrics(metrics, args, status):
+    """Écrit les mesures de l'exécution dans args.metrics."""
+    metrics.update(detection_stats)
+    metrics.update(geocoding_stats, prefix='geocode_')
+    metrics.update({'hits': track_cache.hits, 'disk_hits': track_cache.disk_hits,
+                    'decodes': track_cache.misses}, prefix='track_cache_')
+    profile_path = metrics.save(args.metrics, status=status, engine=POLYLINE_ENGINE, workers=args.workers,
+                                input_file=args.input_file, output_file=args.output_file)
+    print(f"\nMesures ecrites dans {args.metrics}")
+    if profile_path:
+        if args.workers > 1:
+            print("  Attention: la detection tourne dans les workers, hors du profil (--workers 1 pour la profiler)")
+        print(f"  Profil: {profile_path} (python -m pstats {profile_path})")
 
-    print(f"Lecture de {input_file}...")
 
-    if not os.path.exists(input_file):
-        print(f"Erreur: fichier '{input_file}' introuvable")
+def main():
+    global POLYLINE_ENGINE, NOMINATIM_URL, track_cache
+
+    args = parse_args()
+    metrics = run_metrics.RunMetrics(profile=args.profile)
+    input_file = args.input_file
+    output_file = args.output_file
+    use_online_geocoding = not args.offline
+    NOMINATIM_URL = args.geocoder_url
+
+    if args.engine == 'numpy' and not polyline_engine.is_available():
+        print("NumPy indisponible, utilisation du moteur python")
+        args.engine = 'python'
+    POLYLINE_ENGINE = args.engine
+
+    track_cache_path = None if args.no_track_cache else TRACK_CACHE_FILE
+    if track_cache_path:
+        track_cache = track_store.TrackCache(path=track_cache_path)
+
+    if (args.store or args.export_only) and activity_store is None:
+        print("Erreur: pyarrow est necessaire pour le stockage canonique (--store, --export-only)")
         sys.exit(1)
 
+    if args.export_only:
+        missing = [t for t in ('activities', 'polylines', 'countries', 'groups')
+                   if not activity_store.exists(t, args.year)]
+        if missing:
+            print(f"Erreur: tables {args.year} absentes de {activity_store.STORE_DIR}: {', '.join(missing)}")
+            sys.exit(1)
+        with metrics.stage('load'):
+            activities, groups = export_store_view(args.year, output_file)
+        with metrics.stage('write'):
+            site = write_site_payload(output_file, activities, groups)
+            routes, frequent, _ = write_route_index(output_file, activities)
+        print(f"Vue exportee depuis {activity_store.STORE_DIR}: {len(activities)} activites, "
+              f"{len(groups)} sorties -> {output_file}, {len(site['manifest']['files'])} fichiers du site "
+              f"dans {site_dir(output_file)}, {len(routes.routes)} routes indexees ({len(frequent)} frequentes)")
+        save_metrics(metrics, args, 'export-only')
+        return
+
+    if args.store:
+        input_paths = [activity_store.partition_path(table, args.year) for table in ('activities', 'polylines')]
+    else:
+        input_paths = [input_file]
+    print(f"Lecture de {', '.join(input_paths)}...")
+
+    for path in input_paths:
+        if not os.path.exists(path):
+            print(f"Erreur: fichier '{path}' introuvable")
+            sys.exit(1)
+
+    sweep_configs = []
+    if args.sweep:
+        try:
+            sweep_configs = parse_sweep(args.sweep)
+        except ValueError as e:
+            print(f"Erreur: --sweep: {e}")
+            sys.exit(1)
+
+    settings = detection_settings(use_online_geocoding)
+    previous = None if args.full else load_previous_run(input_paths, output_file, settings)
+    if not args.sweep and previous is not None and site_artifacts.is_complete(site_dir(output_file)) and \
+            os.path.exists(os.path.join(site_dir(output_file), ROUTE_INDEX_FILENAME)) and \
+            all(manifest.is_unchanged(previous['inputs'][path], path) for path in input_paths):
+        print(f"Aucun changement depuis la derniere execution, {output_file} est a jour")
+        save_metrics(metrics, args, 'unchanged')
+        return
+
     # Charger le cache de pays
     if use_online_geocoding:
         load_country_cache()
-        print("Mode: geocodage en ligne avec cache (peut prendre du temps)")
+        print("Mode: cache de pays et contours offline, Nominatim en dernier recours")
     else:
-        print("Mode: geocodage offline uniquement (pays limites)")
+        print("Mode: geocodage offline uniquement (contours des pays)")
 
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with metrics.stage('load'):
+        if args.store:
+            raw_activities = load_store_activities(args.year)
+        else:
+            with open(input_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
 
-    # Le nouveau format est une liste directe d'activités
-    raw_activities = data if isinstance(data, list) else data.get('activities', [])
+            # Le nouveau format est une liste directe d'activités
+            raw_activities = data if isinstance(data, list) else data.get('activities', [])
     print(f"  {len(raw_activities)} activites chargees")
+    metrics.count('activities_loaded', len(raw_activities))
 
-    # Normaliser toutes les activités
-    print("Normalisation et detection des pays...")
-    activities = []
-    for i, a in enumerate(raw_activities):
-        if (i + 1) % 100 == 0:
-            print(f"  Traitement: {i + 1}/{len(raw_activities)}")
-        activities.append(normalize_activity(a, use_online_geocoding))
+    # Résoudre tous les pays en une passe
+    print("Detection des pays...")
+    with metrics.stage('geocode'):
+        points = [a['start_latlng'][:2] for a in raw_activities
+                  if a.get('start_latlng') and len(a['start_latlng']) >= 2]
+        countries = resolve_countries(points, use_online_geocoding)
+    print(f"  {len(countries)} points de depart resolus")
 
-    # Sauvegarder le cache
-    if use_online_geocoding:
-        save_country_cache()
-        print(f"Cache sauvegarde: {len(country_cache)} entrees")
+    # Normaliser toutes les activités
+    print("Normalisation...")
+    with metrics.stage('normalize'):
+        activities = []
+        for i, a in enumerate(raw_activities):
+            if (i + 1) % 100 == 0:
+                print(f"  Traitement: {i + 1}/{len(raw_activities)}")
+            activities.append(normalize_activity(a, use_online_geocoding, countries))
+
+        # Sauvegarder le cache
+        if use_online_geocoding:
+            save_country_cache()
+            print(f"Cache sauvegarde: {len(country_cache)} entrees")
 
     # Afficher quelques statistiques sur les pays
     countries_count = defaultdict(int)
@@ -481,21 +1493,104 @@ def main():
     for country, count in sorted(countries_count.items(), key=lambda x: -x[1])[:15]:
         print(f"  {country}: {count} activites")
 
-    filtered = [a for a in activities if a.get('sport_type') not in EXCLUDED_SPORTS]
+    with metrics.stage('filter'):
+        filtered = [a for a in activities if a.get('sport_type') not in EXCLUDED_SPORTS]
+
+        # Journées inchangées depuis la dernière exécution : groupes repris de la sortie
+        hashes = day_hashes(filtered)
+        day_features = {} if args.full else load_pair_features(hashes)
+        reused_groups = {}
+        if previous is not None and not args.sweep:
+            previous_groups = load_previous_groups(output_file)
+            reused_groups = {day: previous_groups.get(day, []) for day, h in hashes.items()
+                             if previous['days'].get(day) == h}
     print(f"\n  {len(filtered)} activites apres filtrage")
-
-    print("\nDetection des sorties de groupe...")
-    groups = detect_group_activities(filtered)
+    metrics.count('activities_filtered', len(filtered))
+
+    # Fenêtre des paires candidates : la plus large des valeurs balayées
+    window_minutes = max([MAX_START_TIME_DIFF_MINUTES] +
+                         [c['MAX_START_TIME_DIFF_MINUTES'] for c in sweep_configs
+                          if 'MAX_START_TIME_DIFF_MINUTES' in c])
+    print(f"\nDetection des sorties de groupe (moteur: {POLYLINE_ENGINE}, workers: {args.workers})...")
+    with metrics.stage('detect'):
+        # Les workers ouvrent leur propre connexion au cache de traces
+        track_cache.flush()
+        groups = detect_group_activities(filtered, args.workers, track_cache_path, reused_groups,
+                                         day_features, window_minutes)
+        save_pair_features(day_features, hashes)
+    metrics.count('groups', len(groups))
+    print(f"  Journees recalculees: {detection_stats['days_detected']}, "
+          f"reclassees avec les caracteristiques reprises: {detection_stats['days_features_reused']}, "
+          f"reprises: {detection_stats['days_reused']}")
+
+    if args.sweep:
+        with metrics.stage('sweep'):
+            results = run_sweep(sweep_configs, filtered, day_features)
+        track_cache.close()
+        print(f"\nBalayage de {len(sweep_configs)} configurations en {metrics.seconds('sweep'):.2f} s "
+              f"(caracteristiques dans {PAIR_FEATURES_FILE}):")
+        print(f"  {'groupes':>7} {'duos':>5} {'trios':>5} {'4+':>4} {'activites':>9} "
+              f"{'ajoutes':>7} {'retires':>7}  seuils")
+        for result in results:
+            config = ', '.join(f"{name}={value}" for name, value in result['config'].items()) or 'actuels'
+            print(f"  {result['groups']:>7} {result['pairs']:>5} {result['trios']:>5} {result['more']:>4} "
+                  f"{result['activities']:>9} {result['added']:>7} {result['removed']:>7}  {config}")
+        metrics.count('sweep_configs', len(sweep_configs))
+        save_metrics(metrics, args, 'sweep')
+        return
 
     pairs = sum(1 for g in groups if g['athlete_count'] == 2)
     trios = sum(1 for g in groups if g['athlete_count'] == 3)
     more = sum(1 for g in groups if g['athlete_count'] > 3)
     print(f"  {len(groups)} sorties detectees (duos: {pairs}, trios: {trios}, 4+: {more})")
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump({'activities': activities, 'group_activities': groups}, f, ensure_ascii=False, indent=2)
-
-    print(f"\nFichier cree: {output_file} ({os.path.getsize(output_file) / 1024:.1f} KB)")
+    total = detection_stats['pairs_total']
+    candidates = detection_stats['pairs_candidates']
+    reused_pairs = detection_stats['pairs_reused']
+    reduction = 100 * (1 - candidates / total) if total else 0
+    print(f"  Paires candidates: {candidates}/{total} (reduction: {reduction:.1f}%), "
+          f"comparees: {candidates - reused_pairs}, reprises de {PAIR_FEATURES_FILE}: {reused_pairs}")
+    print(f"  Detection terminee en {metrics.seconds('detect'):.2f} s")
+    track_cache.close()
+    print(f"  Cache de traces: {track_cache.summary()}")
+
+    with metrics.stage('write'):
+        # Résultats dans le stockage canonique s'il est la source (--store), puis
+        # vue JSON du site ; une entrée JSON ne doit pas écraser ceux du stockage
+        if args.store:
+            write_store_results(activities, groups)
+            print(f"\nGroupes et pays ecrits dans {activity_store.STORE_DIR}")
+        write_output(output_file, activities, groups)
+
+        print(f"\nFichier cree: {output_file} ({os.path.getsize(output_file) / 1024:.1f} KB)")
+        site = write_site_payload(output_file, activities, groups)
+        artifacts = site['manifest']['artifacts']
+        print(f"Index allege: {artifacts['index']['file']} ({artifacts['index']['bytes'] / 1024:.1f} KB, "
+              f"gzip {artifacts['index']['gzip_bytes'] / 1024:.1f} KB), "
+              f"traces: {site['shards']} athletes dans {TRACKS_DIRNAME}/")
+        density_bytes = sum(f['bytes'] for f in site['density']['files'].values())
+        print(f"Grilles de densite: {len(site['density']['layers'])} couches, "
+              f"zooms {', '.join(site['density']['files'])} dans {DENSITY_DIRNAME}/ "
+              f"({density_bytes / 1024:.1f} KB)")
+        print(f"Cube d'agregats cree: {artifacts['cube']['file']} ({len(site['cube']['day'])} cellules jour, "
+              f"{len(site['cube']['slices'])} tranches, {artifacts['cube']['bytes'] / 1024:.1f} KB)")
+        print(f"Graphe social cree: {artifacts['co_activity']['file']} "
+              f"({len(site['co_activity']['athletes'])} athletes, {len(site['co_activity']['links'])} paires, "
+              f"{artifacts['co_activity']['bytes'] / 1024:.1f} KB)")
+        print(f"Manifeste du site: {site_artifacts.MANIFEST_FILENAME} ({len(site['manifest']['files'])} fichiers"
+              f"{'' if site_artifacts.brotli else ', brotli indisponible: copies .gz seulement'})")
+        routes, frequent, reused = write_route_index(output_file, activities)
+        print(f"Index des routes: {ROUTE_INDEX_FILENAME} ({len(routes.routes)} routes, {reused} reprises), "
+              f"{len(frequent)} routes frequentes dans {FREQUENT_ROUTES_FILENAME}")
+
+        manifest.save(MANIFEST_FILE, {
+            'version': MANIFEST_VERSION,
+            'settings': settings,
+            'inputs': {path: manifest.fingerprint(path) for path in input_paths},
+            'output_file': output_file,
+            'output': manifest.fingerprint(output_file),
+            'days': hashes,
+        })
 
     # Afficher les groupes Bike
     bike_groups = [g for g in groups if g['sport_category'] == 'Bike']
@@ -505,6 +1600,8 @@ def main():
         country_str = f" ({g['country']})" if g.get('country') else ""
         print(f"  {g['date']}: {', '.join(names)}{country_str}")
 
+    save_metrics(metrics, args, 'detected')
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
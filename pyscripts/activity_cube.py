@@ -0,0 +1,184 @@
+"""
+Cube d'agrégats pour le tableau de bord : dénivelé, distance, temps en
+mouvement et nombre d'activités par athlète x sport x jour, avec les cumuls
+par semaine et par mois.
+
+Pour chaque combinaison de filtres du site (athlète ou tous, sport ou tous),
+une « tranche » donne directement les totaux, le meilleur jour, la meilleure
+semaine et les séries hebdomadaires et mensuelles de dénivelé : le site n'a
+plus à parcourir les activités à chaque changement de filtre.
+
+Conventions (identiques à public/js) :
+- les dates sont l'heure locale de l'activité (start_date_local) ;
+- une sortie sur plusieurs jours avec beaucoup de pauses (restRatio > 0.4)
+  est répartie à parts égales sur ses jours (normalize_multi_day, qui fournit
+  aussi ces lignes par jour à l'index du site) ;
+- les semaines suivent getWeekNumber (clé "année-numéro").
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import ceil
+
+CUBE_VERSION = 1
+METRICS = ('elevation', 'distance', 'moving_time', 'count')
+MULTI_DAY_MIN_REST_RATIO = 0.4
+ALL = '*'
+
+
+def parse_local(date_str):
+    return datetime.strptime(date_str[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+def week_number(dt):
+    """Numéro de semaine calculé comme getWeekNumber (public/js/utils.js)."""
+    jan1 = datetime(dt.year, 1, 1)
+    past_days = (dt - jan1).total_seconds() / 86400
+    # getDay() : dimanche = 0
+    return ceil((past_days + jan1.isoweekday() % 7 + 1) / 7)
+
+
+def split_days(activity):
+    """
+    Parts (début local, fraction) d'une activité : une seule en général, une
+    par jour pour une sortie sur plusieurs jours entrecoupée de pauses.
+    """
+    start = parse_local(activity['start_date'])
+    moving = activity.get('moving_time') or 0
+    elapsed = activity.get('elapsed_time') or 0
+    end = start + timedelta(seconds=elapsed or moving)
+    n_days = (end.date() - start.date()).days + 1
+    rest_ratio = (elapsed - moving) / moving if moving > 0 else 0
+    if n_days <= 1 or rest_ratio <= MULTI_DAY_MIN_REST_RATIO:
+        return [(start, 1.0)]
+    first_day = datetime(start.year, start.month, start.day)
+    return [(first_day + timedelta(days=i), 1.0 / n_days) for i in range(n_days)]
+
+
+def normalize_multi_day(activities):
+    """
+    Activités du site avec les sorties sur plusieurs jours lissées (split_days) :
+    une ligne par jour, D+, distance et temps en mouvement répartis à parts
+    égales, mêmes champs que normalizeMultiDayActivities (public/js). Les
+    bornes des jours suivent l'heure locale de l'activité, pas celle du navigateur.
+    """
+    rows = []
+    for a in activities:
+        parts = split_days(a) if a.get('start_date') else []
+        if len(parts) <= 1:
+            rows.append(a)
+            continue
+        for i, (day, fraction) in enumerate(parts):
+            date = day.strftime('%Y-%m-%dT%H:%M:%SZ')
+            rows.append({
+                **a,
+                'activity_id': f"{a['activity_id']}_day{i + 1}",
+                'start_date': date,
+                'start_date_local': date,
+                'total_elevation_gain': (a.get('total_elevation_gain') or 0) * fraction,
+                'distance': (a.get('distance') or 0) * fraction,
+                'moving_time': (a.get('moving_time') or 0) * fraction,
+                '_isPartOfMultiDay': True,
+                '_originalActivityId': a['activity_id'],
+                '_dayNumber': i + 1,
+                '_totalDays': len(parts),
+            })
+    return rows
+
+
+def _add(cell, values):
+    for i, v in enumerate(values):
+        cell[i] += v
+
+
+def _rounded(values):
+    return [round(v, 1) for v in values[:3]] + [values[3]]
+
+
+def _period_order(key):
+    """Ordre chronologique des clés "2025-03-14", "2025-11", "2025-7"."""
+    return tuple(int(part) for part in key.split('-'))
+
+
+def _best(series):
+    """Clé de la plus grande valeur strictement positive (la plus ancienne en cas d'égalité)."""
+    best_key, best_value = None, 0
+    for key in sorted(series, key=_period_order):
+        if series[key] > best_value:
+            best_key, best_value = key, series[key]
+    return best_key
+
+
+def build_cube(activities, category_of, excluded_sports=()):
+    """
+    Construit le cube à partir des activités normalisées (start_date locale).
+    category_of: fonction sport_type -> catégorie (map_sport).
+    """
+    athletes = sorted({a['athlete_id'] for a in activities if a.get('athlete_id') is not None})
+    sports = sorted({a['sport_type'] for a in activities
+                     if a.get('sport_type') and a['sport_type'] not in excluded_sports})
+    athlete_index = {a: i for i, a in enumerate(athletes)}
+    sport_index = {s: i for i, s in enumerate(sports)}
+
+    cells = {'day': defaultdict(lambda: [0.0, 0.0, 0.0, 0]),
+             'week': defaultdict(lambda: [0.0, 0.0, 0.0, 0]),
+             'month': defaultdict(lambda: [0.0, 0.0, 0.0, 0])}
+    # Par tranche (athlète ou ALL, sport ou ALL) : totaux, D+ par jour/semaine/mois, bornes des semaines
+    slices = defaultdict(lambda: {'totals': [0.0, 0.0, 0.0, 0], 'days': defaultdict(float),
+                                  'weeks': defaultdict(float), 'months': defaultdict(float),
+                                  'week_bounds': {}})
+
+    for a in activities:
+        sport = a.get('sport_type')
+        if sport not in sport_index or a.get('athlete_id') not in athlete_index or not a.get('start_date'):
+            continue
+        ai, si = athlete_index[a['athlete_id']], sport_index[sport]
+        for start, fraction in split_days(a):
+            values = [(a.get('total_elevation_gain') or 0) * fraction,
+                      (a.get('distance') or 0) * fraction,
+                      (a.get('moving_time') or 0) * fraction,
+                      1]
+            day = start.strftime('%Y-%m-%d')
+            week = f"{start.year}-{week_number(start)}"
+            month = start.strftime('%Y-%m')
+            _add(cells['day'][(ai, si, day)], values)
+            _add(cells['week'][(ai, si, week)], values)
+            _add(cells['month'][(ai, si, month)], values)
+
+            for key in ((a['athlete_id'], sport), (a['athlete_id'], ALL), (ALL, sport), (ALL, ALL)):
+                s = slices[key]
+                _add(s['totals'], values)
+                s['days'][day] += values[0]
+                s['weeks'][week] += values[0]
+                s['months'][month] += values[0]
+                low, high = s['week_bounds'].get(week, (day, day))
+                s['week_bounds'][week] = (min(low, day), max(high, day))
+
+    slices_out = {}
+    for (athlete, sport), s in sorted(slices.items(), key=lambda x: (str(x[0][0]), x[0][1])):
+        best_day = _best(s['days'])
+        best_week = _best(s['weeks'])
+        slices_out[f"{athlete}|{sport}"] = {
+            'totals': _rounded(s['totals']),
+            'best_day': {'date': best_day, 'elevation': round(s['days'][best_day], 1)} if best_day else None,
+            'best_week': {'week': best_week,
+                          'start': s['week_bounds'][best_week][0],
+                          'end': s['week_bounds'][best_week][1],
+                          'elevation': round(s['weeks'][best_week], 1)} if best_week else None,
+            'weeks': {k: round(s['weeks'][k], 1) for k in sorted(s['weeks'], key=_period_order)},
+            'months': {k: round(v, 1) for k, v in sorted(s['months'].items())},
+        }
+
+    return {
+        'version': CUBE_VERSION,
+        'metrics': list(METRICS),
+        'athletes': athletes,
+        'sports': sports,
+        'sport_categories': {s: category_of(s) for s in sports},
+        # Cellules [athlète, sport, période, D+, distance, temps, nombre] (index dans athletes/sports)
+        **{level: [[ai, si, key, *_rounded(values)]
+                   for (ai, si, key), values in sorted(level_cells.items(),
+                                                       key=lambda x: (x[0][0], x[0][1], _period_order(x[0][2])))]
+           for level, level_cells in cells.items()},
+        'slices': slices_out,
+    }
@@ -0,0 +1,105 @@
+"""
+Stockage colonnaire canonique des activités (Parquet, partitionné par année) :
+
+    ../rawdata/store/<table>/year=<année>/part-0.parquet
+
+- activities : une ligne par activité, colonnes scalaires sans les traces
+  (écrite par build_database.py)
+- polylines  : activity_id et objet "map" Strava (JSON), mêmes lignes et mêmes
+  blocs que activities (écrite par build_database.py)
+- groups     : sorties de groupe détectées (écrite par Precompute_groups.py)
+- countries  : pays de départ de chaque activité (écrite par Precompute_groups.py)
+
+Les lectures projettent les fichiers en mémoire (memory_map) et ne lisent que
+les colonnes demandées. Les fichiers JSON servis par le site sont des vues
+exportées depuis ces tables.
+"""
+
+import os
+
+import pyarrow.parquet as pq
+
+STORE_DIR = '../rawdata/store'
+PART_FILE = 'part-0.parquet'
+
+
+def partition_path(table, year):
+    return os.path.join(STORE_DIR, table, f'year={year}', PART_FILE)
+
+
+def years(table):
+    """Années disponibles pour une table."""
+    table_dir = os.path.join(STORE_DIR, table)
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(int(name[5:]) for name in os.listdir(table_dir)
+                  if name.startswith('year=') and os.path.exists(os.path.join(table_dir, name, PART_FILE)))
+
+
+def exists(table, year):
+    return os.path.exists(partition_path(table, year))
+
+
+def read(table, year, columns=None):
+    """Partition d'une année (table Arrow), ou None si elle n'existe pas."""
+    path = partition_path(table, year)
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path, columns=columns, memory_map=True)
+
+
+def open_partition(table, year):
+    """ParquetFile d'une partition, pour une lecture bloc par bloc."""
+    return pq.ParquetFile(partition_path(table, year), memory_map=True)
+
+
+class PartitionWriter:
+    """
+    Écrit les partitions d'une table bloc par bloc, dans des fichiers
+    temporaires qui remplacent les anciennes partitions à la fermeture.
+    prune: supprimer les années absentes de la nouvelle écriture.
+    """
+
+    def __init__(self, table, schema, prune=False):
+        self.table = table
+        self.schema = schema
+        self.prune = prune
+        self.writers = {}
+
+    def write(self, year, batch):
+        if year not in self.writers:
+            path = partition_path(self.table, year)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.writers[year] = pq.ParquetWriter(f"{path}.tmp", self.schema)
+        self.writers[year].write_table(batch)
+
+    def close(self):
+        for year, writer in self.writers.items():
+            writer.close()
+            path = partition_path(self.table, year)
+            os.replace(f"{path}.tmp", path)
+        if self.prune:
+            for year in years(self.table):
+                if year not in self.writers:
+                    os.remove(partition_path(self.table, year))
+
+    def abort(self):
+        for year, writer in self.writers.items():
+            writer.close()
+            os.remove(f"{partition_path(self.table, year)}.tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write(table, by_year, schema, prune=False):
+    """Remplace les partitions d'une table ({année: table Arrow})."""
+    with PartitionWriter(table, schema, prune) as writer:
+        for year, batch in sorted(by_year.items()):
+            writer.write(year, batch)
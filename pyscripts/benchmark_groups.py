@@ -0,0 +1,297 @@
+"""
+Banc d'essai de la détection des sorties de groupe sur des clubs synthétiques.
+
+Un générateur déterministe (graine) produit une année d'activités pour N
+athlètes : des bases autour desquelles chaque athlète tourne sur une
+bibliothèque de parcours, des sorties partagées (même parcours, traces
+bruitées, départs décalés), des sorties seules et quelques sorties sur
+plusieurs jours. Chaque étape du pipeline (decode_polyline,
+compare_polylines, ActivityRecord, activities_match, detect_group_activities)
+est chronométrée à plusieurs échelles.
+
+Les groupes détectés sont résumés par une empreinte comparée à
+benchmark_golden.json : une optimisation ne doit pas changer les groupes.
+
+    python benchmark_groups.py --scales 10,100,1000
+    python benchmark_groups.py --scales 10,100 --update-golden
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import radians, cos, sin, pi
+
+import Precompute_groups as pg
+import track_cache as track_store
+import track_simplify
+
+GOLDEN_FILE = 'benchmark_golden.json'
+DEFAULT_SCALES = (10, 100, 1000)
+DEFAULT_SEED = 42
+DEFAULT_DAYS = 365
+YEAR_START = datetime(2025, 1, 1)
+
+# Nombre maximal de paires comparées par compare_polylines (version Python, lente)
+COMPARE_SAMPLE_PAIRS = 2000
+
+# Un club : des bases de ~25 athlètes, quelques parcours par base et par sport
+ATHLETES_PER_BASE = 25
+ROUTES_PER_BASE = 12
+BASE_AREA = ((44.5, 46.5), (5.0, 7.5))  # latitudes, longitudes (Alpes)
+# Sport: (part des activités, vitesse m/s, pas entre points en m, D+ par km)
+SPORTS = {
+    'Ride': (0.30, 7.5, 120, 12),
+    'GravelRide': (0.08, 6.0, 100, 14),
+    'MountainBikeRide': (0.08, 4.5, 70, 30),
+    'Run': (0.22, 3.0, 40, 10),
+    'TrailRun': (0.12, 2.3, 35, 60),
+    'Hike': (0.10, 1.2, 30, 90),
+    'BackcountrySki': (0.10, 0.9, 30, 130),
+}
+# Nombre moyen d'activités par athlète et par semaine
+ACTIVITIES_PER_WEEK = 3.0
+# Probabilité qu'une activité soit une sortie partagée, taille des groupes
+SHARED_PROBABILITY = 0.35
+GROUP_SIZE = (2, 8)
+# Sorties sur plusieurs jours (bivouac, traversée)
+MULTI_DAY_PROBABILITY = 0.01
+# Bruit GPS (m) et écarts entre membres d'un groupe
+TRACK_JITTER_METERS = 12
+START_OFFSET_MINUTES = 12
+DURATION_JITTER = 0.05
+
+
+def _offset(lat, lng, north_m, east_m):
+    """Point décalé de quelques mètres (projection locale)."""
+    return (lat + north_m / 111320, lng + east_m / (111320 * cos(radians(lat))))
+
+
+def make_route(rng, base, sport):
+    """
+    Boucle aléatoire autour d'une base (rayon perturbé par quelques harmoniques) :
+    liste de (lat, lng) et longueur approximative en mètres.
+    """
+    _, _, step, _ = SPORTS[sport]
+    n_points = rng.randint(150, 550)
+    radius = step * n_points / (2 * pi)
+    harmonics = [(rng.uniform(0, 0.25), rng.randint(2, 5), rng.uniform(0, 2 * pi)) for _ in range(3)]
+    center = _offset(*base, rng.uniform(-3000, 3000), rng.uniform(-3000, 3000))
+    start_angle = rng.uniform(0, 2 * pi)
+    points = []
+    for k in range(n_points):
+        angle = start_angle + 2 * pi * k / (n_points - 1)
+        r = radius * (1 + sum(amp * sin(freq * angle + phase) for amp, freq, phase in harmonics))
+        points.append(_offset(*center, r * sin(angle), r * cos(angle)))
+    return points, step * (n_points - 1)
+
+
+def jitter_track(rng, points):
+    return [_offset(lat, lng, rng.gauss(0, TRACK_JITTER_METERS), rng.gauss(0, TRACK_JITTER_METERS))
+            for lat, lng in points]
+
+
+def make_activity(rng, activity_id, athlete_id, sport, start, route, multi_day=False):
+    points, length = route
+    _, speed, _, climb = SPORTS[sport]
+    moving_time = int(length / speed * rng.uniform(1 - DURATION_JITTER, 1 + DURATION_JITTER))
+    if multi_day:
+        # Plusieurs jours avec nuits : beaucoup de pauses (restRatio > 0.4)
+        elapsed_time = moving_time + rng.randint(1, 3) * 86400 // 2 + 36000
+    else:
+        elapsed_time = int(moving_time * rng.uniform(1.05, 1.3))
+    track = jitter_track(rng, points)
+    return {
+        'activity_id': activity_id,
+        'athlete_id': athlete_id,
+        'athlete_name': f"Athlete {athlete_id}",
+        'name': f"{sport} {start:%d/%m}",
+        'sport_type': sport,
+        'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'moving_time': moving_time,
+        'elapsed_time': elapsed_time,
+        'distance': round(length * rng.uniform(0.97, 1.03), 1),
+        'total_elevation_gain': round(length / 1000 * climb * rng.uniform(0.9, 1.1), 1),
+        'map': {'summary_polyline': track_simplify.encode_polyline(track)},
+        'start_latlng': [round(track[0][0], 6), round(track[0][1], 6)],
+        'country': 'France',
+    }
+
+
+def generate_club(n_athletes, seed=DEFAULT_SEED, days=DEFAULT_DAYS):
+    """
+    Club synthétique déterministe : (activités, groupes plantés). Les groupes
+    plantés sont les ensembles d'activity_id d'une même sortie partagée.
+    """
+    rng = random.Random(f"{seed}-{n_athletes}-{days}")
+    sports = list(SPORTS)
+    weights = [SPORTS[s][0] for s in sports]
+
+    n_bases = max(1, n_athletes // ATHLETES_PER_BASE)
+    bases = [(rng.uniform(*BASE_AREA[0]), rng.uniform(*BASE_AREA[1])) for _ in range(n_bases)]
+    routes = {(b, s): [make_route(rng, bases[b], s) for _ in range(ROUTES_PER_BASE)]
+              for b in range(n_bases) for s in sports}
+    athletes = [(1000 + k, k % n_bases) for k in range(n_athletes)]
+    members = defaultdict(list)
+    for athlete_id, base in athletes:
+        members[base].append(athlete_id)
+
+    activities, planted = [], []
+    next_id = 10 ** 9
+    busy = set()  # (athlete, jour) déjà pris par une sortie partagée
+    p_active = ACTIVITIES_PER_WEEK / 7
+    for day in range(days):
+        date = YEAR_START + timedelta(days=day)
+        for athlete_id, base in athletes:
+            if (athlete_id, day) in busy or rng.random() > p_active:
+                continue
+            sport = rng.choices(sports, weights)[0]
+            route = rng.choice(routes[(base, sport)])
+            start = date + timedelta(hours=rng.uniform(6, 18))
+            if rng.random() < SHARED_PROBABILITY and len(members[base]) > 1:
+                free = [a for a in members[base] if (a, day) not in busy and a != athlete_id]
+                size = min(len(free) + 1, rng.randint(*GROUP_SIZE))
+                group = [athlete_id] + rng.sample(free, size - 1)
+                ids = []
+                for member in group:
+                    busy.add((member, day))
+                    offset = timedelta(minutes=rng.uniform(-START_OFFSET_MINUTES, START_OFFSET_MINUTES))
+                    activities.append(make_activity(rng, next_id, member, sport, start + offset, route))
+                    ids.append(next_id)
+                    next_id += 1
+                if len(ids) >= pg.MIN_GROUP_SIZE:
+                    planted.append(frozenset(ids))
+            else:
+                busy.add((athlete_id, day))
+                multi_day = rng.random() < MULTI_DAY_PROBABILITY
+                activities.append(make_activity(rng, next_id, athlete_id, sport, start, route, multi_day))
+                next_id += 1
+    return activities, planted
+
+
+def groups_digest(groups):
+    """Empreinte des groupes détectés, indépendante de l'ordre des membres."""
+    canonical = sorted((g['date'], sorted(g['activity_ids'])) for g in groups)
+    return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()[:16]
+
+
+def timed(label, results, func, *args):
+    t0 = time.perf_counter()
+    value = func(*args)
+    results[label] = round(time.perf_counter() - t0, 3)
+    return value
+
+
+def run_scale(n_athletes, seed, days, workers):
+    """Chronomètre chaque étape pour un club de n_athletes athlètes."""
+    timings = {}
+    activities, planted = timed('generation', timings, generate_club, n_athletes, seed, days)
+    # Traces décodées puis jetées : à 1000 athlètes elles ne tiennent pas en mémoire
+    n_points = timed('decode_polyline', timings, lambda: sum(
+        len(pg.decode_polyline(a['map']['summary_polyline'])) for a in activities))
+
+    days_list = pg.group_by_day(activities)
+    pairs = [(day_acts[i], day_acts[j]) for _, day_acts in days_list
+             for i, j in pg.candidate_pairs(day_acts)]
+    sample = [(pg.decode_polyline(a1['map']['summary_polyline']),
+               pg.decode_polyline(a2['map']['summary_polyline'])) for a1, a2 in pairs[:COMPARE_SAMPLE_PAIRS]]
+    timed('compare_polylines', timings, lambda: [pg.compare_polylines(p1, p2) for p1, p2 in sample])
+
+    records = timed('activity_records', timings, lambda: {
+        a['activity_id']: pg.ActivityRecord(a) for a in activities})
+    pg.track_cache = track_store.TrackCache()
+    timed('activities_match', timings, lambda: [
+        pg.records_match(records[a1['activity_id']], records[a2['activity_id']]) for a1, a2 in pairs])
+
+    pg.track_cache = track_store.TrackCache()
+    pg.detection_stats.clear()
+    groups = timed('detect_group_activities', timings, pg.detect_group_activities, activities, workers)
+
+    detected = {frozenset(g['activity_ids']) for g in groups}
+    return {
+        'athletes': n_athletes,
+        'activities': len(activities),
+        'points': n_points,
+        'candidate_pairs': len(pairs),
+        'compared_pairs': len(sample),
+        'groups': len(groups),
+        'planted_groups': len(planted),
+        'planted_found': sum(1 for g in planted if g in detected),
+        'digest': groups_digest(groups),
+        'timings': timings,
+    }
+
+
+def golden_key(n_athletes, seed, days):
+    return f"{n_athletes}-{seed}-{days}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc d'essai de la detection de groupes")
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help="nombres d'athletes, separes par des virgules")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS)
+    parser.add_argument('--engine', choices=['numpy', 'python'], default=pg.POLYLINE_ENGINE,
+                        help="moteur de comparaison des traces GPS")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="nombre de process pour detect_group_activities")
+    parser.add_argument('--update-golden', action='store_true',
+                        help=f"enregistrer les empreintes obtenues dans {GOLDEN_FILE}")
+    parser.add_argument('--output', help="ecrire les resultats (JSON) dans ce fichier")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pg.POLYLINE_ENGINE = args.engine
+    try:
+        with open(GOLDEN_FILE, 'r', encoding='utf-8') as f:
+            golden = json.load(f)
+    except FileNotFoundError:
+        golden = {}
+
+    results, failures = [], []
+    for n_athletes in (int(s) for s in args.scales.split(',')):
+        print(f"\n{n_athletes} athletes, {args.days} jours (graine {args.seed})...")
+        result = run_scale(n_athletes, args.seed, args.days, args.workers)
+        results.append(result)
+        print(f"  {result['activities']} activites, {result['points']} points, "
+              f"{result['candidate_pairs']} paires candidates")
+        for stage, seconds in result['timings'].items():
+            print(f"  {stage:<25} {seconds:8.2f}s")
+        print(f"  {result['groups']} groupes, {result['planted_found']}/{result['planted_groups']} "
+              f"groupes plantes retrouves a l'identique")
+
+        key = golden_key(n_athletes, args.seed, args.days)
+        if args.update_golden:
+            golden[key] = {'groups': result['groups'], 'digest': result['digest']}
+        elif key in golden:
+            if golden[key]['digest'] == result['digest']:
+                print(f"  Reference OK ({result['digest']})")
+            else:
+                print(f"  ECHEC: groupes differents de la reference "
+                      f"({result['groups']} groupes, {result['digest']} au lieu de "
+                      f"{golden[key]['groups']} groupes, {golden[key]['digest']})")
+                failures.append(key)
+        else:
+            print(f"  Pas de reference pour {key} (--update-golden pour l'enregistrer)")
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+        print(f"\nReferences enregistrees dans {GOLDEN_FILE}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'seed': args.seed, 'days': args.days, 'engine': args.engine,
+                       'results': results}, f, indent=2)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
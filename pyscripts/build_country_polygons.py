@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Génère country_polygons.json, les contours simplifiés des pays utilisés par
+le géocodage offline (offline_geocoder.py).
+
+Les contours sont dérivés des polygones de fuseaux horaires de
+timezone-boundary-builder (© contributeurs OpenStreetMap, ODbL), fournis par
+le paquet timezonefinder, et rattachés à leur pays via zone.tab (paquet
+tzdata). Chaque anneau est simplifié (Douglas-Peucker) puis stocké sous forme
+de polyline encodée.
+
+Script de maintenance, à relancer seulement pour rafraîchir les données :
+    pip install timezonefinder tzdata numpy
+    python build_country_polygons.py
+"""
+
+import json
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+import tzdata
+from timezonefinder import TimezoneFinder
+
+from Precompute_groups import translate_country_to_french
+
+OUTPUT_FILE = 'country_polygons.json'
+# Tolérance de simplification en degrés (~500 m)
+SIMPLIFY_TOLERANCE = 0.005
+
+# Noms de iso3166.tab qui diffèrent des noms anglais usuels
+ISO_NAME_ALIASES = {
+    'Britain (UK)': 'United Kingdom', 'Korea (South)': 'South Korea',
+    'Korea (North)': 'North Korea', 'Bosnia & Herzegovina': 'Bosnia and Herzegovina',
+    'Trinidad & Tobago': 'Trinidad and Tobago', "Côte d'Ivoire": 'Ivory Coast',
+    'Congo (Dem. Rep.)': 'Democratic Republic of the Congo', 'Czech Republic': 'Czechia',
+}
+
+
+def read_tab(name):
+    path = os.path.join(os.path.dirname(tzdata.__file__), 'zoneinfo', name)
+    with open(path, encoding='utf-8') as f:
+        return [line.rstrip('\n').split('\t') for line in f if not line.startswith('#')]
+
+
+def simplify(ring, tolerance):
+    """Douglas-Peucker itératif sur un anneau (n, 2)."""
+    if len(ring) < 4:
+        return ring
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = ring[start], ring[end]
+        inner = ring[start + 1:end]
+        ab = b - a
+        norm = np.hypot(ab[0], ab[1])
+        if norm == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (inner[:, 1] - a[1]) - ab[1] * (inner[:, 0] - a[0])) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            split = start + 1 + k
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return ring[keep]
+
+
+def encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_ring(ring):
+    """Encode un anneau [lon, lat] en polyline (ordre lat, lon comme Strava)."""
+    out = []
+    last_lat = last_lon = 0
+    for lon, lat in np.round(ring * 1e5).astype(np.int64).tolist():
+        out.append(encode_value(lat - last_lat) + encode_value(lon - last_lon))
+        last_lat, last_lon = lat, lon
+    return ''.join(out)
+
+
+def main():
+    zone_country = {row[2]: row[0] for row in read_tab('zone.tab')}
+    iso_names = {row[0]: row[1] for row in read_tab('iso3166.tab')}
+
+    tf = TimezoneFinder(in_memory=True)
+    polygons = defaultdict(list)
+    n_points = 0
+    for zone in tf.timezone_names:
+        code = zone_country.get(zone)
+        if code is None:
+            # Fuseaux océaniques (Etc/GMT+x) : pas de pays
+            continue
+        for rings in tf.get_geometry(tz_name=zone, coords_as_pairs=True):
+            simplified = [simplify(np.asarray(r, dtype=float), SIMPLIFY_TOLERANCE) for r in rings]
+            if len(simplified[0]) < 4:
+                continue
+            simplified = [simplified[0]] + [h for h in simplified[1:] if len(h) >= 4]
+            n_points += sum(len(r) for r in simplified)
+            polygons[code].append([encode_ring(r) for r in simplified])
+
+    countries = []
+    for code in sorted(polygons):
+        english = ISO_NAME_ALIASES.get(iso_names[code], iso_names[code])
+        countries.append({
+            'code': code,
+            'name': translate_country_to_french(english),
+            'polygons': polygons[code],
+        })
+
+    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': 'timezone-boundary-builder via timezonefinder-data, '
+                      '(c) OpenStreetMap contributors, ODbL',
+            'tolerance': SIMPLIFY_TOLERANCE,
+            'countries': countries,
+        }, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"{len(countries)} pays, {n_points} points -> {OUTPUT_FILE} "
+          f"({os.path.getsize(OUTPUT_FILE) / 1024:.1f} KB)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
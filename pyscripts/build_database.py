@@ -1,8 +1,99 @@
+import argparse
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from collections import Counter
 
+import activity_store
+import manifest
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+DATA_DIR = Path("../rawdata/All_metadata")
+# Table d'extraction (toutes années, colonnes utiles uniquement), écrite par blocs ;
+# elle alimente le stockage canonique activity_store et la reconstruction incrémentale
+ROWS_FILE = Path("../rawdata/activities_rows.parquet")
+# Empreinte des fichiers bruts déjà lus et ligne produite par chacun (reconstruction incrémentale)
+MANIFEST_FILE = Path("../rawdata/build_manifest.json")
+MANIFEST_VERSION = 2
+OUTPUT_DIR = Path("../public/data")
+YEAR = 2025
+
+# Nombre de lignes accumulées avant écriture d'un bloc (row group)
+CHUNK_SIZE = 500
+# Nombre de fichiers envoyés à la fois à un process (--jobs)
+FILE_BATCH_SIZE = 50
+
+# Le pool par défaut (mimalloc) garde la mémoire libérée entre deux blocs :
+# le pool système la rend, ce qui garde le pic mémoire stable
+pa.set_memory_pool(pa.system_memory_pool())
+
+# Champs bruts Strava (préfixe ijson) -> colonne
+RAW_FIELDS = {
+    "athlete.id": "athlete_id",
+    "id": "activity_id",
+    "name": "name",
+    "start_date": "date",
+    "sport_type": "sport",
+    "distance": "distance_m",
+    "moving_time": "moving_time_s",
+    "total_elevation_gain": "elevation_gain_m",
+    "calories": "calories",
+    "start_date_local": "start_date_local",
+    "elapsed_time": "elapsed_time",
+    "kudos_count": "kudos_count",
+    "comment_count": "comment_count",
+    "athlete_name": "athlete_name",
+}
+
+ROW_SCHEMA = pa.schema([
+    ("athlete_id", pa.int64()),
+    ("activity_id", pa.int64()),
+    ("name", pa.string()),
+    ("date", pa.string()),
+    ("sport", pa.string()),
+    ("distance_m", pa.float64()),
+    ("moving_time_s", pa.float64()),
+    ("elevation_gain_m", pa.float64()),
+    ("calories", pa.float64()),
+    ("start_date_local", pa.string()),
+    ("elapsed_time", pa.int64()),
+    ("kudos_count", pa.int64()),
+    ("comment_count", pa.int64()),
+    ("athlete_name", pa.string()),
+    ("start_lat", pa.float64()),
+    ("start_lng", pa.float64()),
+    ("tracemap", pa.string()),  # objet "map" Strava sérialisé en JSON
+    ("country", pa.string()),
+    ("year", pa.int32()),
+])
+
+# Stockage canonique : colonnes scalaires d'un côté, traces de l'autre
+# (l'année est portée par la partition)
+POLYLINE_COLUMNS = ["activity_id", "tracemap"]
+ACTIVITY_COLUMNS = [name for name in ROW_SCHEMA.names if name not in ("tracemap", "year")]
+ACTIVITY_SCHEMA = pa.schema([ROW_SCHEMA.field(name) for name in ACTIVITY_COLUMNS])
+POLYLINE_SCHEMA = pa.schema([ROW_SCHEMA.field(name) for name in POLYLINE_COLUMNS])
+
+# Une ligne extraite est un tuple dans l'ordre des colonnes de ROW_SCHEMA
+ROW_COLUMNS = ROW_SCHEMA.names
+ACTIVITY_ID_INDEX = ROW_COLUMNS.index("activity_id")
+
+SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+EXPORT_COLUMNS = ['athlete_id', 'activity_id', 'name', 'date', 'sport', 'tracemap',
+                  'distance_m', 'moving_time_s', 'elevation_gain_m', 'calories',
+                  'year', 'country']  # 🌍 Ajout du pays
+
 
 def get_country_from_segments(data):
     """Extrait le pays à partir des segments Strava"""
@@ -23,93 +114,334 @@ def get_country_from_segments(data):
     return None
 
 
-# ========================================
-# EXTRACTION DES DONNÉES
-# ========================================
+def make_row(fields, start_latlng, tracemap, country):
+    date = fields.get("date")
+    start_lat, start_lng = start_latlng[:2] if start_latlng and len(start_latlng) >= 2 else (None, None)
+    return (
+        *(fields.get(column) for column in RAW_FIELDS.values()),
+        start_lat,
+        start_lng,
+        json.dumps(tracemap, ensure_ascii=False) if tracemap is not None else None,
+        country,
+        int(date[:4]),
+    )
 
-rows = []
-DATA_DIR = Path("../rawdata/All_metadata")
-files = list(DATA_DIR.glob("*.json"))
-print(f"📁 Nombre de fichiers trouvés : {len(files)}")
-
-for i, file in enumerate(files):
-    if i % 100 == 0:
-        print(f"⏳ Traitement: {i}/{len(files)}")
-
-    with open(file, encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Déterminer le pays via les segments
-    country = get_country_from_segments(data)
-
-    # Construction de la ligne
-    row = {
-        "athlete_id": data["athlete"]["id"],
-        "activity_id": data["id"],
-        "name": data["name"],
-        "date": data["start_date"],
-        "sport": data["sport_type"],
-        "distance_m": data.get("distance"),
-        "moving_time_s": data.get("moving_time"),
-        "elevation_gain_m": data.get("total_elevation_gain"),
-        "calories": data.get("calories"),
-        "tracemap": data.get("map"),
-        "country": country
-    }
-
-    rows.append(row)
-
-print("\n✅ Extraction terminée !")
-print(f"📊 Total d'activités : {len(rows)}")
-
-# ========================================
-# TRAITEMENT DU DATAFRAME
-# ========================================
-
-df = pd.DataFrame(rows)
-
-# Déduplication
-df = df.drop_duplicates(subset=['activity_id'], keep='first')
-print(f"🔄 Nombre de lignes après déduplication : {len(df)}")
-
-# Extraction année/mois
-df["date"] = pd.to_datetime(df["date"])
-df["year"] = df["date"].dt.year
-df["month"] = df["date"].dt.to_period("M")
-
-# Filtrer 2025
-df_2025 = df[df["date"].dt.year == 2025]
-
-# Compter les activités avec/sans pays
-with_country = len(df_2025[df_2025['country'].notna()])
-without_country = len(df_2025[df_2025['country'].isna()])
-print(f"🌍 Activités 2025 avec pays : {with_country}")
-print(f"❓ Activités 2025 sans pays : {without_country}")
-
-# ========================================
-# EXPORT
-# ========================================
-
-output_dir = Path("../public/data")
-output_dir.mkdir(parents=True, exist_ok=True)
-
-# Préparer l'export
-df_export = df_2025[['athlete_id', 'activity_id', 'name', 'date', 'sport', 'tracemap',
-                     'distance_m', 'moving_time_s', 'elevation_gain_m', 'calories',
-                     'year', 'country']].copy()  # 🌍 Ajout du pays
-
-# Nettoyage
-df_export['distance_m'] = df_export['distance_m'].fillna(0).astype(float)
-df_export['moving_time_s'] = df_export['moving_time_s'].fillna(0).astype(float)
-df_export['elevation_gain_m'] = df_export['elevation_gain_m'].fillna(0).astype(float)
-df_export['calories'] = df_export['calories'].fillna(0).astype(float)
-df_export['date'] = df_export['date'].dt.strftime('%Y-%m-%dT%H:%M:%S')
-df_export['athlete_id'] = df_export['athlete_id'].astype(int)
-df_export['activity_id'] = df_export['activity_id'].astype(int)
-df_export['year'] = df_export['year'].astype(int)
-
-# Export JSON principal
-output_path = Path("../public/data/activities_2025.json")
-df_export.to_json(output_path, orient="records", indent=2)
-print(f"\n✅ Fichier JSON généré : {output_path.absolute()}")
-print(f"📊 Nombre d'activités 2025 exportées : {len(df_export)}")
\ No newline at end of file
+
+def parse_activity_file(file):
+    """
+    Lit un fichier d'activité brut en flux (ijson) et ne garde que les champs
+    utiles, l'objet "map" et le décompte des pays des segments.
+    Sans ijson, le fichier est chargé entier (json.load) puis réduit.
+    """
+    if ijson is None:
+        with open(file, encoding="utf-8") as f:
+            data = json.load(f)
+        fields = {column: data.get(key) for key, column in RAW_FIELDS.items() if "." not in key}
+        fields["athlete_id"] = data["athlete"]["id"]
+        return make_row(fields, data.get("start_latlng"), data.get("map"), get_country_from_segments(data))
+
+    fields = {}
+    start_latlng = []
+    tracemap = None
+    countries = Counter()
+    with open(file, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if event not in SCALAR_EVENTS:
+                if prefix == "map" and event == "start_map":
+                    tracemap = {}
+                continue
+            if prefix in RAW_FIELDS:
+                fields[RAW_FIELDS[prefix]] = value
+            elif prefix.startswith("map."):
+                tracemap[prefix[4:]] = value
+            elif prefix == "start_latlng.item":
+                start_latlng.append(value)
+            elif prefix == "segment_efforts.item.segment.country" and value:
+                countries[value] += 1
+
+    # Pays le plus fréquent parmi les segments
+    country = countries.most_common(1)[0][0] if countries else None
+    return make_row(fields, start_latlng, tracemap, country)
+
+
+def parse_file_batch(files):
+    """
+    Extrait les lignes d'un lot de fichiers (exécuté dans un process du pool),
+    avec l'empreinte de chaque fichier pour le manifeste.
+    """
+    return [(parse_activity_file(file), manifest.fingerprint(file)) for file in files]
+
+
+def iter_parsed_batches(files, jobs=1):
+    """
+    Produit les lignes extraites lot par lot, dans l'ordre des fichiers :
+    le résultat est le même en série et avec un pool de jobs process.
+    """
+    batches = [files[i:i + FILE_BATCH_SIZE] for i in range(0, len(files), FILE_BATCH_SIZE)]
+    if jobs > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from executor.map(parse_file_batch, batches)
+    else:
+        yield from map(parse_file_batch, batches)
+
+
+def load_previous_build():
+    """
+    Manifeste et table de la construction précédente, s'ils sont cohérents
+    entre eux. Renvoie ({nom de fichier: entrée}, table Arrow) ou ({}, None).
+    """
+    previous = manifest.load(MANIFEST_FILE, MANIFEST_VERSION)
+    if previous is None or previous.get("columns") != ROW_COLUMNS or not ROWS_FILE.exists():
+        return {}, None
+    if not manifest.is_unchanged(previous["rows_file"], ROWS_FILE):
+        return {}, None
+    # Table projetée en mémoire : seules les lignes réutilisées sont lues
+    return previous["files"], pq.read_table(ROWS_FILE, memory_map=True)
+
+
+def plan_rebuild(files, previous_files):
+    """
+    Pour chaque fichier, l'empreinte à reprendre avec l'index de sa ligne dans
+    la table précédente, ou None s'il est nouveau ou modifié et doit être relu.
+    """
+    # Ligne conservée de chaque activité dont le fichier source est inchangé
+    kept_rows = {}
+    unchanged = {}
+    for file in files:
+        entry = previous_files.get(file.name)
+        st = file.stat()
+        if manifest.is_unchanged(entry, file, st):
+            unchanged[file.name] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "hash": entry["hash"]}
+            if entry["row"] is not None:
+                kept_rows[entry["activity_id"]] = entry["row"]
+
+    plan = []
+    for file in files:
+        reuse = unchanged.get(file.name)
+        if reuse is not None:
+            # Un doublon écarté la dernière fois reprend la ligne conservée de son activité
+            row = previous_files[file.name]["row"]
+            if row is None:
+                row = kept_rows.get(previous_files[file.name]["activity_id"])
+            reuse = dict(reuse, row=row) if row is not None else None
+        plan.append((file, reuse))
+    return plan
+
+
+def read_rows(table, indices):
+    """Lignes (tuples) de la table précédente aux index donnés."""
+    if not indices:
+        return []
+    columns = table.take(indices).to_pydict()
+    return list(zip(*(columns[name] for name in ROW_COLUMNS)))
+
+
+def iter_row_chunks(plan, previous_rows=None, jobs=1, chunk_size=CHUNK_SIZE):
+    """
+    Produit par blocs de chunk_size des triplets (nom du fichier, empreinte, ligne) :
+    lignes reprises de la table précédente ou extraites des fichiers à relire.
+    """
+    to_parse = [file for file, reuse in plan if reuse is None]
+    parsed = (item for batch in iter_parsed_batches(to_parse, jobs) for item in batch)
+    for start in range(0, len(plan), chunk_size):
+        print(f"⏳ Traitement: {start}/{len(plan)}")
+        block = plan[start:start + chunk_size]
+        reused_rows = iter(read_rows(previous_rows, [reuse["row"] for _, reuse in block if reuse]))
+        chunk = []
+        for file, reuse in block:
+            if reuse is None:
+                row, entry = next(parsed)
+            else:
+                row, entry = next(reused_rows), {k: v for k, v in reuse.items() if k != "row"}
+            chunk.append((file.name, entry, row))
+        yield chunk
+
+
+def write_rows(chunks, path):
+    """
+    Écrit les blocs de lignes dans un fichier Parquet, en dédupliquant sur
+    activity_id (première occurrence conservée).
+    Renvoie (lues, écrites, entrées du manifeste par fichier).
+    """
+    seen = set()
+    files = {}
+    total = written = 0
+    with pq.ParquetWriter(path, ROW_SCHEMA) as writer:
+        for chunk in chunks:
+            total += len(chunk)
+            rows = []
+            for name, entry, row in chunk:
+                activity_id = row[ACTIVITY_ID_INDEX]
+                files[name] = dict(entry, activity_id=activity_id, row=None)
+                if activity_id not in seen:
+                    seen.add(activity_id)
+                    files[name]["row"] = written + len(rows)
+                    rows.append(row)
+            if rows:
+                columns = [list(values) for values in zip(*rows)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=ROW_SCHEMA))
+                written += len(rows)
+    return total, written, files
+
+
+def write_store(path):
+    """
+    Répartit la table d'extraction par année dans le stockage canonique :
+    colonnes scalaires (activities) et traces (polylines), bloc par bloc,
+    avec les mêmes blocs dans les deux tables. Renvoie {année: lignes}.
+    """
+    counts = Counter()
+    rows_file = pq.ParquetFile(path)
+    with activity_store.PartitionWriter("activities", ACTIVITY_SCHEMA, prune=True) as activities, \
+            activity_store.PartitionWriter("polylines", POLYLINE_SCHEMA, prune=True) as polylines:
+        for i in range(rows_file.metadata.num_row_groups):
+            table = rows_file.read_row_group(i)
+            for year in pc.unique(table["year"]).to_pylist():
+                part = table.filter(pc.equal(table["year"], year))
+                activities.write(year, part.select(ACTIVITY_COLUMNS))
+                polylines.write(year, part.select(POLYLINE_COLUMNS))
+                counts[year] += part.num_rows
+    return counts
+
+
+def prepare_export(batch, year):
+    """Nettoie un bloc de lignes de l'année pour l'export JSON."""
+    df_export = batch.drop_columns(["tracemap"]).to_pandas()
+    df_export["tracemap"] = [json.loads(m) if m is not None else None
+                             for m in batch.column("tracemap").to_pylist()]
+    df_export["year"] = year
+    df_export = df_export[EXPORT_COLUMNS]
+
+    # Nettoyage
+    df_export['distance_m'] = df_export['distance_m'].fillna(0).astype(float)
+    df_export['moving_time_s'] = df_export['moving_time_s'].fillna(0).astype(float)
+    df_export['elevation_gain_m'] = df_export['elevation_gain_m'].fillna(0).astype(float)
+    df_export['calories'] = df_export['calories'].fillna(0).astype(float)
+    df_export['date'] = pd.to_datetime(df_export['date']).dt.strftime('%Y-%m-%dT%H:%M:%S')
+    df_export['athlete_id'] = df_export['athlete_id'].astype(int)
+    df_export['activity_id'] = df_export['activity_id'].astype(int)
+    df_export['year'] = df_export['year'].astype(int)
+    return df_export
+
+
+def iter_export_batches(year):
+    """
+    Relit la partition de l'année bloc par bloc : colonnes exportées des
+    activités, complétées par la trace du bloc correspondant de polylines.
+    """
+    columns = [c for c in EXPORT_COLUMNS if c in ACTIVITY_COLUMNS]
+    activities = activity_store.open_partition("activities", year)
+    polylines = activity_store.open_partition("polylines", year)
+    for i in range(activities.metadata.num_row_groups):
+        batch = activities.read_row_group(i, columns=columns)
+        tracemaps = polylines.read_row_group(i, columns=["tracemap"]).column("tracemap")
+        yield batch.append_column("tracemap", tracemaps)
+
+
+def export_year(year, output_path):
+    """
+    Vue JSON (records, indent=2) des activités de l'année, exportée bloc par
+    bloc depuis le stockage canonique : chaque bloc est sérialisé par pandas
+    puis raccordé au précédent. Renvoie le nombre d'activités exportées.
+    """
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        if activity_store.exists("activities", year):
+            for batch in iter_export_batches(year):
+                records = prepare_export(batch, year).to_json(orient="records", indent=2)
+                # "[\n  {...}\n]" -> "\n  {...}"
+                out.write(("," if count else "") + records[1:-2])
+                count += batch.num_rows
+        out.write("\n]" if count else "]")
+    return count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Construction de la base d'activités de l'année")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="nombre de process pour la lecture des fichiers bruts")
+    parser.add_argument("--full", action="store_true",
+                        help="ignorer le manifeste et relire tous les fichiers bruts")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    timings = {}
+
+    # ========================================
+    # EXTRACTION DES DONNÉES
+    # ========================================
+
+    files = list(DATA_DIR.glob("*.json"))
+    print(f"📁 Nombre de fichiers trouvés : {len(files)}")
+
+    start = time.perf_counter()
+    previous_files, previous_rows = ({}, None) if args.full else load_previous_build()
+    plan = plan_rebuild(files, previous_files)
+    reused = sum(1 for _, reuse in plan if reuse is not None)
+    print(f"♻️ Fichiers inchangés repris : {reused}, à lire : {len(plan) - reused}")
+
+    # La table précédente est lue pendant l'écriture de la nouvelle
+    tmp_rows_file = ROWS_FILE.with_suffix(".parquet.tmp")
+    total, written, manifest_files = write_rows(
+        iter_row_chunks(plan, previous_rows, args.jobs), tmp_rows_file)
+    previous_rows = None
+    os.replace(tmp_rows_file, ROWS_FILE)
+    manifest.save(MANIFEST_FILE, {
+        "version": MANIFEST_VERSION,
+        "columns": ROW_COLUMNS,
+        "rows_file": manifest.fingerprint(ROWS_FILE, with_hash=False),
+        "files": manifest_files,
+    })
+    timings["extraction"] = time.perf_counter() - start
+
+    print("\n✅ Extraction terminée !")
+    print(f"📊 Total d'activités : {total}")
+    print(f"🔄 Nombre de lignes après déduplication : {written}")
+
+    # ========================================
+    # STOCKAGE CANONIQUE
+    # ========================================
+
+    start = time.perf_counter()
+    counts = write_store(ROWS_FILE)
+    timings["stockage"] = time.perf_counter() - start
+    print(f"🗄️ Stockage {activity_store.STORE_DIR} : "
+          + ", ".join(f"{year}: {n}" for year, n in sorted(counts.items())))
+
+    # ========================================
+    # TRAITEMENT DES DONNÉES
+    # ========================================
+
+    start = time.perf_counter()
+    # Compter les activités avec/sans pays (seule la colonne pays est lue)
+    countries = activity_store.read("activities", YEAR, columns=["country"])
+    without_country = countries.column("country").null_count if countries is not None else 0
+    with_country = (countries.num_rows if countries is not None else 0) - without_country
+    timings["comptage"] = time.perf_counter() - start
+    print(f"🌍 Activités {YEAR} avec pays : {with_country}")
+    print(f"❓ Activités {YEAR} sans pays : {without_country}")
+
+    # ========================================
+    # EXPORT
+    # ========================================
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Export JSON principal (vue du stockage canonique)
+    start = time.perf_counter()
+    output_path = OUTPUT_DIR / f"activities_{YEAR}.json"
+    exported = export_year(YEAR, output_path)
+    timings["export"] = time.perf_counter() - start
+    print(f"\n✅ Fichier JSON généré : {output_path.absolute()}")
+    print(f"📊 Nombre d'activités {YEAR} exportées : {exported}")
+
+    print(f"\n⏱️ Durées (jobs: {args.jobs}) :")
+    for stage, seconds in timings.items():
+        print(f"  {stage} : {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Co-activité des athlètes pour le graphe social (chord diagram du site) :
+matrice de dénivelé partagé, totaux par paire d'athlètes et par sport, liens
+par paire (une sortie de groupe = un ruban) et statistiques du panneau
+latéral. Le site dessine directement à partir de ces données au lieu de
+reparcourir les sorties de groupe à chaque affichage.
+
+Conventions (identiques à showSocialGraph / generateChordStats, public/js/charts.js) :
+- les sorties d'escalade ne figurent pas dans le graphe ;
+- les athlètes sont indexés dans l'ordre de première apparition des sorties,
+  les sports dans l'ordre de première utilisation (ordre de la légende) ;
+- chaque paire d'une sortie à k athlètes compte le D+ de la sortie : une
+  sortie à 3 contribue trois fois au D+ en groupe.
+
+L'empreinte des sorties (groups_fingerprint, même calcul que dans charts.js)
+permet au site de vérifier que le fichier correspond aux sorties chargées.
+"""
+
+from itertools import combinations
+
+CO_ACTIVITY_VERSION = 2
+METRICS = ('count', 'elevation', 'distance', 'duration')
+EXCLUDED_SPORTS = {'Climb', 'RockClimbing'}
+# Sports regroupés sous le ski de randonnée dans le graphe
+SKI_SPORTS = {'BackcountrySki', 'NordicSki'}
+
+
+def chord_category(group, category_of):
+    """Catégorie d'une sortie dans le graphe (même règle que showSocialGraph)."""
+    category = group.get('sport_category') or category_of(group.get('sport_type') or group.get('sport'))
+    if category == 'Ski' or group.get('sport') in SKI_SPORTS:
+        return 'Ski mountaineering'
+    return category
+
+
+def groups_fingerprint(groups):
+    """
+    Empreinte (FNV-1a 32 bits, hexadécimal) des sorties du graphe : identifiant,
+    athlètes, sport et moyennes de chaque sortie, dans l'ordre.
+    """
+    lines = [f"{g.get('id')}|{','.join(str(a) for a in g['athletes'])}|{g.get('sport_type') or g.get('sport')}|"
+             f"{g.get('elevation') or 0}|{g.get('distance') or 0}|{g.get('duration') or 0}"
+             for g in groups]
+    h = 0x811c9dc5
+    for byte in '\n'.join(lines).encode('utf-8'):
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return f"{h:08x}"
+
+
+def _round(value):
+    return round(value, 1)
+
+
+def build_co_activity(groups, category_of):
+    """
+    Construit les données du graphe social à partir des sorties de groupe.
+    category_of: fonction sport -> catégorie (map_sport).
+    """
+    groups = [g for g in groups if (g.get('sport_type') or g.get('sport')) not in EXCLUDED_SPORTS]
+
+    athletes, athlete_index = [], {}
+    for g in groups:
+        for athlete_id in g['athletes']:
+            if athlete_id not in athlete_index:
+                athlete_index[athlete_id] = len(athletes)
+                athletes.append(athlete_id)
+    n = len(athletes)
+
+    sports, sport_index = [], {}
+    matrix = [[0] * n for _ in range(n)]
+    # (i, j, sport) -> [nombre, D+, distance, durée] ; (i, j) -> sorties, dans l'ordre des sorties
+    pair_totals = {}
+    pair_links = {}
+    pair_counts = {}
+    athlete_groups = [0] * n
+    athlete_elevation = [0] * n
+    partners = [set() for _ in range(n)]
+    links_elevation = 0
+
+    chord_groups = []
+    for g_index, g in enumerate(groups):
+        category = chord_category(g, category_of)
+        if category not in sport_index:
+            sport_index[category] = len(sports)
+            sports.append(category)
+        si = sport_index[category]
+        elevation = g.get('elevation') or 0
+        chord_groups.append([g['date'], g.get('name', ''), si, elevation])
+
+        indexes = [athlete_index[a] for a in g['athletes']]
+        for i in indexes:
+            athlete_groups[i] += 1
+            athlete_elevation[i] += elevation
+            partners[i].update(j for j in indexes if j != i)
+
+        for (a1, i), (a2, j) in combinations(zip(g['athletes'], indexes), 2):
+            matrix[i][j] += elevation
+            matrix[j][i] += elevation
+            links_elevation += elevation
+            low, high = min(i, j), max(i, j)
+            totals = pair_totals.setdefault((low, high, si), [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += elevation
+            totals[2] += g.get('distance') or 0
+            totals[3] += g.get('duration') or 0
+            pair_links.setdefault((low, high), []).append(g_index)
+            # Clé triée comme des chaînes, comme dans generateChordStats
+            pair_key = tuple(sorted((a1, a2), key=str))
+            pair_counts[pair_key] = pair_counts.get(pair_key, 0) + 1
+
+    # Duo le plus actif : premier rencontré en cas d'égalité
+    top_pair = max(pair_counts, key=pair_counts.get) if pair_counts else None
+    # Athlète le plus social : plus petit identifiant en cas d'égalité
+    most_social = min(athletes, key=lambda a: (-athlete_groups[athlete_index[a]], a)) if athletes else None
+
+    return {
+        'version': CO_ACTIVITY_VERSION,
+        # Empreinte des sorties du graphe (hors escalade), voir groups_fingerprint
+        'fingerprint': groups_fingerprint(groups),
+        'metrics': list(METRICS),
+        'athletes': athletes,
+        'sports': sports,
+        # D+ partagé par paire d'athlètes, tous sports confondus (arcs du diagramme)
+        'matrix': [[_round(v) for v in row] for row in matrix],
+        # Sorties [date, nom, sport, D+] (index dans sports)
+        'groups': chord_groups,
+        # Liens [athlète i, athlète j, [sortie, ...]] avec i < j, dans l'ordre des sorties
+        'links': [[i, j, indexes] for (i, j), indexes in pair_links.items()],
+        # Totaux [athlète i, athlète j, sport, nombre, D+, distance, durée]
+        'pairs': [[i, j, si, count, _round(elevation), _round(distance), _round(duration)]
+                  for (i, j, si), (count, elevation, distance, duration) in sorted(pair_totals.items())],
+        # Par athlète (même index que athletes) : [sorties, partenaires, D+ en groupe]
+        'athlete_stats': [[athlete_groups[i], len(partners[i]), _round(athlete_elevation[i])]
+                          for i in range(n)],
+        'stats': {
+            'groups': len(groups),
+            'elevation': _round(links_elevation),
+            'big_groups': sum(1 for g in groups if len(g['athletes']) >= 3),
+            'top_pair': list(top_pair) if top_pair else None,
+            'top_pair_count': pair_counts[top_pair] if top_pair else 0,
+            'most_social': most_social,
+        },
+    }
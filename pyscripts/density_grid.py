@@ -0,0 +1,152 @@
+"""
+Grilles de densité des traces pour la vue d'ensemble de la carte du site :
+au lieu de tracer une polyline Leaflet par segment, le site affiche une carte
+de chaleur et ne charge les traces vectorielles qu'à partir d'un zoom élevé.
+
+Les traces (sans leurs lignes droites, voir track_simplify) sont rastérisées
+en projection Web Mercator, comme les tuiles Leaflet : à un zoom de grille z,
+une tuile de 256 pixels compte 128 x 128 cellules de CELL_PIXELS pixels. Une
+cellule compte les activités qui la traversent. Il y a une couche par athlète
+et par sport (sport_type) : le site additionne les couches des activités
+affichées et les colore par athlète ou par catégorie de sport.
+
+Fichiers écrits dans le dossier density/, à noms versionnés (site_artifacts) :
+- index.json : zooms, couches (athlète, sport, nombre d'activités, emprise)
+  et un fichier binaire par zoom de grille ;
+- z<zoom>.bin (petit-boutiste) : nombre de tuiles (u32), puis pour chaque
+  tuile (couche u16, x u16, y u16, nombre de cellules u32), puis pour chaque
+  tuile dans le même ordre ses cellules (u16, ligne * 128 + colonne, triées)
+  et leurs comptes (u16).
+"""
+
+import os
+import struct
+from collections import defaultdict
+from math import radians, log, tan, pi
+
+import site_artifacts
+
+DENSITY_VERSION = 1
+TILE_SIZE = 256
+CELL_PIXELS = 2
+TILE_CELLS = TILE_SIZE // CELL_PIXELS
+# Zooms des grilles ; au-delà de MAX_ZOOM le site trace les traces vectorielles
+GRID_ZOOMS = (4, 6, 8, 10)
+MAX_ZOOM = 10
+MAX_LATITUDE = 85.05112878
+MAX_COUNT = 0xFFFF
+INDEX_FILENAME = 'index.json'
+
+
+def project(lat, lng, zoom):
+    """Coordonnées en cellules (x, y) d'un point au zoom donné (Web Mercator)."""
+    world = TILE_SIZE * 2 ** zoom / CELL_PIXELS
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lng + 180) / 360 * world
+    y = (0.5 - log(tan(pi / 4 + radians(lat) / 2)) / (2 * pi)) * world
+    return x, y
+
+
+def rasterize(segments, zoom):
+    """Cellules traversées par les segments au zoom donné (ensemble de (x, y))."""
+    cells = set()
+    for segment in segments:
+        x0, y0 = project(*segment[0], zoom)
+        cells.add((int(x0), int(y0)))
+        for lat, lng in segment[1:]:
+            x1, y1 = project(lat, lng, zoom)
+            # Un pas par cellule le long de la plus grande variation
+            steps = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+            if steps == 1:
+                cells.add((int(x1), int(y1)))
+            else:
+                dx, dy = (x1 - x0) / steps, (y1 - y0) / steps
+                for k in range(1, steps + 1):
+                    cells.add((int(x0 + k * dx), int(y0 + k * dy)))
+            x0, y0 = x1, y1
+    return cells
+
+
+class DensityGrids:
+    """Comptes par couche (athlète, sport) et par cellule pour chaque zoom de GRID_ZOOMS."""
+
+    def __init__(self):
+        self.layers = []
+        self.layer_index = {}
+        self.counts = {zoom: defaultdict(int) for zoom in GRID_ZOOMS}
+
+    def add_track(self, athlete_id, sport_type, segments):
+        segments = [s for s in segments if len(s) >= 2]
+        if not segments:
+            return
+        key = (athlete_id, sport_type)
+        if key not in self.layer_index:
+            self.layer_index[key] = len(self.layers)
+            self.layers.append({'athlete_id': athlete_id, 'sport_type': sport_type,
+                                'activities': 0, 'bounds': None})
+        layer_id = self.layer_index[key]
+        layer = self.layers[layer_id]
+        layer['activities'] += 1
+
+        lats = [lat for s in segments for lat, _ in s]
+        lngs = [lng for s in segments for _, lng in s]
+        bounds = [min(lats), min(lngs), max(lats), max(lngs)]
+        if layer['bounds']:
+            bounds = [min(bounds[0], layer['bounds'][0]), min(bounds[1], layer['bounds'][1]),
+                      max(bounds[2], layer['bounds'][2]), max(bounds[3], layer['bounds'][3])]
+        layer['bounds'] = [round(v, 5) for v in bounds]
+
+        # Rastérisation au zoom le plus fin, les zooms inférieurs s'en déduisent
+        finest = max(GRID_ZOOMS)
+        cells = rasterize(segments, finest)
+        for zoom in GRID_ZOOMS:
+            shift = finest - zoom
+            counts = self.counts[zoom]
+            for x, y in {(x >> shift, y >> shift) for x, y in cells}:
+                counts[(layer_id, x, y)] += 1
+
+    def _encode(self, zoom):
+        tiles = defaultdict(list)
+        for (layer_id, x, y), count in self.counts[zoom].items():
+            tiles[(layer_id, x // TILE_CELLS, y // TILE_CELLS)].append(
+                ((y % TILE_CELLS) * TILE_CELLS + x % TILE_CELLS, min(count, MAX_COUNT)))
+
+        directory = [struct.pack('<I', len(tiles))]
+        data = []
+        for (layer_id, tx, ty), cells in sorted(tiles.items()):
+            cells.sort()
+            directory.append(struct.pack('<HHHI', layer_id, tx, ty, len(cells)))
+            data.append(struct.pack(f'<{len(cells)}H', *(cell for cell, _ in cells)))
+            data.append(struct.pack(f'<{len(cells)}H', *(count for _, count in cells)))
+        return b''.join(directory + data), len(tiles)
+
+    def write(self, directory):
+        """
+        Écrit un fichier binaire par zoom et l'index, supprime les fichiers
+        d'une exécution précédente. Renvoie (index, entrée de l'index, fichiers
+        écrits relatifs au dossier).
+        """
+        os.makedirs(directory, exist_ok=True)
+        files, written = {}, set()
+        for zoom in GRID_ZOOMS:
+            payload, n_tiles = self._encode(zoom)
+            entry = site_artifacts.write_file(directory, f"z{zoom}.bin", payload)
+            written |= site_artifacts.written_files(entry)
+            files[str(zoom)] = {**entry, 'tiles': n_tiles,
+                                'max_count': max(self.counts[zoom].values(), default=0)}
+
+        index = {
+            'version': DENSITY_VERSION,
+            'tile_size': TILE_SIZE,
+            'cell_pixels': CELL_PIXELS,
+            'zooms': list(GRID_ZOOMS),
+            'max_zoom': MAX_ZOOM,
+            'layers': self.layers,
+            'files': files,
+        }
+        index_entry = site_artifacts.write_json(directory, INDEX_FILENAME, index)
+        written |= site_artifacts.written_files(index_entry)
+        for name in os.listdir(directory):
+            if name not in written:
+                os.remove(os.path.join(directory, name))
+        return index, index_entry, sorted(entry['file'] for entry in [index_entry, *files.values()])
@@ -0,0 +1,138 @@
+"""
+File de géocodage en ligne : résolution concurrente des clés de cache
+manquantes, sous une limite de débit, avec reprises et journal persistant.
+
+- TokenBucket borne le nombre de requêtes par seconde pour l'ensemble des
+  threads (Nominatim impose 1 requête/s).
+- Les erreurs transitoires (réseau, HTTP 429 et 5xx) sont retentées avec un
+  délai exponentiel ; Retry-After est respecté s'il est fourni.
+- Chaque résultat est ajouté immédiatement à un journal JSON lines : une
+  exécution interrompue reprend là où elle s'était arrêtée.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """
+    Limiteur de débit partagé entre threads (rate jetons/s, rafale de capacity).
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CacheJournal:
+    """
+    Journal append-only des résultats de géocodage (une ligne JSON par clé).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def replay(self, cache):
+        """Recharge dans cache les entrées du journal ; renvoie leur nombre."""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    continue
+                cache[entry['key']] = entry['country']
+                count += 1
+        return count
+
+    def append(self, key, country):
+        line = json.dumps({'key': key, 'country': country}, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        """À appeler une fois le cache complet sauvegardé."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def is_transient(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (urllib.error.URLError, TimeoutError, OSError))
+
+
+def retry_delay(error, attempt, backoff):
+    if isinstance(error, urllib.error.HTTPError) and error.headers:
+        retry_after = error.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+    return backoff * 2 ** attempt
+
+
+def resolve_keys(points_by_key, fetch, journal, cache, workers=4, rate=1.0,
+                 retries=3, backoff=1.0, bucket=None):
+    """
+    Résout chaque clé de points_by_key ({clé: (lat, lon)}) avec fetch(lat, lon).
+
+    Les résultats sont écrits dans cache et dans le journal au fil de l'eau.
+    Les clés en échec après toutes les reprises ne sont pas mises en cache,
+    elles seront retentées à la prochaine exécution.
+    bucket: TokenBucket partagé entre plusieurs appels (sinon un nouveau, à rate).
+    Renvoie les compteurs {'requests', 'retries', 'failures'}.
+    """
+    bucket = bucket or TokenBucket(rate)
+    stats = {'requests': 0, 'retries': 0, 'failures': 0}
+    stats_lock = threading.Lock()
+
+    def resolve(item):
+        key, (lat, lon) = item
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            with stats_lock:
+                stats['requests'] += 1
+            try:
+                country = fetch(lat, lon)
+            except Exception as e:
+                if attempt < retries and is_transient(e):
+                    with stats_lock:
+                        stats['retries'] += 1
+                    time.sleep(retry_delay(e, attempt, backoff))
+                    continue
+                print(f"  Erreur geocoding pour ({lat}, {lon}): {e}")
+                with stats_lock:
+                    stats['failures'] += 1
+                return
+            cache[key] = country
+            journal.append(key, country)
+            return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(resolve, sorted(points_by_key.items())))
+    return stats
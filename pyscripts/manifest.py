@@ -0,0 +1,69 @@
+"""
+Manifeste des entrées déjà traitées, pour les reconstructions incrémentales.
+
+Chaque fichier est identifié par son mtime, sa taille et un hash de son
+contenu. mtime et taille suffisent à reconnaître un fichier inchangé ; quand
+seul le mtime a bougé (copie, resynchronisation), le hash tranche.
+"""
+
+import hashlib
+import json
+import os
+
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def content_hash(value):
+    """Hash stable d'une valeur sérialisable en JSON."""
+    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def fingerprint(path, with_hash=True):
+    st = os.stat(path)
+    entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+    if with_hash:
+        entry['hash'] = file_hash(path)
+    return entry
+
+
+def is_unchanged(entry, path, st=None):
+    """Vrai si path correspond encore à l'empreinte entry du manifeste."""
+    if not entry:
+        return False
+    st = st or os.stat(path)
+    if st.st_size != entry.get('size'):
+        return False
+    if st.st_mtime_ns == entry.get('mtime_ns'):
+        return True
+    return 'hash' in entry and file_hash(path) == entry['hash']
+
+
+def load(path, version):
+    """Manifeste précédent, ou None s'il est absent, illisible ou d'une autre version."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except ValueError:
+        return None
+    if data.get('version') != version:
+        return None
+    return data
+
+
+def save(path, data):
+    # Écriture atomique : un manifeste tronqué forcerait une reconstruction complète
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
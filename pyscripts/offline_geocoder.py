@@ -0,0 +1,131 @@
+"""
+Géocodage inverse offline : pays d'un point GPS à partir des contours
+simplifiés de country_polygons.json (générés par build_country_polygons.py).
+
+Les polygones sont rangés dans une grille régulière. Une cellule qu'aucune
+frontière ne traverse appartient entièrement à un seul pays : sa réponse est
+calculée une fois puis mémorisée. Seuls les points des cellules frontalières
+passent par un test point-dans-polygone (lancer de rayon) sur les polygones
+candidats de la cellule.
+"""
+
+import json
+import os
+from collections import defaultdict
+from math import floor
+
+from track_cache import decode_polyline_e5
+
+POLYGONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'country_polygons.json')
+GRID_CELL_DEGREES = 0.25
+
+
+def point_in_ring(lat, lon, ring):
+    """Lancer de rayon sur un anneau à plat [lat0, lon0, lat1, lon1, ...] (x 1e5)."""
+    inside = False
+    n = len(ring)
+    lat_j, lon_j = ring[n - 2], ring[n - 1]
+    for k in range(0, n, 2):
+        lat_i, lon_i = ring[k], ring[k + 1]
+        if (lat_i > lat) != (lat_j > lat) and \
+                lon < (lon_j - lon_i) * (lat - lat_i) / (lat_j - lat_i) + lon_i:
+            inside = not inside
+        lat_j, lon_j = lat_i, lon_i
+    return inside
+
+
+class CountryIndex:
+    """
+    Index spatial des contours de pays.
+    """
+
+    def __init__(self, path=POLYGONS_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # Un polygone = (nom du pays, bbox, [contour extérieur, trous...])
+        self.polygons = []
+        self.cells = defaultdict(list)
+        self.border_cells = set()
+        self.interior_answers = {}
+
+        for country in data['countries']:
+            for encoded_rings in country['polygons']:
+                rings = [decode_polyline_e5(r) for r in encoded_rings]
+                outer = rings[0]
+                lats, lons = outer[0::2], outer[1::2]
+                bbox = (min(lats), max(lats), min(lons), max(lons))
+                polygon_id = len(self.polygons)
+                self.polygons.append((country['name'], bbox, rings))
+
+                for cell in self._cells_of_bbox(*bbox):
+                    self.cells[cell].append(polygon_id)
+                for ring in rings:
+                    self._mark_border_cells(ring)
+
+    @staticmethod
+    def _cell(lat, lon):
+        """Cellule d'un point exprimé en coordonnées x 1e5."""
+        return (floor(lat / 1e5 / GRID_CELL_DEGREES), floor(lon / 1e5 / GRID_CELL_DEGREES))
+
+    def _cells_of_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        c_min, c_max = self._cell(lat_min, lon_min), self._cell(lat_max, lon_max)
+        return [(i, j) for i in range(c_min[0], c_max[0] + 1) for j in range(c_min[1], c_max[1] + 1)]
+
+    def _mark_border_cells(self, ring):
+        # Cellules touchées par chaque segment (bbox du segment, conservateur)
+        n = len(ring)
+        lat_j, lon_j = ring[n - 2], ring[n - 1]
+        for k in range(0, n, 2):
+            lat_i, lon_i = ring[k], ring[k + 1]
+            c1, c2 = self._cell(lat_i, lon_i), self._cell(lat_j, lon_j)
+            if c1 == c2:
+                self.border_cells.add(c1)
+            else:
+                self.border_cells.update(self._cells_of_bbox(
+                    min(lat_i, lat_j), max(lat_i, lat_j), min(lon_i, lon_j), max(lon_i, lon_j)))
+            lat_j, lon_j = lat_i, lon_i
+
+    def _point_in_polygons(self, lat, lon, cell):
+        for polygon_id in self.cells.get(cell, ()):
+            name, (lat_min, lat_max, lon_min, lon_max), rings = self.polygons[polygon_id]
+            if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                continue
+            if point_in_ring(lat, lon, rings[0]) and \
+                    not any(point_in_ring(lat, lon, hole) for hole in rings[1:]):
+                return name
+        return None
+
+    def lookup(self, lat, lon):
+        """Pays (nom français) contenant le point, ou None (mer, hors données)."""
+        if lat is None or lon is None:
+            return None
+        lat, lon = round(lat * 1e5), round(lon * 1e5)
+        cell = self._cell(lat, lon)
+        if cell in self.border_cells:
+            return self._point_in_polygons(lat, lon, cell)
+
+        # Cellule sans frontière : même pays partout, on teste son centre une fois
+        if cell not in self.interior_answers:
+            center_lat = round((cell[0] + 0.5) * GRID_CELL_DEGREES * 1e5)
+            center_lon = round((cell[1] + 0.5) * GRID_CELL_DEGREES * 1e5)
+            self.interior_answers[cell] = self._point_in_polygons(center_lat, center_lon, cell)
+        return self.interior_answers[cell]
+
+    def lookup_many(self, points):
+        """
+        Résout une liste de points [lat, lon] en une passe.
+        Renvoie un dict {(lat, lon): pays}.
+        """
+        return {(lat, lon): self.lookup(lat, lon) for lat, lon in set(map(tuple, points))}
+
+
+_index = None
+
+
+def get_index():
+    """Index chargé à la première utilisation (partagé par tout le process)."""
+    global _index
+    if _index is None:
+        _index = CountryIndex()
+    return _index
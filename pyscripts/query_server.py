@@ -0,0 +1,440 @@
+"""
+Service local de requêtes sur les sorties du pré-calcul
+(activities_with_groups.json) : le site peut demander des agrégats, des
+pages d'activités ou de sorties de groupe et des traces filtrés côté
+serveur, au lieu de télécharger tout le jeu de données et de le filtrer.
+
+Serveur HTTP asyncio (bibliothèque standard). Les activités sont les lignes
+de l'index du site (sorties sur plusieurs jours réparties par jour, voir
+activity_cube.normalize_multi_day), triées par date et indexées en mémoire
+par athlète, sport, catégorie et pays ; une plage de dates se résout par
+dichotomie. Le fichier est rechargé quand il change.
+
+Routes (GET, réponses JSON) :
+- /api/meta : athlètes, sports, pays, dates extrêmes et nombres de lignes ;
+- /api/activities : page d'activités (sans trace) ;
+- /api/aggregates?by=athlete|sport|category|country|day|week|month : totaux
+  [D+, distance, temps en mouvement, nombre] par clé (mêmes métriques que le
+  cube du site, sports du cube seulement), ou au total sans by ;
+- /api/groups : page de sorties de groupe ;
+- /api/tracks?level=... : traces prêtes à tracer (track_simplify) des
+  activités d'une page, {activity_id: [segments encodés]}.
+Filtres : athlete, sport (sport_type), category, country (valeurs séparées
+par des virgules), from et to (AAAA-MM-JJ, inclus) ; pages : page (à partir
+de 1) et page_size. Chaque réponse porte un ETag dérivé du contenu du fichier
+et de la requête : If-None-Match donne un 304 (sans recalcul si la réponse
+est en cache) pour une requête valide.
+
+Usage :
+    python query_server.py
+    python query_server.py ../public/data/activities_with_groups.json --port 8765
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlsplit, parse_qs
+
+import activity_cube
+import manifest
+import track_simplify
+from Precompute_groups import OUTPUT_FILE, CUBE_EXCLUDED_SPORTS, decode_polyline, map_sport
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Délai minimal entre deux vérifications du fichier de données
+RELOAD_CHECK_SECONDS = 2.0
+RESPONSE_CACHE_SIZE = 256
+TRACK_CACHE_SIZE = 5000
+GZIP_MIN_BYTES = 1024
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS = 100
+KEEP_ALIVE_SECONDS = 15
+FILTERS = ('athlete', 'sport', 'category', 'country')
+GROUP_BY = ('athlete', 'sport', 'category', 'country', 'day', 'week', 'month')
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """Paramètre de requête invalide (réponse 400)."""
+
+
+class ActivityIndex:
+    """
+    Lignes d'activités triées par date (start_date, heure locale) et sorties de
+    groupe triées par date, avec leurs index par valeur de filtre : listes
+    croissantes de positions, donc elles aussi dans l'ordre des dates.
+    """
+
+    def __init__(self, activities, groups, version):
+        self.version = version
+        self.polylines = {a['activity_id']: (a.get('map') or {}).get('summary_polyline')
+                          for a in activities}
+        rows = activity_cube.normalize_multi_day(
+            [{k: v for k, v in a.items() if k != 'map'} for a in activities if a.get('start_date')])
+        self.rows = sorted(rows, key=lambda r: (r['start_date'], str(r['activity_id'])))
+        self.days = [r['start_date'][:10] for r in self.rows]
+        self.index = {
+            'athlete': self._build(self.rows, lambda r: str(r['athlete_id'])),
+            'sport': self._build(self.rows, lambda r: r.get('sport_type')),
+            'category': self._build(self.rows, lambda r: map_sport(r.get('sport_type'))),
+            'country': self._build(self.rows, lambda r: r.get('country')),
+        }
+
+        self.groups = sorted(groups, key=lambda g: (g['date'], g['id']))
+        self.group_days = [g['date'] for g in self.groups]
+        self.group_index = {
+            'athlete': self._build(self.groups, lambda g: [str(a) for a in g['athletes']]),
+            'sport': self._build(self.groups, lambda g: g.get('sport')),
+            'category': self._build(self.groups, lambda g: g.get('sport_category')),
+            'country': self._build(self.groups, lambda g: g.get('country')),
+        }
+
+    @staticmethod
+    def _build(items, key_of):
+        index = defaultdict(list)
+        for position, item in enumerate(items):
+            keys = key_of(item)
+            for key in keys if isinstance(keys, list) else [keys]:
+                if key is not None:
+                    index[key].append(position)
+        return dict(index)
+
+    @staticmethod
+    def _select(n_items, days, index, filters, date_from, date_to):
+        """Positions (croissantes) des éléments qui passent tous les filtres."""
+        lists = []
+        for name, values in filters.items():
+            if len(values) == 1:
+                lists.append(index[name].get(values[0], []))
+            else:
+                lists.append(sorted({p for v in values for p in index[name].get(v, [])}))
+
+        if not lists:
+            start = bisect_left(days, date_from) if date_from else 0
+            end = bisect_right(days, date_to) if date_to else n_items
+            return range(start, end)
+
+        lists.sort(key=len)
+        others = [set(l) for l in lists[1:]]
+        positions = [p for p in lists[0] if all(p in other for other in others)]
+        start = bisect_left(positions, date_from, key=days.__getitem__) if date_from else 0
+        end = bisect_right(positions, date_to, key=days.__getitem__) if date_to else len(positions)
+        return positions[start:end]
+
+    def select_rows(self, filters, date_from, date_to):
+        return self._select(len(self.rows), self.days, self.index, filters, date_from, date_to)
+
+    def select_groups(self, filters, date_from, date_to):
+        return self._select(len(self.groups), self.group_days, self.group_index, filters, date_from, date_to)
+
+    def meta(self):
+        return {
+            'version': self.version,
+            'activities': len(self.rows),
+            'groups': len(self.groups),
+            'first_date': self.days[0] if self.days else None,
+            'last_date': self.days[-1] if self.days else None,
+            'athletes': sorted(self.index['athlete'], key=int),
+            'sports': sorted(self.index['sport']),
+            'categories': sorted(self.index['category']),
+            'countries': sorted(self.index['country']),
+            'group_by': list(GROUP_BY),
+            'track_levels': [level['name'] for level in track_simplify.ZOOM_LEVELS],
+        }
+
+    def aggregate(self, positions, by):
+        """Totaux [D+, distance, temps en mouvement, nombre] par clé de by (ou au total)."""
+        totals = defaultdict(lambda: [0.0, 0.0, 0.0, 0])
+        for p in positions:
+            row = self.rows[p]
+            if row.get('sport_type') in CUBE_EXCLUDED_SPORTS:
+                continue
+            if by is None:
+                key = 'total'
+            elif by == 'athlete':
+                key = str(row['athlete_id'])
+            elif by == 'sport':
+                key = row.get('sport_type')
+            elif by == 'category':
+                key = map_sport(row.get('sport_type'))
+            elif by == 'country':
+                key = row.get('country')
+            elif by == 'day':
+                key = self.days[p]
+            elif by == 'week':
+                start = activity_cube.parse_local(row['start_date'])
+                key = f"{start.year}-{activity_cube.week_number(start)}"
+            else:
+                key = self.days[p][:7]
+            cell = totals[key if key is not None else '']
+            cell[0] += row.get('total_elevation_gain') or 0
+            cell[1] += row.get('distance') or 0
+            cell[2] += row.get('moving_time') or 0
+            cell[3] += 1
+        return {key: [round(v, 1) for v in values[:3]] + [values[3]] for key, values in sorted(totals.items())}
+
+
+def paginate(positions, params):
+    page = int_param(params, 'page', 1, 1)
+    page_size = min(int_param(params, 'page_size', PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    total = len(positions)
+    start = (page - 1) * page_size
+    return positions[start:start + page_size], {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'pages': (total + page_size - 1) // page_size,
+    }
+
+
+def int_param(params, name, default, minimum):
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise QueryError(f"{name}: entier attendu")
+    if value < minimum:
+        raise QueryError(f"{name}: {minimum} minimum")
+    return value
+
+
+def parse_filters(params):
+    """(filtres {nom: [valeurs]}, date de début, date de fin) d'une requête."""
+    filters = {}
+    for name in FILTERS:
+        values = [v for value in params.get(name, []) for v in value.split(',') if v]
+        if values:
+            filters[name] = values
+    dates = []
+    for name in ('from', 'to'):
+        value = params.get(name, [None])[-1]
+        if value and not DATE_RE.fullmatch(value):
+            raise QueryError(f"{name}: date AAAA-MM-JJ attendue")
+        dates.append(value or None)
+    return filters, dates[0], dates[1]
+
+
+class QueryService:
+    """Données chargées, rechargement du fichier et réponses aux routes /api/."""
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.data = None
+        self.fingerprint = None
+        self.checked_at = 0
+        self.reload_lock = asyncio.Lock()
+        self.responses = OrderedDict()
+        self.tracks = OrderedDict()
+
+    def load(self):
+        fingerprint = manifest.fingerprint(self.data_file)
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        activities = data if isinstance(data, list) else data.get('activities', [])
+        groups = [] if isinstance(data, list) else data.get('group_activities', [])
+        return ActivityIndex(activities, groups, fingerprint['hash']), fingerprint
+
+    async def refresh(self):
+        """Recharge le fichier de données s'il a changé (au plus une vérification par RELOAD_CHECK_SECONDS)."""
+        now = time.monotonic()
+        if self.data is not None and now - self.checked_at < RELOAD_CHECK_SECONDS:
+            return
+        async with self.reload_lock:
+            if self.data is not None and time.monotonic() - self.checked_at < RELOAD_CHECK_SECONDS:
+                return
+            if self.data is None or not manifest.is_unchanged(self.fingerprint, self.data_file):
+                start = time.perf_counter()
+                self.data, self.fingerprint = await asyncio.to_thread(self.load)
+                self.responses.clear()
+                self.tracks.clear()
+                print(f"Donnees chargees: {len(self.data.rows)} activites, {len(self.data.groups)} sorties "
+                      f"({time.perf_counter() - start:.2f} s, version {self.data.version[:12]})")
+            self.checked_at = time.monotonic()
+
+    def etag(self, path, params):
+        query = manifest.content_hash([path, sorted((k, v) for k, v in params.items())])
+        return f'"{self.data.version[:16]}-{query[:16]}"'
+
+    def track(self, activity_id, level):
+        """Trace prête à tracer d'une activité à un niveau de détail (gardée en mémoire)."""
+        if activity_id not in self.tracks:
+            points = decode_polyline(self.data.polylines.get(activity_id))
+            self.tracks[activity_id] = track_simplify.prepare_track(points) if points else None
+            if len(self.tracks) > TRACK_CACHE_SIZE:
+                self.tracks.popitem(last=False)
+        else:
+            self.tracks.move_to_end(activity_id)
+        encoded = self.tracks[activity_id]
+        return encoded[level] if encoded else None
+
+    def answer(self, path, params):
+        """Corps (objet JSON) de la réponse à une route ; None si la route n'existe pas."""
+        data = self.data
+        if path == '/api/meta':
+            return data.meta()
+
+        filters, date_from, date_to = parse_filters(params)
+        if path == '/api/activities':
+            positions, page = paginate(data.select_rows(filters, date_from, date_to), params)
+            return {**page, 'items': [data.rows[p] for p in positions]}
+        if path == '/api/aggregates':
+            by = params.get('by', [None])[-1] or None
+            if by is not None and by not in GROUP_BY:
+                raise QueryError(f"by: une valeur parmi {', '.join(GROUP_BY)}")
+            return {'metrics': list(activity_cube.METRICS), 'by': by,
+                    'values': data.aggregate(data.select_rows(filters, date_from, date_to), by)}
+        if path == '/api/groups':
+            positions, page = paginate(data.select_groups(filters, date_from, date_to), params)
+            return {**page, 'items': [data.groups[p] for p in positions]}
+        if path == '/api/tracks':
+            levels = [level['name'] for level in track_simplify.ZOOM_LEVELS]
+            level = params.get('level', [levels[0]])[-1]
+            if level not in levels:
+                raise QueryError(f"level: une valeur parmi {', '.join(levels)}")
+            positions, page = paginate(data.select_rows(filters, date_from, date_to), params)
+            tracks = {}
+            for p in positions:
+                # Lignes d'une sortie sur plusieurs jours : identifiant "<id>_day<n>"
+                activity_id = data.rows[p]['activity_id']
+                if isinstance(activity_id, str):
+                    activity_id = int(activity_id.split('_day')[0])
+                encoded = self.track(activity_id, level)
+                if encoded:
+                    tracks[str(activity_id)] = encoded
+            return {**page, 'level': level, 'tracks': tracks}
+        return None
+
+    async def respond(self, method, target, headers):
+        """(statut, en-têtes, corps) de la réponse à une requête."""
+        if method not in ('GET', 'HEAD'):
+            return error_response(405, "methode non autorisee")
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        await self.refresh()
+
+        etag = self.etag(url.path, params)
+        # Réponse validée (route, paramètres) avant If-None-Match : une requête
+        # invalide reçoit son 400/404, jamais un 304
+        body = self.responses.get(etag)
+        if body is None:
+            try:
+                result = self.answer(url.path, params)
+            except QueryError as e:
+                return error_response(400, str(e))
+            if result is None:
+                return error_response(404, f"route inconnue: {url.path}")
+            body = json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            self.responses[etag] = body
+            if len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        else:
+            self.responses.move_to_end(etag)
+
+        cache_headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in (t.strip() for t in headers.get('if-none-match', '').split(',')):
+            return 304, cache_headers, b''
+        response_headers = {**cache_headers, 'Content-Type': 'application/json; charset=utf-8',
+                            'Vary': 'Accept-Encoding'}
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in headers.get('accept-encoding', ''):
+            body = gzip.compress(body, 6)
+            response_headers['Content-Encoding'] = 'gzip'
+        return 200, response_headers, body
+
+    async def handle(self, reader, writer):
+        """Connexion HTTP/1.1 : requêtes successives tant que le client la garde ouverte."""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line or len(request_line) > MAX_REQUEST_LINE:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3:
+                    status, response_headers, body = error_response(400, "requete invalide")
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    try:
+                        status, response_headers, body = await self.respond(method, target, headers)
+                    except Exception as e:
+                        print(f"Erreur sur {target}: {e}")
+                        status, response_headers, body = error_response(500, "erreur interne")
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                    if method == 'HEAD':
+                        response_headers['Content-Length'] = str(len(body))
+                        body = b''
+
+                response_headers.setdefault('Content-Length', str(len(body)))
+                response_headers['Access-Control-Allow-Origin'] = '*'
+                response_headers['Access-Control-Expose-Headers'] = 'ETag'
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n" + \
+                    ''.join(f"{name}: {value}\r\n" for name, value in response_headers.items()) + '\r\n'
+                writer.write(head.encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def error_response(status, message):
+    body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+    return status, {'Content-Type': 'application/json; charset=utf-8'}, body
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Service local de requetes sur les activites pre-calculees")
+    parser.add_argument('data_file', nargs='?', default=OUTPUT_FILE,
+                        help=f"sortie de Precompute_groups.py (defaut: {OUTPUT_FILE})")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"adresse d'ecoute (defaut: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port (defaut: {DEFAULT_PORT})")
+    return parser.parse_args()
+
+
+async def serve(args):
+    service = QueryService(args.data_file)
+    await service.refresh()
+    server = await asyncio.start_server(service.handle, args.host, args.port)
+    print(f"Service de requetes sur http://{args.host}:{args.port}/api/meta")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.data_file):
+        print(f"Erreur: fichier '{args.data_file}' introuvable")
+        raise SystemExit(1)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nArret du service")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+Index des routes de l'année : « qui a déjà fait cette boucle, et combien de
+fois ? » sans comparer les traces deux à deux.
+
+Chaque trace est résumée par sa signature de route : l'ensemble des cellules
+d'une grille de CELL_DEGREES degrés qu'elle traverse (points interpolés entre
+les points de la polyline). Deux routes se ressemblent si leurs ensembles de
+cellules se recouvrent (indice de Jaccard). Un croquis MinHash de NUM_PERM
+valeurs estime cet indice, et les croquis découpés en BANDS bandes donnent
+les seaux LSH : deux routes qui partagent un seau sont candidates, les autres
+ne sont jamais comparées.
+
+L'index (signatures et croquis, route_index.json à côté de la sortie) est
+mis à jour à chaque exécution de Precompute_groups.py : seules les traces
+nouvelles ou modifiées sont recalculées. Les seaux LSH se déduisent des
+croquis au chargement. Les routes fréquentes (groupes de routes semblables
+parcourues au moins FREQUENT_MIN_COUNT fois) sont exportées à côté.
+
+Les mêmes cellules servent de préfiltre à la détection des sorties de groupe
+(routes_may_overlap dans Precompute_groups.py).
+
+Usage :
+    python route_index.py --activity 14123456789
+    python route_index.py --frequent 20
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from collections import defaultdict
+from math import ceil, cos, radians
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROUTE_INDEX_VERSION = 1
+INDEX_FILE = '../public/data/route_index.json'
+
+# Grille des signatures : 0.003° (≈ 330 m en latitude), en coordonnées x 1e5
+CELL_DEGREES = 0.003
+CELL_E5 = 300
+# Clé entière d'une cellule : (ligne + LAT_OFFSET) * LNG_SPAN + colonne + LNG_OFFSET
+LAT_OFFSET = 1 << 15
+LNG_OFFSET = 1 << 16
+LNG_SPAN = 1 << 17
+
+# MinHash (hachage universel modulo un nombre premier de Mersenne) et LSH :
+# 16 bandes de 4 valeurs, seuil de Jaccard ≈ (1/16)^(1/4) = 0.5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MINHASH_PRIME = (1 << 31) - 1
+MINHASH_SEED = 2025
+
+# Routes semblables (Jaccard estimé) et routes fréquentes
+NEAREST_MIN_SIMILARITY = 0.3
+FREQUENT_MIN_SIMILARITY = 0.5
+FREQUENT_MIN_COUNT = 3
+
+_rng = random.Random(MINHASH_SEED)
+HASH_A = [_rng.randrange(1, MINHASH_PRIME) for _ in range(NUM_PERM)]
+HASH_B = [_rng.randrange(0, MINHASH_PRIME) for _ in range(NUM_PERM)]
+
+
+def _cell_key(lat_index, lng_index):
+    return (lat_index + LAT_OFFSET) * LNG_SPAN + lng_index + LNG_OFFSET
+
+
+def route_cells(coords):
+    """
+    Cellules (clés entières) traversées par une trace compacte (array à plat
+    lat/lon x 1e5, voir track_cache), points interpolés d'une cellule à l'autre.
+    """
+    if not coords:
+        return set()
+    if np is not None:
+        points = np.frombuffer(coords, dtype=np.intc).reshape(-1, 2) / CELL_E5
+        deltas = np.diff(points, axis=0)
+        steps = np.maximum(np.ceil(np.abs(deltas).max(axis=1, initial=0)), 1).astype(np.int64)
+        segment = np.repeat(np.arange(len(deltas)), steps)
+        offsets = (np.arange(int(steps.sum())) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[segment]
+        cells = np.floor(np.vstack([points[segment] + deltas[segment] * offsets[:, None], points[-1:]]))
+        cells = cells.astype(np.int64)
+        return set(np.unique(_cell_key(cells[:, 0], cells[:, 1])).tolist())
+
+    points = [(coords[k] / CELL_E5, coords[k + 1] / CELL_E5) for k in range(0, len(coords), 2)]
+    cells = set()
+    for (lat0, lng0), (lat1, lng1) in zip(points, points[1:]):
+        dlat, dlng = lat1 - lat0, lng1 - lng0
+        steps = max(ceil(max(abs(dlat), abs(dlng))), 1)
+        for k in range(steps):
+            cells.add(_cell_key(int((lat0 + dlat * (k / steps)) // 1), int((lng0 + dlng * (k / steps)) // 1)))
+    cells.add(_cell_key(int(points[-1][0] // 1), int(points[-1][1] // 1)))
+    return cells
+
+
+def neighbour_cells(cells, lng_cells):
+    """Cellules à au plus une ligne et lng_cells colonnes de l'une des cellules."""
+    offsets = [dlat * LNG_SPAN + dlng for dlat in (-1, 0, 1) for dlng in range(-lng_cells, lng_cells + 1)]
+    return {cell + offset for cell in cells for offset in offsets}
+
+
+def corridor_lng_cells(margin_degrees, max_abs_lat):
+    """
+    Colonnes de cellules couvrant margin_degrees de latitude, vers l'est ou
+    l'ouest, à la latitude max_abs_lat (margin_degrees doit rester sous
+    CELL_DEGREES : une seule ligne de voisinage).
+    """
+    return max(1, ceil(margin_degrees / max(0.01, cos(radians(max_abs_lat))) / CELL_DEGREES))
+
+
+def minhash(cells):
+    """Croquis MinHash (NUM_PERM entiers) d'un ensemble de cellules non vide."""
+    if np is not None:
+        values = np.fromiter(cells, dtype=np.int64, count=len(cells)) % MINHASH_PRIME
+        hashes = (np.array(HASH_A, dtype=np.int64)[:, None] * values[None, :] +
+                  np.array(HASH_B, dtype=np.int64)[:, None]) % MINHASH_PRIME
+        return hashes.min(axis=1).tolist()
+    values = [cell % MINHASH_PRIME for cell in cells]
+    return [min((a * v + b) % MINHASH_PRIME for v in values) for a, b in zip(HASH_A, HASH_B)]
+
+
+def encode_sketch(sketch):
+    return base64.b64encode(array('I', sketch).tobytes()).decode('ascii')
+
+
+def decode_sketch(encoded):
+    sketch = array('I')
+    sketch.frombytes(base64.b64decode(encoded))
+    return sketch.tolist()
+
+
+def similarity(sketch1, sketch2):
+    """Indice de Jaccard estimé par deux croquis."""
+    return sum(1 for v1, v2 in zip(sketch1, sketch2) if v1 == v2) / NUM_PERM
+
+
+def band_keys(sketch):
+    return [(band, tuple(sketch[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class RouteIndex:
+    """
+    Signatures des routes par activity_id : athlète, catégorie, date, nom,
+    distance, empreinte de la polyline, nombre de cellules et croquis MinHash.
+    """
+
+    def __init__(self, routes=None):
+        self.routes = routes or {}
+        self.sketches = {}
+        self._buckets = None
+
+    @classmethod
+    def load(cls, path):
+        """Index enregistré, ou index vide s'il est absent ou d'une autre version."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        if data.get('version') != ROUTE_INDEX_VERSION or data.get('cell_degrees') != CELL_DEGREES or \
+                data.get('num_perm') != NUM_PERM or data.get('seed') != MINHASH_SEED:
+            return cls()
+        return cls(data['routes'])
+
+    def sketch(self, activity_id):
+        activity_id = str(activity_id)
+        if activity_id not in self.sketches:
+            self.sketches[activity_id] = decode_sketch(self.routes[activity_id]['minhash'])
+        return self.sketches[activity_id]
+
+    def update(self, activities, track_of, polyline_hash, category_of):
+        """
+        Met l'index à jour pour ces activités (celles avec une trace) : le
+        croquis des routes dont la polyline n'a pas changé est repris, les autres
+        recalculés, les routes des activités absentes retirées. Les métadonnées
+        (athlète, catégorie, date, nom, distance) suivent toujours l'activité.
+        track_of: activité -> trace compacte ; category_of: sport -> catégorie.
+        Renvoie le nombre de routes reprises.
+        """
+        routes, reused = {}, 0
+        for a in activities:
+            polyline = (a.get('map') or {}).get('summary_polyline')
+            if not polyline:
+                continue
+            key = str(a['activity_id'])
+            digest = polyline_hash(polyline)
+            previous = self.routes.get(key)
+            if previous and previous['polyline_hash'] == digest:
+                signature = {'cells': previous['cells'], 'minhash': previous['minhash']}
+                reused += 1
+            else:
+                cells = route_cells(track_of(a))
+                if not cells:
+                    continue
+                signature = {'cells': len(cells), 'minhash': encode_sketch(minhash(cells))}
+            routes[key] = {
+                'athlete_id': a['athlete_id'],
+                'sport_category': category_of(a.get('sport_type')),
+                'date': (a.get('start_date') or '')[:10],
+                'name': a.get('name', ''),
+                'distance': round(a.get('distance') or 0),
+                'polyline_hash': digest,
+                **signature,
+            }
+        self.routes = routes
+        self.sketches = {}
+        self._buckets = None
+        return reused
+
+    def save(self, path):
+        data = {
+            'version': ROUTE_INDEX_VERSION,
+            'cell_degrees': CELL_DEGREES,
+            'num_perm': NUM_PERM,
+            'bands': BANDS,
+            'seed': MINHASH_SEED,
+            'routes': self.routes,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def buckets(self):
+        """Seaux LSH : (bande, valeurs de la bande) -> activity_ids."""
+        if self._buckets is None:
+            self._buckets = defaultdict(list)
+            for activity_id in self.routes:
+                for key in band_keys(self.sketch(activity_id)):
+                    self._buckets[key].append(activity_id)
+        return self._buckets
+
+    def candidates(self, sketch):
+        """Routes partageant au moins un seau LSH avec le croquis."""
+        buckets = self.buckets()
+        found = set()
+        for key in band_keys(sketch):
+            found.update(buckets.get(key, ()))
+        return found
+
+    def nearest(self, sketch, limit=10, min_similarity=NEAREST_MIN_SIMILARITY, exclude=None):
+        """Routes les plus semblables au croquis : [(similarité, activity_id)], décroissant."""
+        scored = []
+        for activity_id in self.candidates(sketch):
+            if activity_id == exclude:
+                continue
+            score = similarity(sketch, self.sketch(activity_id))
+            if score >= min_similarity:
+                scored.append((score, activity_id))
+        scored.sort(key=lambda item: (-item[0], self.routes[item[1]]['date'], item[1]))
+        return scored[:limit] if limit else scored
+
+    def frequent_routes(self, min_similarity=FREQUENT_MIN_SIMILARITY, min_count=FREQUENT_MIN_COUNT):
+        """
+        Routes semblables regroupées (même catégorie, Jaccard estimé d'au moins
+        min_similarity entre voisins, de proche en proche), groupes d'au moins
+        min_count activités, du plus parcouru au moins parcouru.
+        """
+        parent = {activity_id: activity_id for activity_id in self.routes}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for members in self.buckets().values():
+            for k, id1 in enumerate(members):
+                for id2 in members[k + 1:]:
+                    if find(id1) == find(id2) or \
+                            self.routes[id1]['sport_category'] != self.routes[id2]['sport_category']:
+                        continue
+                    if similarity(self.sketch(id1), self.sketch(id2)) >= min_similarity:
+                        parent[find(id1)] = find(id2)
+
+        clusters = defaultdict(list)
+        for activity_id in self.routes:
+            clusters[find(activity_id)].append(activity_id)
+
+        frequent = []
+        for members in clusters.values():
+            if len(members) < min_count:
+                continue
+            members.sort(key=lambda m: (self.routes[m]['date'], m))
+            # Route représentative : la plus semblable aux autres
+            representative = max(members, key=lambda m: (
+                sum(similarity(self.sketch(m), self.sketch(o)) for o in members if o != m), -members.index(m)))
+            athletes = defaultdict(int)
+            for m in members:
+                athletes[self.routes[m]['athlete_id']] += 1
+            route = self.routes[representative]
+            frequent.append({
+                'activities': len(members),
+                'sport_category': route['sport_category'],
+                'representative': {'activity_id': int(representative), 'name': route['name'],
+                                   'distance': route['distance'], 'date': route['date']},
+                'athletes': {str(a): n for a, n in sorted(athletes.items(), key=lambda x: (-x[1], x[0]))},
+                'first_date': self.routes[members[0]]['date'],
+                'last_date': self.routes[members[-1]]['date'],
+                'activity_ids': [int(m) for m in members],
+            })
+        frequent.sort(key=lambda r: (-r['activities'], r['first_date'], r['representative']['activity_id']))
+        for rank, route in enumerate(frequent, 1):
+            route['route'] = rank
+        return frequent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recherche dans l'index des routes (route_index.json)")
+    parser.add_argument('--index', default=INDEX_FILE, help=f"index des routes (defaut: {INDEX_FILE})")
+    parser.add_argument('--activity', type=int, help="routes les plus proches de celle de cette activite")
+    parser.add_argument('--limit', type=int, default=10, help="nombre de routes affichees (defaut: 10)")
+    parser.add_argument('--min-similarity', type=float, default=NEAREST_MIN_SIMILARITY,
+                        help=f"indice de Jaccard estime minimal (defaut: {NEAREST_MIN_SIMILARITY})")
+    parser.add_argument('--frequent', type=int, nargs='?', const=10, metavar='N',
+                        help="afficher les N routes les plus frequentes (defaut: 10)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    index = RouteIndex.load(args.index)
+    if not index.routes:
+        print(f"Erreur: index des routes absent ou vide ({args.index}), lancer Precompute_groups.py")
+        sys.exit(1)
+    print(f"{len(index.routes)} routes chargees en {time.perf_counter() - start:.2f} s")
+
+    if args.activity is not None:
+        key = str(args.activity)
+        if key not in index.routes:
+            print(f"Erreur: activite {args.activity} absente de l'index")
+            sys.exit(1)
+        start = time.perf_counter()
+        nearest = index.nearest(index.sketch(key), args.limit, args.min_similarity, exclude=key)
+        route = index.routes[key]
+        print(f"\n{route['date']} {route['name']} ({route['distance'] / 1000:.1f} km): "
+              f"{len(nearest)} routes proches en {(time.perf_counter() - start) * 1000:.1f} ms")
+        athletes = defaultdict(int)
+        for score, activity_id in nearest:
+            other = index.routes[activity_id]
+            athletes[other['athlete_id']] += 1
+            print(f"  {score:.2f}  {other['date']}  athlete {other['athlete_id']}  "
+                  f"{other['name']} ({other['distance'] / 1000:.1f} km)")
+        if athletes:
+            print("Par athlete: " + ', '.join(f"{a}: {n}" for a, n in sorted(athletes.items(), key=lambda x: -x[1])))
+
+    if args.frequent:
+        start = time.perf_counter()
+        frequent = index.frequent_routes()
+        print(f"\n{len(frequent)} routes frequentes en {time.perf_counter() - start:.2f} s")
+        for route in frequent[:args.frequent]:
+            rep = route['representative']
+            print(f"  {route['activities']:3d}x  {route['sport_category']:<20} {rep['name']} "
+                  f"({rep['distance'] / 1000:.1f} km), {len(route['athletes'])} athlete(s), "
+                  f"{route['first_date']} -> {route['last_date']}")
+
+
+if __name__ == '__main__':
+    main()
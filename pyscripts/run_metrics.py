@@ -0,0 +1,168 @@
+"""
+Mesures d'une exécution : durée et pic mémoire de chaque étape, compteurs, et
+profil cProfile optionnel, écrits dans un fichier JSON pour comparer les
+exécutions entre elles.
+
+Le pic mémoire d'une étape est le pic de RSS du process pendant l'étape : sous
+Linux il est remis à zéro au début de chaque étape (/proc/self/clear_refs) ;
+ailleurs seul le pic depuis le lancement est disponible (peak_scope: process),
+via resource (macOS) ou GetProcessMemoryInfo (Windows), None sinon.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+METRICS_VERSION = 1
+# Fonctions les plus coûteuses gardées dans le JSON (profil complet dans le .prof)
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def _status_mb(field):
+    """Champ mémoire de /proc/self/status (VmRSS, VmHWM) en Mo, None si indisponible."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    """Remet à zéro le pic de RSS du process (Linux uniquement)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _windows_peak_mb():
+    """Pic de l'ensemble de travail du process sous Windows, None si indisponible."""
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters),
+                                                counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+
+def _maxrss_mb():
+    """Pic de RSS du process depuis son lancement en Mo, None si indisponible."""
+    if resource is None:
+        return _windows_peak_mb() if sys.platform == 'win32' else None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def _round_mb(value):
+    return round(value, 1) if value is not None else None
+
+
+class RunMetrics:
+    """
+    Étapes chronométrées (with metrics.stage('nom'): ...) et compteurs.
+    profile: activer cProfile pendant les étapes.
+    """
+
+    def __init__(self, profile=False):
+        self.stages = {}
+        self.counters = defaultdict(int)
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        per_stage = _reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self.profiler:
+            self.profiler.enable()
+        try:
+            yield
+        finally:
+            if self.profiler:
+                self.profiler.disable()
+            peak = _status_mb('VmHWM') if per_stage else None
+            self.stages[name] = {
+                'seconds': round(time.perf_counter() - wall, 3),
+                'cpu_seconds': round(time.process_time() - cpu, 3),
+                'rss_mb': _round_mb(_status_mb('VmRSS') or _maxrss_mb()),
+                'peak_rss_mb': _round_mb(peak if peak is not None else _maxrss_mb()),
+                'peak_scope': 'stage' if peak is not None else 'process',
+            }
+
+    def seconds(self, name):
+        return self.stages[name]['seconds']
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def update(self, counters, prefix=''):
+        for key, value in counters.items():
+            self.counters[prefix + key] += value
+
+    def profile_summary(self):
+        """Fonctions les plus coûteuses (temps cumulé)."""
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda item: -item[1][3])[:PROFILE_TOP_FUNCTIONS]
+        return [{'function': f"{os.path.basename(filename)}:{line}({func})",
+                 'calls': ncalls, 'tottime': round(tottime, 3), 'cumtime': round(cumtime, 3)}
+                for (filename, line, func), (_, ncalls, tottime, cumtime, _) in top]
+
+    def save(self, path, **info):
+        """
+        Écrit les mesures (et le profil <path sans extension>.prof avec --profile).
+        info: champs ajoutés tels quels (arguments, statut...).
+        Renvoie le chemin du profil, ou None.
+        """
+        report = {
+            'version': METRICS_VERSION,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'total_seconds': round(time.time() - self.started, 3),
+            'peak_rss_mb': _round_mb(_maxrss_mb()),
+            **info,
+            'stages': self.stages,
+            'counters': dict(sorted(self.counters.items())),
+        }
+        profile_path = None
+        if self.profiler and self.stages:
+            profile_path = os.path.splitext(path)[0] + '.prof'
+            self.profiler.dump_stats(profile_path)
+            report['profile'] = {'file': profile_path, 'top': self.profile_summary()}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return profile_path
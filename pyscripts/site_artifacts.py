@@ -0,0 +1,116 @@
+"""
+Fichiers de données du site à noms versionnés par leur contenu.
+
+Chaque fichier est écrit sous un nom contenant l'empreinte de son contenu
+(activities_index.3f2a9c81d0e4.json) : il ne change jamais, le navigateur
+peut le garder indéfiniment. Le JSON est minifié ; des copies compressées
+.gz et .br (si le module brotli est installé) sont écrites à côté, pour un
+serveur qui sert les fichiers précompressés (gzip_static / brotli_static).
+
+Un petit manifeste non versionné (manifest.json) donne le nom courant de
+chaque fichier : c'est le seul que le site revalide à chaque visite.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+
+def dumps(data):
+    """JSON minifié en UTF-8."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def versioned_name(filename, payload):
+    """Nom du fichier avec l'empreinte de son contenu avant l'extension."""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(payload).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def write_file(directory, filename, payload):
+    """
+    Écrit payload (bytes) sous son nom versionné, avec ses copies compressées.
+    Un fichier déjà présent sous ce nom a le même contenu et n'est pas réécrit.
+    Renvoie {'file', 'bytes', 'gzip_bytes', 'brotli_bytes'} (nom relatif au dossier).
+    """
+    name = versioned_name(filename, payload)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path) or os.path.getsize(path) != len(payload):
+        _write(path, payload)
+    if not os.path.exists(path + '.gz'):
+        _write(path + '.gz', gzip.compress(payload, GZIP_LEVEL, mtime=0))
+    if brotli is not None and not os.path.exists(path + '.br'):
+        _write(path + '.br', brotli.compress(payload, quality=BROTLI_QUALITY))
+    return {
+        'file': name,
+        'bytes': len(payload),
+        'gzip_bytes': os.path.getsize(path + '.gz'),
+        'brotli_bytes': os.path.getsize(path + '.br') if os.path.exists(path + '.br') else None,
+    }
+
+
+def write_json(directory, filename, data):
+    """write_file pour des données JSON (minifiées)."""
+    return write_file(directory, filename, dumps(data))
+
+
+def written_files(entry):
+    """Noms des fichiers écrits pour une entrée de write_file (copies comprises)."""
+    return {entry['file']} | {entry['file'] + suffix for suffix in COMPRESSED_SUFFIXES}
+
+
+def remove_stale(directory, filenames, keep):
+    """
+    Supprime du dossier les versions de filenames (versionnées ou non, et
+    leurs copies compressées) qui ne sont pas dans keep.
+    """
+    patterns = []
+    for filename in filenames:
+        stem, ext = os.path.splitext(filename)
+        patterns.append(re.compile(rf"{re.escape(stem)}(\.[0-9a-f]{{{HASH_LENGTH}}})?{re.escape(ext)}(\.gz|\.br)?"))
+    for name in os.listdir(directory):
+        if name not in keep and any(p.fullmatch(name) for p in patterns):
+            os.remove(os.path.join(directory, name))
+
+
+def write_manifest(directory, artifacts, files):
+    """
+    Écrit le manifeste du site.
+    artifacts: {nom: entrée de write_file} avec des chemins relatifs au dossier ;
+    files: chemins de tous les fichiers versionnés lus par le site.
+    """
+    manifest = {'version': MANIFEST_VERSION, 'artifacts': artifacts, 'files': sorted(files)}
+    _write(os.path.join(directory, MANIFEST_FILENAME), dumps(manifest))
+    return manifest
+
+
+def is_complete(directory):
+    """Le manifeste du dossier existe et tous ses fichiers sont présents."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return manifest.get('version') == MANIFEST_VERSION and \
+        all(os.path.exists(os.path.join(directory, path)) for path in manifest['files'])
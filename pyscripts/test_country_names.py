@@ -0,0 +1,79 @@
+"""
+Noms de pays : le géocodage offline (contours) et le géocodage en ligne
+(cache de pays, Nominatim) doivent donner le même nom pour un même pays.
+
+    python -m pytest -q test_country_names.py
+"""
+
+import io
+import json
+
+import geocoding_queue
+import offline_geocoder
+import Precompute_groups as pg
+
+USA = "États-Unis d'Amérique"
+# Points de départ : Colorado, Andorre, et deux points au milieu de l'Atlantique
+DENVER = (39.74, -104.99)
+ANDORRA = (42.51, 1.52)
+SEA_CACHED = (40.0, -40.0)
+SEA_ONLINE = (35.0, -50.0)
+
+
+def test_offline_names_are_french():
+    index = offline_geocoder.get_index()
+    assert index.lookup(*DENVER) == USA
+    assert index.lookup(*ANDORRA) == 'Andorre'
+    # Aucun nom anglais restant dans les contours
+    with open(offline_geocoder.POLYGONS_FILE, 'r', encoding='utf-8') as f:
+        names = {country['name'] for country in json.load(f)['countries']}
+    assert all(pg.translate_country_to_french(name) == name for name in names)
+
+
+def test_cache_vocabulary_matches_translations():
+    with open('country_cache.json', 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    assert all(pg.translate_country_to_french(c) == c for c in cache.values() if c)
+
+
+def test_online_names_match_offline(tmp_path, monkeypatch):
+    # Nominatim répond parfois en anglais : traduit comme les noms offline
+    requested = []
+
+    def urlopen(request, timeout):
+        requested.append(request.full_url)
+        return io.BytesIO(json.dumps({'address': {'country': 'United States'}}).encode('utf-8'))
+    monkeypatch.setattr(pg.urllib.request, 'urlopen', urlopen)
+    monkeypatch.setattr(pg, 'geocoding_bucket', geocoding_queue.TokenBucket(1000))
+    assert pg.fetch_country_nominatim(*DENVER) == USA
+    requested.clear()
+
+    # Points en mer, hors de tout contour : seul le cache ou Nominatim répond.
+    # L'entrée de SEA_CACHED porte un ancien nom ('États-Unis'), ramené au
+    # vocabulaire commun au chargement du cache.
+    assert offline_geocoder.get_index().lookup(*SEA_CACHED) is None
+    assert offline_geocoder.get_index().lookup(*SEA_ONLINE) is None
+    cache_file = tmp_path / 'country_cache.json'
+    cache_file.write_text(json.dumps({'40.0,-40.0': 'États-Unis', '42.51,1.52': 'Andorre'}),
+                          encoding='utf-8')
+    monkeypatch.setattr(pg, 'COUNTRY_CACHE_FILE', str(cache_file))
+    monkeypatch.setattr(pg, 'country_journal', geocoding_queue.CacheJournal(str(tmp_path / 'journal')))
+    monkeypatch.setattr(pg, 'country_cache', {})
+    pg.load_country_cache()
+    assert pg.country_cache['40.0,-40.0'] == USA
+
+    points = [list(DENVER), list(ANDORRA), list(SEA_CACHED), list(SEA_ONLINE)]
+    online = pg.resolve_countries(points, use_online_geocoding=True)
+    assert online == {DENVER: USA, ANDORRA: 'Andorre', SEA_CACHED: USA, SEA_ONLINE: USA}
+    # Une seule requête, pour le point en mer absent du cache
+    assert len(requested) == 1 and 'lat=35.0&lon=-50.0' in requested[0]
+
+    # Mêmes noms que les contours pour les points à terre
+    offline = pg.resolve_countries(points, use_online_geocoding=False)
+    assert {point: offline[point] for point in (DENVER, ANDORRA)} == {DENVER: USA, ANDORRA: 'Andorre'}
+
+    # Résolution point par point : même file, même cache
+    monkeypatch.setattr(pg, 'country_cache', {})
+    pg.load_country_cache()
+    assert pg.get_country_from_coords(*SEA_CACHED) == USA
+    assert pg.get_country_from_coords(*SEA_ONLINE) == USA
@@ -0,0 +1,126 @@
+"""
+File de géocodage contre un serveur Nominatim local (http.server) : reprises
+sur 429 et 503, Retry-After, journal rejoué après une exécution interrompue.
+
+    python -m pytest -q test_geocoding_queue.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import geocoding_queue
+import Precompute_groups as pg
+
+# Point au milieu de l'Atlantique, hors de tout contour : seul Nominatim répond
+SEA = (40.0, -40.0)
+SEA_KEY = '40.0,-40.0'
+
+
+class StubNominatim(ThreadingHTTPServer):
+    """Répond avec les statuts de self.statuses dans l'ordre, puis 200."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.statuses = []
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/reverse"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status != 200:
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '2')
+            self.end_headers()
+            return
+        body = json.dumps({'address': {'country': 'United States'}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    stub = StubNominatim()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Délais de reprise demandés, sans attendre."""
+    delays = []
+    monkeypatch.setattr(geocoding_queue.time, 'sleep', delays.append)
+    return delays
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch, server):
+    """Precompute_groups pointé sur le serveur local, avec cache et journal temporaires."""
+    monkeypatch.setattr(pg, 'NOMINATIM_URL', server.url)
+    monkeypatch.setattr(pg, 'COUNTRY_CACHE_FILE', str(tmp_path / 'country_cache.json'))
+    monkeypatch.setattr(pg, 'country_journal', geocoding_queue.CacheJournal(str(tmp_path / 'journal')))
+    monkeypatch.setattr(pg, 'country_cache', {})
+    monkeypatch.setattr(pg, 'geocoding_bucket', geocoding_queue.TokenBucket(1000, capacity=10))
+    monkeypatch.setattr(pg, 'geocoding_stats', pg.defaultdict(int))
+    monkeypatch.setattr(pg, 'GEOCODING_BACKOFF_SECONDS', 30.0)
+    return pg
+
+
+def test_retries_honor_retry_after(server, sleeps, pipeline):
+    server.statuses = [429, 503]
+    countries = pipeline.resolve_countries([list(SEA)], use_online_geocoding=True)
+    assert countries == {SEA: "États-Unis d'Amérique"}
+    assert server.requests == 3
+    assert (pipeline.geocoding_stats['requests'], pipeline.geocoding_stats['retries']) == (3, 2)
+    # 429 : Retry-After (2 s) ; 503 sans Retry-After : délai exponentiel (30 * 2)
+    assert sleeps == [2, 60.0]
+
+
+def test_failures_are_not_cached(server, sleeps, pipeline, monkeypatch):
+    monkeypatch.setattr(pg, 'GEOCODING_RETRIES', 1)
+    server.statuses = [503, 503]
+    countries = pipeline.resolve_countries([list(SEA)], use_online_geocoding=True)
+    assert countries == {SEA: None}
+    assert pipeline.geocoding_stats['failures'] == 1
+    assert SEA_KEY not in pipeline.country_cache
+    assert pipeline.country_journal.replay({}) == 0
+
+
+def test_interrupted_run_resumes_from_journal(server, sleeps, pipeline, monkeypatch):
+    server.statuses = [429]
+    pipeline.load_country_cache()
+    pipeline.resolve_countries([list(SEA)], use_online_geocoding=True)
+    assert server.requests == 2
+
+    # Arrêt avant save_country_cache : seul le journal contient la clé
+    replayed = {}
+    assert pipeline.country_journal.replay(replayed) == 1
+    assert replayed == {SEA_KEY: "États-Unis d'Amérique"}
+    with open(pipeline.country_journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "41.0,-41.0", "coun')
+
+    # Nouvelle exécution : le journal rejoué suffit, aucune requête
+    monkeypatch.setattr(pg, 'country_cache', {})
+    pipeline.load_country_cache()
+    countries = pipeline.resolve_countries([list(SEA)], use_online_geocoding=True)
+    assert countries == {SEA: "États-Unis d'Amérique"}
+    assert pipeline.get_country_from_coords(*SEA) == "États-Unis d'Amérique"
+    assert server.requests == 2
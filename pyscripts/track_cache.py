@@ -0,0 +1,140 @@
+"""
+Cache des traces GPS décodées, indexé par activity_id.
+
+Chaque summary_polyline n'est décodée qu'une fois par exécution : les
+coordonnées sont gardées sous forme compacte (array d'entiers, lat/lon x 1e5)
+dans un LRU borné. Le cache peut aussi être persisté dans une base SQLite,
+indexée par activity_id et par une empreinte de la polyline, pour que les
+exécutions suivantes sur la même année ne décodent plus rien.
+"""
+
+import hashlib
+import sqlite3
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import polyline_engine
+
+# Nombre maximal de traces gardées en mémoire
+TRACK_CACHE_MAX_TRACKS = 5000
+
+
+def polyline_hash(encoded):
+    return hashlib.blake2b(encoded.encode('ascii'), digest_size=8).hexdigest()
+
+
+def decode_polyline_e5(encoded):
+    """
+    Décode une polyline en array('i') à plat [lat0, lon0, lat1, lon1, ...]
+    (coordonnées entières x 1e5, sans perte par rapport à l'encodage).
+    """
+    coords = array('i')
+    if np is not None:
+        coords.frombytes(polyline_engine.decode_polyline_ints(encoded).astype(np.intc).tobytes())
+        return coords
+    index = 0
+    last = [0, 0]
+    while index < len(encoded):
+        for k in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            last[k] += ~(result >> 1) if result & 1 else result >> 1
+            coords.append(last[k])
+    return coords
+
+
+def to_numpy(coords):
+    """Convertit une trace compacte en tableau NumPy (n, 2) de [lat, lon]."""
+    return np.frombuffer(coords, dtype=np.intc).reshape(-1, 2) / 1e5
+
+
+def bounding_box(coords):
+    """(lat min, lon min, lat max, lon max) d'une trace compacte, None si elle est vide."""
+    if not coords:
+        return None
+    if np is not None:
+        points = np.frombuffer(coords, dtype=np.intc).reshape(-1, 2)
+        low, high = points.min(axis=0), points.max(axis=0)
+        return (low[0] / 1e5, low[1] / 1e5, high[0] / 1e5, high[1] / 1e5)
+    return (min(coords[0::2]) / 1e5, min(coords[1::2]) / 1e5,
+            max(coords[0::2]) / 1e5, max(coords[1::2]) / 1e5)
+
+
+def to_latlng_list(coords):
+    """Convertit une trace compacte au format de decode_polyline ([[lat, lon], ...])."""
+    return [[coords[k] / 1e5, coords[k + 1] / 1e5] for k in range(0, len(coords), 2)]
+
+
+class TrackCache:
+    """
+    LRU des traces décodées, avec persistance optionnelle dans SQLite.
+    """
+
+    def __init__(self, max_tracks=TRACK_CACHE_MAX_TRACKS, path=None):
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=60)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                "activity_id INTEGER PRIMARY KEY, polyline_hash TEXT, coords BLOB)"
+            )
+
+    def get(self, activity_id, encoded):
+        """Trace compacte de l'activité, décodée au besoin."""
+        coords = self.tracks.get(activity_id)
+        if coords is not None:
+            self.tracks.move_to_end(activity_id)
+            self.hits += 1
+            return coords
+
+        digest = polyline_hash(encoded) if self.db else None
+        if self.db:
+            row = self.db.execute(
+                "SELECT polyline_hash, coords FROM tracks WHERE activity_id = ?", (activity_id,)
+            ).fetchone()
+            if row and row[0] == digest:
+                coords = array('i')
+                coords.frombytes(row[1])
+                self.disk_hits += 1
+
+        if coords is None:
+            coords = decode_polyline_e5(encoded)
+            self.misses += 1
+            if self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)",
+                    (activity_id, digest, coords.tobytes())
+                )
+
+        self.tracks[activity_id] = coords
+        if len(self.tracks) > self.max_tracks:
+            self.tracks.popitem(last=False)
+        return coords
+
+    def flush(self):
+        if self.db:
+            self.db.commit()
+
+    def close(self):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def summary(self):
+        return (f"{self.hits} hits memoire, {self.disk_hits} hits disque, "
+                f"{self.misses} decodages")
@@ -0,0 +1,159 @@
+"""
+Préparation des traces pour la carte du site, faite une fois au précalcul
+au lieu d'être refaite par le navigateur à chaque affichage :
+
+- découpe des lignes droites (trajets en train) avec la même règle que
+  filterStraightLines / isSegmentStraight (public/js/charts.js) : une portion
+  de plus de 20 km à vol d'oiseau dont le rapport distance directe / distance
+  parcourue dépasse 0.99, cherchée sur les 50 points suivants ;
+- simplification Douglas–Peucker des segments restants, à plusieurs
+  tolérances selon le niveau de zoom ; chaque segment est réécrit en polyline
+  encodée, que le site n'a plus qu'à décoder et tracer.
+
+La découpe donne les mêmes segments que la version JavaScript. Elle passe par
+les distances cumulées le long de la trace : un point dont les 50 suivants
+restent à moins de 20 km de parcours ne peut pas commencer une ligne droite
+(la distance directe ne dépasse jamais la distance parcourue), il est donc
+écarté sans calcul, et le rapport d'une portion se lit en O(1).
+"""
+
+from math import radians, sin, cos, sqrt, atan2
+
+EARTH_RADIUS = 6371000
+
+# Règle de filterStraightLines (charts.js)
+STRAIGHT_MIN_DISTANCE = 20000
+STRAIGHT_MIN_RATIO = 0.99
+STRAIGHT_LOOKAHEAD = 50
+
+# Niveaux de détail : tolérance Douglas–Peucker (m) et zoom Leaflet maximal
+# du niveau (None : niveau le plus fin). Environ un demi-pixel à 45° de latitude.
+ZOOM_LEVELS = (
+    {'name': 'z7', 'max_zoom': 7, 'tolerance': 500},
+    {'name': 'z11', 'max_zoom': 11, 'tolerance': 40},
+    {'name': 'full', 'max_zoom': None, 'tolerance': 5},
+)
+# Précision des polylines encodées écrites (celle de Strava)
+COORD_DECIMALS = 5
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat, dlon = lat2 - lat1, lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return EARTH_RADIUS * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def split_straight_lines(points, min_straight_distance=STRAIGHT_MIN_DISTANCE):
+    """Segments de la trace sans ses lignes droites, comme filterStraightLines."""
+    if not points or len(points) < 3:
+        return [points]
+
+    n = len(points)
+    cumulative = [0.0] * n
+    for k in range(1, n):
+        cumulative[k] = cumulative[k - 1] + haversine_distance(*points[k - 1], *points[k])
+
+    segments = []
+    current = [points[0]]
+    i = 1
+    while i < n - 1:
+        straight_end = -1
+        last = min(i + STRAIGHT_LOOKAHEAD, n) - 1
+        if last >= i + 2 and cumulative[last] - cumulative[i] > min_straight_distance:
+            for j in range(i + 2, last + 1):
+                path = cumulative[j] - cumulative[i]
+                if path <= min_straight_distance:
+                    continue
+                direct = haversine_distance(*points[i], *points[j])
+                if direct > min_straight_distance and direct / path > STRAIGHT_MIN_RATIO:
+                    straight_end = j
+
+        current.append(points[i])
+        if straight_end > 0:
+            # Terminer le segment courant et reprendre après la ligne droite
+            if len(current) > 1:
+                segments.append(current)
+            current = [points[straight_end]]
+            i = straight_end
+        i += 1
+
+    current.append(points[-1])
+    if len(current) > 1:
+        segments.append(current)
+    return segments or [points]
+
+
+def douglas_peucker(points, tolerance):
+    """Simplification Douglas–Peucker (tolérance en mètres, projection locale)."""
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+
+    # Projection équirectangulaire autour du premier point
+    lat0 = radians(points[0][0])
+    kx = EARTH_RADIUS * cos(lat0) * radians(1)
+    ky = EARTH_RADIUS * radians(1)
+    xy = [(lng * kx, lat * ky) for lat, lng in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tolerance_sq = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = xy[first]
+        dx, dy = xy[last][0] - x1, xy[last][1] - y1
+        length_sq = dx * dx + dy * dy
+        farthest, max_dist_sq = -1, tolerance_sq
+        for k in range(first + 1, last):
+            px, py = xy[k][0] - x1, xy[k][1] - y1
+            dot = px * dx + py * dy
+            # Distance au segment [first, last] (extrémités comprises)
+            if dot <= 0 or length_sq == 0:
+                dist_sq = px * px + py * py
+            elif dot >= length_sq:
+                ex, ey = px - dx, py - dy
+                dist_sq = ex * ex + ey * ey
+            else:
+                cross = px * dy - py * dx
+                dist_sq = cross * cross / length_sq
+            if dist_sq > max_dist_sq:
+                farthest, max_dist_sq = k, dist_sq
+        if farthest >= 0:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def encode_polyline(points):
+    """Encodage Google des points (inverse de decodePolyline, public/js/utils.js)."""
+    chunks = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = round(lat * 10 ** COORD_DECIMALS), round(lng * 10 ** COORD_DECIMALS)
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return ''.join(chunks)
+
+
+def prepare_track(points, segments=None):
+    """
+    Segments prêts à tracer (polylines encodées) pour chaque niveau de
+    ZOOM_LEVELS : {nom du niveau: [segment, ...]}. Chaque niveau est simplifié
+    à partir du niveau plus fin, du plus détaillé au plus grossier.
+    segments: découpe de la trace déjà faite par split_straight_lines.
+    """
+    if segments is None:
+        segments = split_straight_lines(points)
+    segments = [s for s in segments if len(s) >= 2]
+    levels = {}
+    for level in sorted(ZOOM_LEVELS, key=lambda lv: lv['tolerance']):
+        segments = [douglas_peucker(segment, level['tolerance']) for segment in segments]
+        levels[level['name']] = [encode_polyline(segment) for segment in segments]
+    return {level['name']: levels[level['name']] for level in ZOOM_LEVELS}